@@ -0,0 +1,285 @@
+import argparse
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from interpreter.Evaluator import Evaluator
+from interpreter.Optimizer import Optimizer
+from interpreter.Parser import Parser
+from interpreter.Resolver import Resolver
+from interpreter.Tokenizer import Tokenizer
+from interpreter.main import BACKENDS, execute
+
+"""
+goal:
+    解释器的基准测试，用来比较不同提交之间的性能
+
+    benchmarks/programs/ 中每个 .fight 文件是一个基准程序(递归、数值 for 循环、loop 循环、字符串、列表高阶函数、惰性序列、
+    类和方法调用、结构体、包、异常)，另外 large_source 是运行时生成的大源文件，主要测量词法分析和语法分析。
+    每个程序按 main.py 的流程执行: tokenize -> parse -> fold -> resolve -> evaluate，分别计时
+    (--backend 选择执行后端，和 main.py 的 --backend 相同，evaluate 阶段包括编译的时间):
+        各阶段的时间取 --repeat 次中的最小值(机器的噪声只会让时间变长)，total 是单次运行总时间的最小值和中位数
+        峰值内存: 另外用 tracemalloc 跑一次(tracemalloc 会拖慢执行，所以不和计时放在一起)，是 Python 分配的峰值字节数
+        输出: 程序的标准输出不显示，只记录它的哈希，优化改变了程序的行为时比较结果中会标出来
+    结果保存成 JSON(默认 benchmarks/results/<commit>.json)，--compare 对比两个结果:
+        某个阶段变慢超过 --threshold(默认 10%)、或者输出变化时算回归，退出码为 1
+
+use:
+    python -m benchmarks.run                                  # 运行全部基准，结果写到 benchmarks/results/<commit>.json
+    python -m benchmarks.run fib loop_condition               # 只运行部分基准
+    python -m benchmarks.run --repeat 10 --output base.json   # 运行 10 次，结果写到 base.json
+    python -m benchmarks.run --compare base.json              # 运行，并和 base.json 比较
+    python -m benchmarks.run --compare base.json new.json     # 不运行，只比较两个结果文件
+    python -m benchmarks.run --backend vm --compare base.json   # 用字节码 VM 执行，和 tree 的结果比较
+"""
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROGRAM_DIR = os.path.join(BENCHMARK_DIR, "programs")
+RESULT_DIR = os.path.join(BENCHMARK_DIR, "results")
+# 结果文件格式的版本，修改格式时加 1
+RESULT_FORMAT_VERSION = 1
+PHASES = ("tokenize", "parse", "fold", "resolve", "evaluate")
+# 比较时忽略小于这个值(秒)的差别，很短的阶段相对噪声太大
+MIN_SIGNIFICANT_SECONDS = 0.002
+# large_source 生成的函数个数
+LARGE_SOURCE_FUNCTIONS = 2000
+
+
+def generate_large_source(functions=LARGE_SOURCE_FUNCTIONS):
+    # 很多函数声明和表达式，执行时只声明函数，时间主要花在词法分析和语法分析上
+    lines = []
+    for index in range(functions):
+        lines.append(f'def f{index}(a, b = {index}){{\n'
+                     f'    let s = "f{index}: ${{a}}";\n'
+                     f'    if(a > b and not (a == {index})){{ return (a + b) * {index} % 7 - a // 2; }}\n'
+                     f'    elif(a < 0){{ return [a, b, {{k: a}}]; }}\n'
+                     f'    return s;\n'
+                     f'}}\n')
+    lines.append(f"@println(f{functions - 1}(1));\n")
+    return "".join(lines)
+
+
+def load_benchmarks(names=None):
+    # 名字 -> (文件名, 源代码)，names 为空时返回全部
+    benchmarks = {}
+    for path in sorted(glob.glob(os.path.join(PROGRAM_DIR, "*.fight"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8") as source:
+            benchmarks[name] = (path, source.read())
+    benchmarks["large_source"] = ("<large_source>", generate_large_source())
+    if names:
+        unknown = [name for name in names if name not in benchmarks]
+        if unknown:
+            raise SystemExit(f"unknown benchmark(s): {', '.join(unknown)}; available: {', '.join(benchmarks)}")
+        benchmarks = {name: benchmarks[name] for name in names}
+    return benchmarks
+
+
+def run_once(file_name, source_code, backend="tree"):
+    """
+        执行一次完整的流程，返回 ({阶段: 秒}, 标准输出)
+    """
+    times = {}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        start = time.perf_counter()
+        tokens = Tokenizer(source_code, file_name).tokenize()
+        times["tokenize"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ast = Parser(tokens).parse()
+        times["parse"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ast = Optimizer().optimize(ast)
+        times["fold"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        Resolver().resolve(ast)
+        times["resolve"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        execute(ast, Evaluator(), backend)
+        times["evaluate"] = time.perf_counter() - start
+    return times, output.getvalue()
+
+
+def peak_memory(file_name, source_code, backend):
+    # 一次完整运行中 Python 分配的峰值字节数
+    tracemalloc.start()
+    try:
+        run_once(file_name, source_code, backend)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(file_name, source_code, repeat, backend="tree"):
+    runs = [run_once(file_name, source_code, backend) for _ in range(repeat)]
+    outputs = {output for _, output in runs}
+    totals = [sum(times.values()) for times, _ in runs]
+    return {
+        "phases": {phase: min(times[phase] for times, _ in runs) for phase in PHASES},
+        "total": min(totals),
+        "total_median": statistics.median(totals),
+        "peak_memory": peak_memory(file_name, source_code, backend),
+        "output_hash": hashlib.blake2b(runs[0][1].encode("utf-8"), digest_size=8).hexdigest(),
+        # 每次运行的输出都应该一样
+        "deterministic": len(outputs) == 1,
+    }
+
+
+def git_revision():
+    # (提交的短哈希, 工作区是否有未提交的修改)，不在 git 仓库中时是 ("unknown", False)
+    repo_dir = os.path.dirname(BENCHMARK_DIR)
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_dir, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo_dir,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, bool(status)
+
+
+def run_benchmarks(names, repeat, backend="tree", progress=sys.stderr):
+    commit, dirty = git_revision()
+    results = {
+        "format": RESULT_FORMAT_VERSION,
+        "commit": commit,
+        "dirty": dirty,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "backend": backend,
+        "benchmarks": {},
+    }
+    for name, (file_name, source_code) in load_benchmarks(names).items():
+        progress.write(f"{name:<16} ")
+        progress.flush()
+        try:
+            result = measure(file_name, source_code, repeat, backend)
+        except Exception as error:
+            result = {"error": f"{type(error).__name__}: {error}"}
+            progress.write(f"ERROR {result['error']}\n")
+        else:
+            progress.write(f"{result['total']:.4f}s  peak {result['peak_memory'] / 1024:.0f} KiB\n")
+        results["benchmarks"][name] = result
+    return results
+
+
+def default_output_path(results):
+    suffix = "-dirty" if results["dirty"] else ""
+    return os.path.join(RESULT_DIR, f"{results['commit']}{suffix}.json")
+
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as result_file:
+        json.dump(results, result_file, indent=2)
+        result_file.write("\n")
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as result_file:
+        results = json.load(result_file)
+    if results.get("format") != RESULT_FORMAT_VERSION:
+        raise SystemExit(f"{path}: unsupported result format {results.get('format')}")
+    return results
+
+
+# ===========================比较===========================
+
+def change(old, new):
+    # 相对变化的百分比，正数表示变慢/变大
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare(old, new, threshold, stream=sys.stdout):
+    """
+        逐个基准比较 total、各阶段和峰值内存，返回回归的个数
+        回归: 时间变慢超过 threshold% (并且超过 MIN_SIGNIFICANT_SECONDS)、程序的输出变了、新结果运行出错
+    """
+    # 没有 backend 的旧结果文件是 tree 后端的结果
+    stream.write(f"old: {old['commit']}{' (dirty)' if old['dirty'] else ''} [{old.get('backend', 'tree')}]  "
+                 f"new: {new['commit']}{' (dirty)' if new['dirty'] else ''} [{new.get('backend', 'tree')}]  "
+                 f"threshold: {threshold:.0f}%\n")
+    stream.write(f"{'benchmark':<16} {'metric':<12} {'old':>12} {'new':>12} {'change':>9}\n")
+    regressions = 0
+    for name, new_result in new["benchmarks"].items():
+        old_result = old["benchmarks"].get(name)
+        if old_result is None or "error" in old_result:
+            stream.write(f"{name:<16} (no baseline)\n")
+            continue
+        if "error" in new_result:
+            stream.write(f"{name:<16} ERROR {new_result['error']}  <-- regression\n")
+            regressions += 1
+            continue
+        rows = [("total", old_result["total"], new_result["total"])]
+        rows += [(phase, old_result["phases"][phase], new_result["phases"][phase]) for phase in PHASES]
+        for metric, old_value, new_value in rows:
+            percent = change(old_value, new_value)
+            slower = percent > threshold and new_value - old_value > MIN_SIGNIFICANT_SECONDS
+            regressions += slower
+            stream.write(f"{name:<16} {metric:<12} {old_value:>11.4f}s {new_value:>11.4f}s {percent:>+8.1f}%"
+                         f"{'  <-- slower' if slower else ''}\n")
+        old_memory, new_memory = old_result["peak_memory"], new_result["peak_memory"]
+        stream.write(f"{name:<16} {'peak_memory':<12} {old_memory / 1024:>9.0f}KiB {new_memory / 1024:>9.0f}KiB "
+                     f"{change(old_memory, new_memory):>+8.1f}%\n")
+        if old_result["output_hash"] != new_result["output_hash"]:
+            stream.write(f"{name:<16} output changed  <-- regression\n")
+            regressions += 1
+    stream.write(f"{regressions} regression(s)\n")
+    return regressions
+
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Run the Fight benchmarks.")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark (default: 5)")
+    parser.add_argument("--output", help="where to write the JSON results (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT",
+                        help="compare with a saved result; with two files, only compare them")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent slowdown reported as a regression (default: 10)")
+    parser.add_argument("--backend", choices=BACKENDS, default="tree",
+                        help="execution backend, as in interpreter.main (default: tree)")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    return parser
+
+
+def main(argv=None):
+    args = build_argument_parser().parse_args(argv)
+    if args.list:
+        for name, (file_name, _) in load_benchmarks().items():
+            print(f"{name:<16} {os.path.relpath(file_name) if os.path.exists(file_name) else file_name}")
+        return 0
+    if args.compare and len(args.compare) > 2:
+        raise SystemExit("--compare takes one or two result files")
+    if args.compare and len(args.compare) == 2:
+        return 1 if compare(load_results(args.compare[0]), load_results(args.compare[1]), args.threshold) else 0
+
+    # fib 等递归程序需要更深的 Python 栈
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    results = run_benchmarks(args.names, max(args.repeat, 1), args.backend)
+    output_path = args.output or default_output_path(results)
+    save_results(results, output_path)
+    sys.stderr.write(f"results written to {output_path}\n")
+    if args.compare:
+        return 1 if compare(load_results(args.compare[0]), results, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
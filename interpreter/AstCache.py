@@ -0,0 +1,186 @@
+import gc
+import hashlib
+import os
+import pickle
+import struct
+import sys
+import zlib
+
+from interpreter.Node import Node
+from interpreter.Optimizer import Optimizer
+from interpreter.Parser import Parser
+from interpreter.Resolver import Resolver
+from interpreter.Source import sources
+from interpreter.Tokenizer import Tokenizer
+
+"""
+goal:
+    AST 缓存(类似 Python 的 __pycache__)
+
+    以前每次运行都要重新 Tokenizer -> Parser -> Optimizer -> Resolver，很久没有修改过的脚本冷启动时大部分时间都花在 Parser.parse 上。
+    现在 load_program(path) 把解析(并且经过常量折叠和 Resolver 解析变量)之后的 AST 保存到源文件旁边的缓存文件中:
+        <源文件目录>/__fightcache__/<源文件名>.<解释器版本>.fightc
+    下次运行时如果源代码和解释器都没有变化，直接读取缓存文件，不再解析。
+
+    缓存文件格式(二进制):
+        MAGIC(4 字节) | 解释器版本(16 字节) | 源代码哈希(16 字节) | 源代码的 base(8 字节) | zlib 压缩的 pickle 的 AST
+    失效:
+        源代码哈希: 源文件内容的 blake2b，源文件修改后哈希不同，重新解析并覆盖缓存
+        解释器版本: Tokenizer、Parser、节点定义、Optimizer、Resolver 这些模块的源代码 + 缓存格式版本 + Python 版本的哈希，
+                  修改解释器之后旧的缓存自动失效(文件名中也带有版本，不同版本的解释器不会互相覆盖)
+    节点的 position(见 Source.py) 和登记源代码时分配的 base 有关，读取缓存时尽量用缓存中记录的 base 登记源代码，
+    只有这个 base 已经被其他源代码占用时，才需要把所有节点的 position 平移。
+    读取缓存时暂停 gc: 一次创建几万个节点会触发很多次没有用的垃圾回收。
+
+    缓存目录不可写、AST 不能 pickle(比如嵌套太深) 时不写缓存，缓存文件损坏时重新解析，都不影响运行。
+
+use:
+    from interpreter.AstCache import load_program
+    ast = load_program("main.fight")                     # 读取/写入缓存
+    ast = load_program("main.fight", use_cache=False)    # 不使用缓存
+"""
+
+MAGIC = b"FGTC"
+# 缓存格式的版本，修改格式时加 1
+CACHE_FORMAT_VERSION = 1
+CACHE_DIR = "__fightcache__"
+CACHE_SUFFIX = ".fightc"
+HEADER = struct.Struct("<4s16s16sq")
+
+# 这些模块决定了 AST 的结构，它们的源代码变化时缓存失效
+# 常量折叠用 Evaluator 计算常量表达式，所以 Evaluator.py 也在其中
+AST_MODULES = ("Tokenizer.py", "Parser.py", "Node.py", "Nodes.py", "ClassNodes.py", "Optimizer.py", "Evaluator.py",
+               "Resolver.py", "Source.py", "AstCache.py")
+
+_interpreter_version = None
+
+
+def interpreter_version():
+    # 16 字节的解释器版本，每个进程只计算一次
+    global _interpreter_version
+    if _interpreter_version is None:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{CACHE_FORMAT_VERSION}:{sys.version_info[:2]}:{pickle.HIGHEST_PROTOCOL}".encode())
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for module_file in AST_MODULES:
+            with open(os.path.join(package_dir, module_file), "rb") as module_source:
+                digest.update(module_source.read())
+        _interpreter_version = digest.digest()
+    return _interpreter_version
+
+
+def source_hash(source_bytes):
+    return hashlib.blake2b(source_bytes, digest_size=16).digest()
+
+
+def cache_path(source_path):
+    directory, file_name = os.path.split(os.path.abspath(source_path))
+    return os.path.join(directory, CACHE_DIR, f"{file_name}.{interpreter_version().hex()[:12]}{CACHE_SUFFIX}")
+
+
+def load_program(source_path, use_cache=True, write_cache=True):
+    """
+        读取 .fight 源文件，返回解析好的 AST(顶层语句的列表)
+        use_cache: 是否读取缓存; write_cache: 缓存不存在或者失效时是否写入缓存
+    """
+    with open(source_path, "rb") as source:
+        source_bytes = source.read()
+    digest = source_hash(source_bytes)
+    path = cache_path(source_path)
+
+    if use_cache:
+        ast = read_cache(path, digest, source_path, len(source_bytes))
+        if ast is not None:
+            return ast
+
+    source_code = source_bytes.decode("utf-8")
+    tokenizer = Tokenizer(source_code, source_path)
+    ast = Resolver().resolve(Optimizer().optimize(Parser(tokenizer.tokenize()).parse()))
+    if write_cache:
+        write_cache_file(path, digest, tokenizer.source_file.base, ast)
+    return ast
+
+
+def read_cache(path, digest, source_path, source_size):
+    # 缓存有效时返回 AST，否则返回 None
+    try:
+        with open(path, "rb") as cache_file:
+            header = cache_file.read(HEADER.size)
+            if len(header) != HEADER.size:
+                return None
+            magic, version, cached_digest, cached_base = HEADER.unpack(header)
+            if magic != MAGIC or version != interpreter_version() or cached_digest != digest:
+                return None
+            data = zlib.decompress(cache_file.read())
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            ast = pickle.loads(data)
+        finally:
+            if gc_enabled:
+                gc.enable()
+    except (OSError, zlib.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+        return None
+    # 登记源代码(位置还原成行列时才读取文件)，base 和写缓存时不同就平移节点的位置
+    source_file = sources.add(source_path, None, size=source_size, path=source_path, base=cached_base)
+    if source_file.base != cached_base:
+        relocate_positions(ast, source_file.base - cached_base)
+    return ast
+
+
+def write_cache_file(path, digest, base, ast):
+    try:
+        data = zlib.compress(pickle.dumps(ast, protocol=pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, RecursionError, TypeError, AttributeError):
+        return False
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, "wb") as cache_file:
+            cache_file.write(HEADER.pack(MAGIC, interpreter_version(), digest, base))
+            cache_file.write(data)
+        # 先写临时文件再改名，其他进程不会读到写了一半的缓存
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def relocate_positions(ast, delta):
+    # 所有节点的 position 加上 delta(用栈遍历，不受递归深度限制)
+    stack = [ast]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, Node):
+            if value.position is not None:
+                value.position += delta
+            for name in value._fields:
+                stack.append(getattr(value, name))
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+
+
+# 测量缓存的效果: python -m interpreter.AstCache 文件.fight
+if __name__ == '__main__':
+    import time
+
+    sys.setrecursionlimit(10000)
+    path = sys.argv[1]
+    start = time.perf_counter()
+    load_program(path, use_cache=False, write_cache=False)
+    parse_time = time.perf_counter() - start
+    load_program(path)
+    start = time.perf_counter()
+    load_program(path)
+    cached_time = time.perf_counter() - start
+    print("parse:  %.4fs" % parse_time)
+    print("cached: %.4fs" % cached_time)
+    print("source file: ", path, os.path.getsize(path), "bytes")
+    print("cache file: ", cache_path(path), os.path.getsize(cache_path(path)), "bytes")
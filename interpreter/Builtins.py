@@ -0,0 +1,91 @@
+from colorama import Fore, Back
+
+from interpreter.LazySequence import lazy, read_lines
+from interpreter.utils.FileDir import FileSystemUtils
+from interpreter.utils.Random import RandomUtils
+from interpreter.utils.Time import TimeUtils
+from interpreter.utils.common import CommonUtils
+from interpreter.utils.datastructure.DictUtils import DictUtils
+from interpreter.utils.datastructure.ListUtils import ListUtils
+from interpreter.utils.datastructure.StringUtils import StringUtils
+from interpreter.utils.math.MathUtils import MathUtils
+
+"""
+goal:
+    内置函数注册表
+
+    以前 evaluate_function_call 每次调用都要:
+        1, 依次比较几十个 if node.name == "xxx"
+        2, 重新创建 color_map
+        3, 依次调用 dir(StringUtils)、dir(FileSystemUtils)... 每个 dir() 都会新建并排序一个列表
+    用户自定义的函数要等这些都比较完才能被调用。
+
+    现在:
+        NATIVE_BUILTINS: 函数名 -> Python 函数，在 import 时从 utils 中的工具类构建一次，
+                         调用时参数先求值，再调用 func(*args)
+        Evaluator.builtins: 需要访问解释器(未求值的参数节点、environment)的内置函数，
+                            函数名 -> Evaluator 的方法，创建 Evaluator 时构建一次
+        Evaluator.native_builtins: Evaluator.register_builtin 注册的、只对这个求值器有效的函数
+    调用函数时先查找用户自定义的函数，再查 Evaluator.builtins、Evaluator.native_builtins，最后查 NATIVE_BUILTINS，
+    每一步都是一次字典查找。NATIVE_BUILTINS 不会复制到求值器中，随时注册的函数对已经创建的求值器也有效。
+
+use:
+    嵌入解释器时注册自己的内置函数:
+        from interpreter.Builtins import register_builtin
+        register_builtin("Twice", lambda x: x * 2)          # 所有 Evaluator 可用
+
+        @builtin("Greet")
+        def greet(name):
+            return f"hello {name}"
+
+        evaluator.register_builtin("Only", func)           # 只对这个 Evaluator 可用
+"""
+
+# 工具类，排在前面的优先(和以前 if 判断的顺序一致)
+UTILS_CLASSES = (StringUtils, FileSystemUtils, RandomUtils, ListUtils, DictUtils, MathUtils, CommonUtils, TimeUtils)
+
+# 带颜色的打印函数: 函数名 -> (前景色, 背景色)
+COLOR_PRINTERS = {
+    'printlnRed': (Fore.RED, None),
+    'printlnYellow': (Fore.YELLOW, None),
+    'printlnBlue': (Fore.BLUE, None),
+    'printlnCyan': (Fore.CYAN, None),
+    'printlnRedBg': (Fore.RESET, Back.RED),
+    'printlnLightGreen': (Fore.LIGHTGREEN_EX, None)
+}
+
+# 函数名 -> Python 函数
+NATIVE_BUILTINS = {}
+
+
+def register_builtin(name, func):
+    """
+        注册一个内置函数，Fight 代码中调用 name(a, b) 时执行 func(a, b)(参数已经求值)
+        同名的内置函数会被覆盖，用户自定义的同名函数优先
+    """
+    if not callable(func):
+        raise TypeError(f"builtin '{name}' must be callable, but got {type(func)}")
+    NATIVE_BUILTINS[name] = func
+    return func
+
+
+def builtin(name):
+    # 装饰器形式的 register_builtin
+    def decorator(func):
+        return register_builtin(name, func)
+
+    return decorator
+
+
+def register_utils(*utils_classes):
+    # 把工具类的公开方法注册为内置函数，排在前面的类优先
+    for utils_class in reversed(utils_classes):
+        for name in dir(utils_class):
+            if not name.startswith("_"):
+                register_builtin(name, getattr(utils_class, name))
+
+
+register_utils(*UTILS_CLASSES)
+# 惰性序列的来源(见 LazySequence.py)
+register_builtin("Lazy", lazy)
+register_builtin("ReadLines", read_lines)
@@ -0,0 +1,545 @@
+from interpreter.Nodes import AssignmentNode, NumberNode, BinaryOpNode, VariableNode, StringNode, ListNode, \
+    ObjectNode, FunctionDeclarationNode, IfStatementNode, BooleanNode, LoopNode, BreakNode, ReturnNode, ForInNode, \
+    CommentNode, ForRangeNumberNode, IncrementNode, DecrementNode, UnaryOpNode, DoWhileNode, ConstantNode, ContinueNode
+
+"""
+goal:
+    字节码编译器: 把 Nodes.py / ClassNodes.py 的 AST 编译成紧凑的字节码，交给 VM.py 中的栈式虚拟机执行
+
+    - 操作数栈: 表达式的值压到栈上，运算从栈顶取操作数
+    - 局部槽位(slot): for(i: 1 to n) 的循环变量不放在 Scope 的 dict 里，
+      而是放在按下标访问的 slots 列表中，编译时就确定好下标(LOAD_FAST / STORE_FAST)
+    - 其他变量仍然通过 evaluator.environment 按名字访问(LOAD_NAME / STORE_NAME)，
+      for in 的循环变量用 DEFINE_NAME 定义在循环自己的块作用域中(和 Evaluator 一样不覆盖外层的同名变量)
+    - 没有编译规则的节点(类、函数调用等)编译成 EVAL_NODE / EVAL_STMT，交给 Evaluator 执行，
+      如果此时有活动的局部槽位，VM 会先把槽位同步到当前块作用域，执行完再同步回来
+    - 只编译顶层语句: 函数定义也交给 Evaluator，函数体不编译成字节码，调用时由 Evaluator 解释执行
+
+    指令是 (opcode, arg) 元组，编译结果是 CodeObject，disassemble() 可以把它打印成可读的形式
+"""
+
+# =============================操作码=============================
+LOAD_CONST = 0  # push consts[arg]
+LOAD_FAST = 1  # push slots[arg]
+STORE_FAST = 2  # slots[arg] = pop()
+LOAD_NAME = 3  # push environment[names[arg]]
+STORE_NAME = 4  # environment[names[arg]] = pop()
+STORE_CONST_NAME = 5  # 声明常量 const x = ...
+BINARY_OP = 6  # 运算符名称，比如 'PLUS'
+UNARY_NOT = 7
+BUILD_LIST = 8  # arg: 元素个数
+BUILD_OBJECT = 9  # arg: consts 中 key 元组的下标
+POP_TOP = 10
+DUP_TOP = 11
+JUMP = 12  # 跳转到 arg
+POP_JUMP_IF_FALSE = 13
+POP_JUMP_IF_TRUE = 14
+RANGE_ITER = 15  # 弹出 end, start(arg 为 "step" 时先弹出 step)，压入 for(i: start to end step n) 的迭代器
+GET_ITER = 16  # 弹出对象，压入 iter(对象)
+FOR_ITER = 17  # 从栈顶迭代器取下一个元素，迭代结束时弹出迭代器并跳转到 arg
+PUSH_BLOCK = 18  # 进入循环的块作用域
+POP_BLOCK = 19  # 退出循环的块作用域
+INC_NAME = 20  # arg: (names 下标, 增量)  id++ / id--
+INC_FAST = 21  # arg: (slot 下标, 增量)
+EVAL_NODE = 22  # 交给 Evaluator 求值，结果压栈; arg: consts 中节点的下标
+EVAL_STMT = 23  # 交给 Evaluator 执行，丢弃结果; 返回 break/continue 信号时跳转到所在循环的出口/入口
+RETURN_VALUE = 24  # 结束执行，返回栈顶
+DEFINE_NAME = 25  # 在当前块作用域中定义 names[arg] = pop()，不修改外层的同名变量
+EXIT_STATEMENT = 26  # 顶层语句中的 return: arg 是 (要退出的 for 循环层数, StatementExit)
+
+OPCODE_NAMES = {
+    LOAD_CONST: "LOAD_CONST",
+    LOAD_FAST: "LOAD_FAST",
+    STORE_FAST: "STORE_FAST",
+    LOAD_NAME: "LOAD_NAME",
+    STORE_NAME: "STORE_NAME",
+    STORE_CONST_NAME: "STORE_CONST_NAME",
+    BINARY_OP: "BINARY_OP",
+    UNARY_NOT: "UNARY_NOT",
+    BUILD_LIST: "BUILD_LIST",
+    BUILD_OBJECT: "BUILD_OBJECT",
+    POP_TOP: "POP_TOP",
+    DUP_TOP: "DUP_TOP",
+    JUMP: "JUMP",
+    POP_JUMP_IF_FALSE: "POP_JUMP_IF_FALSE",
+    POP_JUMP_IF_TRUE: "POP_JUMP_IF_TRUE",
+    RANGE_ITER: "RANGE_ITER",
+    GET_ITER: "GET_ITER",
+    FOR_ITER: "FOR_ITER",
+    PUSH_BLOCK: "PUSH_BLOCK",
+    POP_BLOCK: "POP_BLOCK",
+    INC_NAME: "INC_NAME",
+    INC_FAST: "INC_FAST",
+    EVAL_NODE: "EVAL_NODE",
+    EVAL_STMT: "EVAL_STMT",
+    RETURN_VALUE: "RETURN_VALUE",
+    DEFINE_NAME: "DEFINE_NAME",
+    EXIT_STATEMENT: "EXIT_STATEMENT",
+}
+
+
+class CodeObject:
+    """
+        编译结果
+            instructions: [(opcode, arg), ...]
+            consts: 常量表(数字、字符串、交给 Evaluator 执行的节点)
+            names: 按名字访问的变量名表
+            slot_names: 局部槽位对应的变量名, 下标就是槽位号
+    """
+
+    def __init__(self, instructions, consts, names, slot_names):
+        self.instructions = instructions
+        self.consts = consts
+        self.names = names
+        self.slot_names = slot_names
+
+    def __repr__(self):
+        return f"CodeObject(instructions={len(self.instructions)}, consts={len(self.consts)}, " \
+               f"names={self.names}, slot_names={self.slot_names})"
+
+
+class LoopLabels:
+    # 记录当前循环的 break/continue 需要跳转的位置(编译完循环之后回填)
+    def __init__(self, has_iterator):
+        self.has_iterator = has_iterator  # for 循环的栈顶有迭代器，break 之前要先弹出
+        self.break_jumps = []
+        self.continue_jumps = []
+        # 循环的出口和下一次迭代的入口，EVAL_STMT 执行的语句返回 break/continue 信号时使用
+        self.break_target = None
+        self.continue_target = None
+
+
+class StatementExit:
+    """
+        顶层语句的出口(编译完这条语句之后回填 target)
+        和 Evaluator 一样，顶层的 return 结束当前的顶层语句(包括外面的所有循环)，后面的顶层语句继续执行
+    """
+    def __init__(self):
+        self.target = None
+
+
+class BytecodeCompiler:
+    def __init__(self, legacy_loop_exit=False):
+        # 和 Evaluator(legacy_loop_exit=True) 一起使用时，loop 整个交给 Evaluator 执行
+        self.legacy_loop_exit = legacy_loop_exit
+        self.instructions = []
+        self.consts = []
+        self.const_index = {}
+        self.names = []
+        self.name_index = {}
+        self.slot_names = []
+        # 当前可见的局部槽位 {变量名: 槽位号}，每进入一个 for(i: a to b) 就压入一层，
+        # for in 压入 {变量名: None}，表示这个名字被按名字访问的循环变量遮住了
+        self.slot_scopes = []
+        self.loops = []
+        # 当前顶层语句的出口，return 跳到这里
+        self.statement_exit = None
+        # 节点类型 -> 编译方法, 分为表达式(结果留在栈上)和语句两张表
+        self.expr_table = {
+            ConstantNode: self.compile_constant,
+            NumberNode: self.compile_number,
+            StringNode: self.compile_string,
+            BooleanNode: self.compile_boolean,
+            VariableNode: self.compile_variable,
+            BinaryOpNode: self.compile_binary_op,
+            UnaryOpNode: self.compile_unary_op,
+            ListNode: self.compile_list,
+            ObjectNode: self.compile_object,
+        }
+        self.stmt_table = {
+            AssignmentNode: self.compile_assignment,
+            IfStatementNode: self.compile_if_statement,
+            LoopNode: self.compile_loop,
+            DoWhileNode: self.compile_do_while,
+            ForRangeNumberNode: self.compile_for_range_number,
+            ForInNode: self.compile_for_in,
+            IncrementNode: self.compile_increment,
+            DecrementNode: self.compile_decrement,
+            BreakNode: self.compile_break,
+            ContinueNode: self.compile_continue,
+            ReturnNode: self.compile_return,
+            CommentNode: self.compile_comment,
+        }
+
+    def compile_program(self, ast) -> CodeObject:
+        """
+            编译整个程序(Parser.parse()的结果)
+        """
+        for statement in ast:
+            self.statement_exit = StatementExit()
+            self.compile_statement(statement)
+            self.statement_exit.target = len(self.instructions)
+        self.emit(LOAD_CONST, self.add_const(None))
+        self.emit(RETURN_VALUE)
+        return CodeObject(self.instructions, self.consts, self.names, self.slot_names)
+
+    # ===========================工具方法===========================
+
+    def emit(self, opcode, arg=None):
+        self.instructions.append((opcode, arg))
+        return len(self.instructions) - 1
+
+    def patch(self, position, target):
+        # 回填跳转指令的目标
+        opcode, _ = self.instructions[position]
+        self.instructions[position] = (opcode, target)
+
+    def add_const(self, value):
+        # 节点等不可哈希的常量按 id 去重
+        key = (type(value), value) if isinstance(value, (int, float, str, bool, type(None))) else id(value)
+        if key not in self.const_index:
+            self.const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return self.const_index[key]
+
+    def add_name(self, name):
+        if name not in self.name_index:
+            self.name_index[name] = len(self.names)
+            self.names.append(name)
+        return self.name_index[name]
+
+    def lookup_slot(self, name):
+        # 由内向外查找局部槽位，被 for in 的循环变量遮住时返回 None(按名字访问)
+        for slots in reversed(self.slot_scopes):
+            if name in slots:
+                return slots[name]
+        return None
+
+    def active_slots(self):
+        # 当前所有可见的 (槽位号, 变量名)，交给 Evaluator 执行节点之前需要同步
+        visible = {}
+        for slots in self.slot_scopes:
+            visible.update(slots)
+        return tuple((slot, name) for name, slot in visible.items() if slot is not None)
+
+    def return_exit(self):
+        # return 需要弹出的 for 循环(栈上的迭代器和块作用域)的层数，和当前顶层语句的出口
+        depth = sum(1 for labels in self.loops if labels.has_iterator)
+        return depth, self.statement_exit
+
+    # ===========================表达式===========================
+
+    def compile_expr(self, node):
+        compile_method = self.expr_table.get(type(node))
+        if compile_method is None:
+            self.emit(EVAL_NODE, (self.add_const(node), self.active_slots()))
+        else:
+            compile_method(node)
+
+    def compile_constant(self, node: ConstantNode):
+        self.emit(LOAD_CONST, self.add_const(node.value))
+
+    def compile_number(self, node: NumberNode):
+        try:
+            value = float(node.value) if '.' in node.value else int(node.value)
+        except ValueError:
+            raise ValueError(f"Invalid number: {node.value}")
+        self.emit(LOAD_CONST, self.add_const(value))
+
+    def compile_string(self, node: StringNode):
+        if node.parts is not None:
+            # 模板字符串需要运行时的环境，交给 Evaluator
+            self.emit(EVAL_NODE, (self.add_const(node), self.active_slots()))
+        else:
+            self.emit(LOAD_CONST, self.add_const(node.value))
+
+    def compile_boolean(self, node: BooleanNode):
+        value = True if node.value == "True" else False if node.value == "False" else None
+        self.emit(LOAD_CONST, self.add_const(value))
+
+    def compile_variable(self, node: VariableNode):
+        slot = self.lookup_slot(node.value)
+        if slot is not None:
+            self.emit(LOAD_FAST, slot)
+        else:
+            self.emit(LOAD_NAME, self.add_name(node.value))
+
+    def compile_binary_op(self, node: BinaryOpNode):
+        # a + b + c + ... 是向左展开的链，沿 left 循环向下，不按链的长度递归
+        chain = []
+        while node.__class__ is BinaryOpNode:
+            chain.append(node)
+            node = node.left
+        self.compile_expr(node)
+        for link in reversed(chain):
+            self.compile_expr(link.right)
+            self.emit(BINARY_OP, link.op)
+
+    def compile_unary_op(self, node: UnaryOpNode):
+        if node.operator != 'not':
+            raise ValueError(f"Unknown operator: {node.operator}")
+        self.compile_expr(node.operand)
+        self.emit(UNARY_NOT)
+
+    def compile_list(self, node: ListNode):
+        for element in node.elements:
+            self.compile_expr(element)
+        self.emit(BUILD_LIST, len(node.elements))
+
+    def compile_object(self, node: ObjectNode):
+        keys = tuple(node.k_v.keys())
+        for value in node.k_v.values():
+            self.compile_expr(value)
+        self.emit(BUILD_OBJECT, self.add_const(keys))
+
+    # ===========================语句===========================
+
+    def compile_statement(self, node):
+        compile_method = self.stmt_table.get(type(node))
+        if compile_method is not None:
+            compile_method(node)
+        elif type(node) in self.expr_table:
+            # 表达式语句，值不需要
+            self.compile_expr(node)
+            self.emit(POP_TOP)
+        else:
+            self.emit_eval_stmt(node)
+
+    def emit_eval_stmt(self, node):
+        # 交给 Evaluator 执行的语句可能返回 break/continue/return 信号，记录所在的循环和 return 的出口
+        labels = self.loops[-1] if self.loops else None
+        self.emit(EVAL_STMT, (self.add_const(node), self.active_slots(), labels, self.return_exit()))
+
+    def compile_body(self, statements):
+        for statement in statements:
+            self.compile_statement(statement)
+
+    def compile_assignment(self, node: AssignmentNode):
+        if isinstance(node.value, FunctionDeclarationNode):
+            # 函数赋值需要记录定义时的作用域，交给 Evaluator
+            self.emit_eval_stmt(node)
+            return
+        self.compile_expr(node.value)
+        slot = self.lookup_slot(node.name)
+        if slot is not None and not node.is_constant:
+            self.emit(STORE_FAST, slot)
+        elif node.is_constant:
+            self.emit(STORE_CONST_NAME, self.add_name(node.name))
+        else:
+            self.emit(STORE_NAME, self.add_name(node.name))
+
+    def compile_if_statement(self, node: IfStatementNode):
+        """
+            if(c1){...} elif(c2){...} else{...}
+                <c1>
+                POP_JUMP_IF_FALSE next1
+                <body1>
+                JUMP end
+            next1:
+                <c2>
+                ...
+            end:
+        """
+        end_jumps = []
+        branches = [(node.condition, node.if_body)] + \
+                   [(elif_dict['condition'], elif_dict['elif_statements']) for elif_dict in node.elif_]
+        for condition, body in branches:
+            self.compile_expr(condition)
+            jump_next = self.emit(POP_JUMP_IF_FALSE)
+            self.compile_branch(body)
+            end_jumps.append(self.emit(JUMP))
+            self.patch(jump_next, len(self.instructions))
+        self.compile_branch(node.else_)
+        for position in end_jumps:
+            self.patch(position, len(self.instructions))
+
+    def compile_branch(self, statements):
+        for statement in statements:
+            self.compile_statement(statement)
+            if isinstance(statement, ReturnNode):
+                # return 之后的语句不会执行
+                return
+
+    def compile_return(self, node: ReturnNode):
+        """
+            顶层的 return: 求值(值不需要)，然后退出所在的 for 循环，跳到当前顶层语句的出口
+                <value>
+                POP_TOP
+                EXIT_STATEMENT (for 循环层数, 出口)
+        """
+        self.compile_expr(node.value)
+        self.emit(POP_TOP)
+        self.emit(EXIT_STATEMENT, self.return_exit())
+
+    def compile_comment(self, node: CommentNode):
+        pass
+
+    def compile_loop(self, node: LoopNode):
+        """
+            loop(cond){...}
+            start:
+                <cond>
+                POP_JUMP_IF_FALSE end
+                <body>
+                JUMP start
+            end:
+        """
+        if self.legacy_loop_exit:
+            self.emit_eval_stmt(node)
+            return
+        start = len(self.instructions)
+        self.compile_expr(node.condition)
+        jump_end = self.emit(POP_JUMP_IF_FALSE)
+        labels = LoopLabels(has_iterator=False)
+        labels.continue_target = start
+        self.loops.append(labels)
+        self.compile_body(node.body)
+        self.loops.pop()
+        self.emit(JUMP, start)
+        end = len(self.instructions)
+        self.patch(jump_end, end)
+        self.finish_loop(labels, end)
+
+    def compile_do_while(self, node: DoWhileNode):
+        """
+            do{...}while(cond)
+            start:
+                <body>
+                <cond>
+                POP_JUMP_IF_TRUE start
+        """
+        start = len(self.instructions)
+        labels = LoopLabels(has_iterator=False)
+        self.loops.append(labels)
+        self.compile_body(node.body)
+        self.loops.pop()
+        labels.continue_target = len(self.instructions)
+        self.compile_expr(node.condition)
+        self.emit(POP_JUMP_IF_TRUE, start)
+        self.finish_loop(labels, len(self.instructions))
+
+    def compile_for_range_number(self, node: ForRangeNumberNode):
+        """
+            for(i: a to b step s){...}  循环变量 i 放在局部槽位中
+                <a>
+                <b>
+                <s>             (有 step 时)
+                RANGE_ITER      有 step 时 arg 是 "step"
+                PUSH_BLOCK
+            start:
+                FOR_ITER end
+                STORE_FAST i
+                <body>
+                JUMP start
+            end:
+                POP_BLOCK
+        """
+        self.compile_expr(node.start_num)
+        self.compile_expr(node.end_num)
+        if node.step is not None:
+            self.compile_expr(node.step)
+        self.emit(RANGE_ITER, "step" if node.step is not None else None)
+        slot = len(self.slot_names)
+        self.slot_names.append(node.var_name)
+        self.slot_scopes.append({node.var_name: slot})
+        self.compile_iteration(node.body, (STORE_FAST, slot))
+        self.slot_scopes.pop()
+
+    def compile_for_in(self, node: ForInNode):
+        self.compile_expr(node.iteration_obj)
+        self.emit(GET_ITER)
+        # for in 的循环变量按名字定义在块作用域中(STORE_NAME 会沿作用域链修改外层的同名变量)，
+        # 循环体中同名的外层槽位变量被遮住，也要按名字访问
+        self.slot_scopes.append({node.variable: None})
+        self.compile_iteration(node.body, (DEFINE_NAME, self.add_name(node.variable)))
+        self.slot_scopes.pop()
+
+    def compile_iteration(self, body, store_instruction):
+        # for 循环的公共部分: 栈顶已经是迭代器
+        self.emit(PUSH_BLOCK)
+        start = self.emit(FOR_ITER)
+        self.emit(*store_instruction)
+        labels = LoopLabels(has_iterator=True)
+        labels.continue_target = start
+        self.loops.append(labels)
+        self.compile_body(body)
+        self.loops.pop()
+        self.emit(JUMP, start)
+        end = len(self.instructions)
+        self.patch(start, end)
+        self.finish_loop(labels, end)
+        self.emit(POP_BLOCK)
+
+    def finish_loop(self, labels, end):
+        # 回填 break/continue 的跳转目标
+        labels.break_target = end
+        for position in labels.break_jumps:
+            self.patch(position, end)
+        for position in labels.continue_jumps:
+            self.patch(position, labels.continue_target)
+
+    def compile_break(self, node: BreakNode):
+        if not self.loops:
+            # 循环外的 break 没有效果，交给 Evaluator
+            self.emit_eval_stmt(node)
+            return
+        labels = self.loops[-1]
+        if labels.has_iterator:
+            self.emit(POP_TOP)
+        labels.break_jumps.append(self.emit(JUMP))
+
+    def compile_continue(self, node: ContinueNode):
+        if not self.loops:
+            # 循环外的 continue 没有效果，交给 Evaluator
+            self.emit_eval_stmt(node)
+            return
+        # 跳到下一次迭代的入口: loop 的条件、do while 的条件、for 的 FOR_ITER(迭代器留在栈上)
+        self.loops[-1].continue_jumps.append(self.emit(JUMP))
+
+    def compile_increment(self, node: IncrementNode):
+        self.compile_step(node.var_name, 1)
+
+    def compile_decrement(self, node: DecrementNode):
+        self.compile_step(node.var_name, -1)
+
+    def compile_step(self, var_name, delta):
+        slot = self.lookup_slot(var_name)
+        if slot is not None:
+            self.emit(INC_FAST, (slot, delta))
+        else:
+            self.emit(INC_NAME, (self.add_name(var_name), delta))
+
+
+def disassemble(code: CodeObject):
+    """
+        把字节码转换成可读的文本，比如:
+            0 LOAD_CONST           0 (0)
+            1 STORE_NAME           0 (total)
+    """
+    jump_targets = set()
+    for opcode, arg in code.instructions:
+        if opcode in (JUMP, POP_JUMP_IF_FALSE, POP_JUMP_IF_TRUE, FOR_ITER):
+            jump_targets.add(arg)
+        elif opcode == EXIT_STATEMENT:
+            jump_targets.add(arg[1].target)
+
+    lines = []
+    for position, (opcode, arg) in enumerate(code.instructions):
+        marker = ">>" if position in jump_targets else "  "
+        name = OPCODE_NAMES[opcode]
+        if opcode == LOAD_CONST:
+            detail = f"{arg} ({code.consts[arg]!r})"
+        elif opcode in (LOAD_FAST, STORE_FAST):
+            detail = f"{arg} ({code.slot_names[arg]})"
+        elif opcode in (LOAD_NAME, STORE_NAME, STORE_CONST_NAME, DEFINE_NAME):
+            detail = f"{arg} ({code.names[arg]})"
+        elif opcode == INC_NAME:
+            detail = f"{arg[0]} ({code.names[arg[0]]} {arg[1]:+d})"
+        elif opcode == INC_FAST:
+            detail = f"{arg[0]} ({code.slot_names[arg[0]]} {arg[1]:+d})"
+        elif opcode == BUILD_OBJECT:
+            detail = f"{arg} (keys={code.consts[arg]})"
+        elif opcode == EXIT_STATEMENT:
+            detail = f"to {arg[1].target} (exit {arg[0]} for)"
+        elif opcode in (EVAL_NODE, EVAL_STMT):
+            node = code.consts[arg[0]]
+            synced = ", ".join(name for _, name in arg[1])
+            detail = f"{arg[0]} ({type(node).__name__})" + (f" sync[{synced}]" if synced else "")
+        elif opcode in (JUMP, POP_JUMP_IF_FALSE, POP_JUMP_IF_TRUE, FOR_ITER):
+            detail = f"to {arg}"
+        elif arg is None:
+            detail = ""
+        else:
+            detail = str(arg)
+        lines.append(f"{marker}{position:>5} {name:<20} {detail}".rstrip())
+    return "\n".join(lines)
@@ -3,9 +3,11 @@ from interpreter.Node import Node
 
 # 接口定义
 class InterfaceNode(Node):
-    def __init__(self, interface_name, methods: list = []):
+    __slots__ = _fields = ("interface_name", "methods")
+
+    def __init__(self, interface_name, methods: list = None):
         self.interface_name = interface_name
-        self.methods = methods
+        self.methods = [] if methods is None else methods
 
     def __repr__(self):
         return f"Interfacenode(interface_name = {self.interface_name},methods = {self.methods})"
@@ -13,6 +15,8 @@ class InterfaceNode(Node):
 
 # return this; 这样的语句  this的使用需要记录当前的类名
 class ThisNode(Node):
+    __slots__ = _fields = ()
+
     def __init__(self):
         pass
 
@@ -22,6 +26,8 @@ class ThisNode(Node):
 
 # this->xx(); 这样的语句  this的使用需要记录当前的类名
 class CallClassInnerMethod(Node):
+    __slots__ = _fields = ("method_name", "arguments")
+
     def __init__(self, method_name, arguments):
         # self.current_class_name = current_class_name
         self.method_name = method_name
@@ -40,6 +46,8 @@ class CallClassInnerMethod(Node):
 #     def __repr__(self):
 #         return f"GetMemberNode(instance_name = {self.instance_name},member_name = {self.member_name})"
 class GetMemberNode(Node):
+    __slots__ = _fields = ("instance_or_class_name", "member_name")
+
     def __init__(self, instance_or_class_name, member_name):
         self.instance_or_class_name = instance_or_class_name
         # member_name 可能是属性名，也可能是方法名
@@ -52,6 +60,8 @@ class GetMemberNode(Node):
 # 比如  let p = new Person("Tom", 20);
 # p->sayHello(); 这样的表达式
 class MethodCallNode(Node):
+    __slots__ = _fields = ("instance_name", "method_name", "arguments")
+
     def __init__(self, instance_name, method_name, arguments):
         self.instance_name = instance_name
         self.method_name = method_name
@@ -63,19 +73,23 @@ class MethodCallNode(Node):
 
 # let z = new 类名(参数); 这样的表达式
 class NewObjectNode(Node):
-    def __init__(self, object_name, class_name, arguments: list = []):
+    __slots__ = _fields = ("object_name", "class_name", "arguments")
+
+    def __init__(self, object_name, class_name, arguments: list = None):
         self.object_name = object_name
         self.class_name = class_name
-        self.arguments = arguments  # 只能是位置参数
+        self.arguments = [] if arguments is None else arguments  # 只能是位置参数
 
     def __repr__(self):
         return f"NewObjectNode(object_name = {self.object_name},class_name = {self.class_name},arguments = {self.arguments})"
 
 
 class ClassDeclarationNode(Node):
+    __slots__ = _fields = ("classname", "methods", "fields", "init", "static_methods", "static_fields", "parent_name", "interfaces", "fields_annotations")
+
     def __init__(self, classname, methods=None, fields=None, init=None, static_methods=None, static_fields=None,
-                 parent_name = "",interfaces: list = [],fields_annotations:dict = {}):
-        self.fields_annotations = fields_annotations
+                 parent_name = "",interfaces: list = None,fields_annotations:dict = None):
+        self.fields_annotations = {} if fields_annotations is None else fields_annotations
         self.classname = classname
         self.methods = methods
         self.fields = fields
@@ -86,7 +100,7 @@ class ClassDeclarationNode(Node):
         # 继承的父类
         self.parent_name = parent_name
         # 实现的接口
-        self.interfaces = interfaces
+        self.interfaces = [] if interfaces is None else interfaces
         # 格式: annotations: {方法名称:{key:value}}
 
     def __repr__(self):
@@ -94,6 +108,8 @@ class ClassDeclarationNode(Node):
 
 
 class MethodDeclarationNode(Node):
+    __slots__ = _fields = ("class_name", "params", "body", "is_public")
+
     def __init__(self, class_name, params, body, is_public=True):
         self.class_name = class_name
         self.is_public = is_public
@@ -105,6 +121,8 @@ class MethodDeclarationNode(Node):
 
 
 class AttributeDeclarationNode(Node):
+    __slots__ = _fields = ("name", "value")
+
     def __init__(self, name, value):
         self.name = name
         self.value = value
@@ -114,6 +132,8 @@ class AttributeDeclarationNode(Node):
 
 
 class NewInstanceNode(Node):
+    __slots__ = _fields = ("class_name", "arguments")
+
     def __init__(self, class_name, arguments):
         self.class_name = class_name
         self.arguments = arguments
@@ -123,6 +143,8 @@ class NewInstanceNode(Node):
 
 # this->属性名称; 这样的表达式  this的使用需要记录当前的类名
 class GetMemberNodeByThis(Node):
+    __slots__ = _fields = ("member_name",)
+
     def __init__(self, member_name):
         self.member_name = member_name
     def __repr__(self):
@@ -0,0 +1,401 @@
+from interpreter.Evaluator import Evaluator, ControlSignal, RETURN_SIGNAL, BREAK_SIGNAL, CONTINUE_SIGNAL, number_range, \
+    BINARY_OPERATORS
+from interpreter.Nodes import AssignmentNode, NumberNode, BinaryOpNode, VariableNode, StringNode, ListNode, \
+    ObjectNode, FunctionDeclarationNode, IfStatementNode, BooleanNode, LoopNode, BreakNode, ReturnNode, ForInNode, \
+    CommentNode, IfExprNode, ForRangeNumberNode, IncrementNode, DecrementNode, UnaryOpNode, DoWhileNode, ConstantNode, \
+    ContinueNode
+from interpreter.Parser import Parser
+from interpreter.Resolver import Resolver
+from interpreter.Scope import Scope, UNSET
+from interpreter.Tokenizer import Tokenizer
+
+"""
+goal:
+    闭包编译(closure compilation)执行模式
+
+    Evaluator 每执行一次语句都要重新走一遍 evaluate() 的分派，
+    evaluate_binary_op 每次还要查一次运算符表。
+    Compiler 在执行之前把 Parser.parse() 得到的每个节点编译成一个预先绑定好的 Python 闭包(无参数函数)，
+    运算符在编译时就解析成 operator.add 这样的函数，循环直接反复调用编译好的闭包，
+    "判断节点类型、判断运算符" 的开销每个节点只付一次，而不是每次执行都付一次。
+
+    没有专门编译规则的节点(类、函数调用、结构体等)编译成 lambda: evaluator.evaluate(node)，
+    所以编译模式和 Evaluator 的语义完全一致，Evaluator 仍然是参考实现。
+    闭包运行时通过 evaluator.environment 访问当前作用域，所以和函数调用、作用域链可以混用。
+
+    限制(实验性的执行后端): 只编译顶层语句。函数、lambda、方法的函数体不编译，调用时由 Evaluator 解释执行，
+    所以只有顶层的循环、赋值、表达式变快，主要代码都在函数和类里面的程序和 tree 后端的速度基本一样。
+
+use:
+    compiler = Compiler()
+    program = compiler.compile_program(ast)
+    program()    # 可以反复执行
+    python -m interpreter.main hello.fight --backend closure
+"""
+
+
+class Compiler:
+    def __init__(self, evaluator: Evaluator = None):
+        # 编译出来的闭包共用这个求值器的环境
+        self.evaluator = evaluator if evaluator is not None else Evaluator()
+        self.run_loop = self.make_loop_runner()
+        # 节点类型 -> 编译方法
+        self.compile_table = {
+            ConstantNode: self.compile_constant,
+            NumberNode: self.compile_number,
+            StringNode: self.compile_string,
+            BooleanNode: self.compile_boolean,
+            VariableNode: self.compile_variable,
+            BinaryOpNode: self.compile_binary_op,
+            UnaryOpNode: self.compile_unary_op,
+            ListNode: self.compile_list,
+            ObjectNode: self.compile_object,
+            AssignmentNode: self.compile_assignment,
+            IfStatementNode: self.compile_if_statement,
+            IfExprNode: self.compile_if_expr,
+            LoopNode: self.compile_loop,
+            DoWhileNode: self.compile_do_while,
+            ForRangeNumberNode: self.compile_for_range_number,
+            ForInNode: self.compile_for_in,
+            IncrementNode: self.compile_increment,
+            DecrementNode: self.compile_decrement,
+            BreakNode: self.compile_break,
+            ContinueNode: self.compile_continue,
+            ReturnNode: self.compile_return,
+            CommentNode: self.compile_comment,
+        }
+
+    def compile(self, node):
+        """
+            把一个节点编译成无参数的闭包，调用闭包得到和 evaluator.evaluate(node) 一样的结果
+        """
+        compile_method = self.compile_table.get(type(node))
+        if compile_method is None:
+            return self.compile_fallback(node)
+        return compile_method(node)
+
+    def compile_block(self, statements):
+        # 编译一组语句, 返回闭包的元组
+        return tuple(self.compile(statement) for statement in statements)
+
+    def compile_body(self, statements):
+        """
+            编译代码块(if/循环体)，执行时和 Evaluator.execute_block 一样:
+            遇到 return/break/continue 信号就停止，并把信号返回给外层
+        """
+        code = self.compile_block(statements)
+
+        def run_block():
+            for statement in code:
+                result = statement()
+                if result.__class__ is ControlSignal:
+                    return result
+            return None
+
+        return run_block
+
+    def compile_program(self, ast):
+        """
+            编译整个程序(Parser.parse()的结果)，返回一个可以反复执行的函数
+        """
+        code = self.compile_block(ast)
+
+        def program():
+            result = None
+            for statement in code:
+                result = statement()
+            return result
+
+        return program
+
+    # ===========================编译规则===========================
+
+    def compile_fallback(self, node):
+        # 没有编译规则的节点交给 Evaluator 解释执行
+        evaluate = self.evaluator.evaluate
+        return lambda: evaluate(node)
+
+    def compile_constant(self, node: ConstantNode):
+        value = node.value
+        return lambda: value
+
+    def compile_number(self, node: NumberNode):
+        value = self.evaluator.evaluate_number(node)
+        return lambda: value
+
+    def compile_string(self, node: StringNode):
+        # 不含模板 ${} 的字符串是常量
+        if node.parts is None:
+            value = node.value
+            return lambda: value
+        # 模板字符串: 拆分好的模板直接交给 render_template，运行时只查找变量
+        parts = node.parts
+        render = self.evaluator.render_template
+        return lambda: render(parts)
+
+    def compile_boolean(self, node: BooleanNode):
+        value = self.evaluator.evaluate_boolean(node)
+        return lambda: value
+
+    def compile_variable(self, node: VariableNode):
+        evaluator = self.evaluator
+        name = node.value
+        resolved = node.resolved
+
+        def load_variable():
+            try:
+                return evaluator.environment[name]
+            except KeyError:
+                raise NameError(f"Variable '{name}' not defined") from None
+
+        if resolved is None:
+            return load_variable
+
+        # 和 Evaluator.evaluate_variable 一样: Resolver 解析过的局部变量按槽位读取，槽位还没有赋值时按名字查找
+        def load_slot():
+            value = evaluator.environment.load(*resolved)
+            if value is not UNSET:
+                return value
+            return load_variable()
+
+        return load_slot
+
+    def compile_binary_op(self, node: BinaryOpNode):
+        if node.left.__class__ is not BinaryOpNode:
+            op = self.binary_operator(node)
+            left = self.compile(node.left)
+            right = self.compile(node.right)
+            return lambda: op(left(), right())
+
+        # a + b + c + ... 是向左展开的链，编译成一个循环的闭包，编译和执行都不按链的长度递归
+        chain = []
+        while node.__class__ is BinaryOpNode:
+            chain.append(node)
+            node = node.left
+        first = self.compile(node)
+        steps = [(self.binary_operator(link), self.compile(link.right)) for link in reversed(chain)]
+
+        def binary_chain():
+            value = first()
+            for op, right in steps:
+                value = op(value, right())
+            return value
+
+        return binary_chain
+
+    @staticmethod
+    def binary_operator(node: BinaryOpNode):
+        op = BINARY_OPERATORS.get(node.op)
+        if op is None:
+            raise ValueError(f"Unknown operator: {node.op}")
+        return op
+
+    def compile_unary_op(self, node: UnaryOpNode):
+        if node.operator != 'not':
+            return self.compile_fallback(node)
+        operand = self.compile(node.operand)
+        return lambda: not operand()
+
+    def compile_list(self, node: ListNode):
+        elements = self.compile_block(node.elements)
+        return lambda: [element() for element in elements]
+
+    def compile_object(self, node: ObjectNode):
+        items = tuple((key, self.compile(value)) for key, value in node.k_v.items())
+        return lambda: {key: value() for key, value in items}
+
+    def compile_assignment(self, node: AssignmentNode):
+        # 函数赋值需要记录定义时的作用域，交给 Evaluator
+        if isinstance(node.value, FunctionDeclarationNode):
+            return self.compile_fallback(node)
+        evaluator = self.evaluator
+        name = node.name
+        is_constant = node.is_constant
+        resolved = node.resolved
+        value_code = self.compile(node.value)
+
+        def assign():
+            environment = evaluator.environment
+            constants = environment['constants']
+            if name in constants:
+                raise ValueError(f"Constant '{name}' cannot be reassigned")
+            if is_constant:
+                constants.append(name)
+            value = value_code()
+            # 和 Evaluator.evaluate_assignment 一样: 解析过的局部变量写槽位
+            # (在 for 循环的块作用域中给还没有赋值的局部变量赋值时按名字定义在块作用域中)
+            if resolved is not None:
+                frame = environment.function_frame()
+                if frame is environment or frame.slots[resolved] is not UNSET:
+                    frame.slots[resolved] = value
+                    return value
+            environment[name] = value
+            return value
+
+        return assign
+
+    def compile_if_statement(self, node: IfStatementNode):
+        # if / elif / else 只执行其中一个分支，分支中的信号返回给外层
+        branches = [(self.compile(node.condition), self.compile_body(node.if_body))]
+        for elseif_dict in node.elif_:
+            branches.append((self.compile(elseif_dict['condition']),
+                             self.compile_body(elseif_dict['elif_statements'])))
+        branches = tuple(branches)
+        else_branch = self.compile_body(node.else_)
+
+        def if_statement():
+            for condition, branch in branches:
+                if condition():
+                    return branch()
+            return else_branch()
+
+        return if_statement
+
+    def compile_if_expr(self, node: IfExprNode):
+        condition = self.compile(node.condition)
+        if_true = self.compile(node.expr_if_true)
+        if_false = self.compile(node.expr_if_false)
+
+        def if_expr():
+            condition_value = condition()
+            if type(condition_value) != bool:
+                raise TypeError(f"Condition expression must be a boolean, but got {type(condition_value)}")
+            return if_true() if condition_value else if_false()
+
+        return if_expr
+
+    def compile_loop(self, node: LoopNode):
+        if self.evaluator.legacy_loop_exit:
+            # 旧版本的 loop 语义只有 Evaluator 实现
+            return self.compile_fallback(node)
+        condition = self.compile(node.condition)
+        body = self.compile_body(node.body)
+
+        def loop():
+            while condition():
+                signal = body()
+                if signal is not None and signal is not CONTINUE_SIGNAL:
+                    return None if signal is BREAK_SIGNAL else signal
+
+        return loop
+
+    def compile_do_while(self, node: DoWhileNode):
+        condition = self.compile(node.condition)
+        body = self.compile_body(node.body)
+
+        def do_while():
+            while True:
+                signal = body()
+                if signal is not None and signal is not CONTINUE_SIGNAL:
+                    return None if signal is BREAK_SIGNAL else signal
+                if not condition():
+                    return None
+
+        return do_while
+
+    def make_loop_runner(self):
+        """
+            for 循环的公共部分: 循环变量放在循环自己的块作用域中，
+            break 结束循环，return 信号返回给外层
+        """
+        evaluator = self.evaluator
+
+        def run_loop(iterable, var_name, body):
+            previous_environment = evaluator.environment
+            loop_scope = Scope(parent=previous_environment)
+            loop_vars = loop_scope.vars
+            evaluator.environment = loop_scope
+            try:
+                for item in iterable:
+                    loop_vars[var_name] = item
+                    signal = body()
+                    if signal is not None and signal is not CONTINUE_SIGNAL:
+                        return None if signal is BREAK_SIGNAL else signal
+            finally:
+                evaluator.environment = previous_environment
+            return None
+
+        return run_loop
+
+    def compile_for_range_number(self, node: ForRangeNumberNode):
+        run_loop = self.run_loop
+        var_name = node.var_name
+        start = self.compile(node.start_num)
+        end = self.compile(node.end_num)
+        step = None if node.step is None else self.compile(node.step)
+        body = self.compile_body(node.body)
+
+        def for_range_number():
+            numbers = number_range(start(), end(), 1 if step is None else step())
+            if not numbers:
+                return None
+            return run_loop(numbers, var_name, body)
+
+        return for_range_number
+
+    def compile_for_in(self, node: ForInNode):
+        run_loop = self.run_loop
+        variable = node.variable
+        iteration_obj = self.compile(node.iteration_obj)
+        body = self.compile_body(node.body)
+
+        def for_in():
+            return run_loop(iteration_obj(), variable, body)
+
+        return for_in
+
+    def compile_increment(self, node: IncrementNode):
+        return self.compile_step(node.var_name, 1, "increment")
+
+    def compile_decrement(self, node: DecrementNode):
+        return self.compile_step(node.var_name, -1, "decrement")
+
+    def compile_step(self, var_name, delta, action):
+        # id++ 和 id-- 共用
+        evaluator = self.evaluator
+
+        def step():
+            environment = evaluator.environment
+            if var_name not in environment:
+                raise NameError(f"name '{var_name}' is not defined")
+            value = environment[var_name]
+            if type(value) != int:
+                raise TypeError(f"can only {action} integer, but got {type(value)}")
+            environment[var_name] = value + delta
+
+        return step
+
+    def compile_break(self, node: BreakNode):
+        return lambda: BREAK_SIGNAL
+
+    def compile_continue(self, node: ContinueNode):
+        return lambda: CONTINUE_SIGNAL
+
+    def compile_return(self, node: ReturnNode):
+        evaluator = self.evaluator
+        value = self.compile(node.value)
+
+        def return_value():
+            evaluator.return_value = value()
+            return RETURN_SIGNAL
+
+        return return_value
+
+    def compile_comment(self, node: CommentNode):
+        return lambda: None
+
+
+# 测试Compiler
+if __name__ == '__main__':
+    code = """
+        let total = 0;
+        for(i: 1 to 100000){
+            total = total + i * 2 - 1;
+        }
+        @println(total);
+    """
+    ast = Resolver().resolve(Parser(Tokenizer(code).tokenize()).parse())
+    compiler = Compiler()
+    program = compiler.compile_program(ast)
+    program()
+    print("environment: \n\t", compiler.evaluator.environment["total"])
@@ -1,38 +1,134 @@
-import re
+import operator
 import uuid
 from typing import List
 
-from colorama import Fore, Back
+from colorama import Fore
 
+from interpreter.Builtins import NATIVE_BUILTINS, COLOR_PRINTERS
 from interpreter.ClassNodes import ClassDeclarationNode, NewObjectNode, MethodCallNode, GetMemberNode, \
     CallClassInnerMethod, ThisNode, InterfaceNode, GetMemberNodeByThis
-from interpreter.utils.FileDir import FileSystemUtils
-from interpreter.utils.Random import RandomUtils
-from interpreter.utils.Time import TimeUtils
-from interpreter.utils.common import CommonUtils
-from interpreter.utils.datastructure.DictUtils import DictUtils
-from interpreter.utils.datastructure.ListUtils import ListUtils
 from interpreter.Nodes import AssignmentNode, NumberNode, BinaryOpNode, VariableNode, FunctionCallNode, StringNode, \
     ListNode, ObjectNode, FunctionDeclarationNode, IfStatementNode, BooleanNode, LoopNode, BreakNode, ReturnNode, \
     ListIndexNode, ObjectIndexNode, ForInNode, PackageDeclarationNode, ImportModuleNode, CommentNode, IfExprNode, \
     MatchExprNode, SwitchNode, DecontructAssignNode, ListDeconstructAssignNode, ForRangeNumberNode, TryCatchFinallyNode, \
     IncrementNode, DecrementNode, SetNode, CombineNode, MultiListIndexNode, StructDeclarationNode, StructAssignNode, \
-    StructAccessNode, EnumDeclarationNode, EnumAccessNode, ChainNode, DoWhileNode
+    StructAccessNode, EnumDeclarationNode, EnumAccessNode, ChainNode, DoWhileNode, UnaryOpNode, ConstantNode, ContinueNode, \
+    YieldNode
+from interpreter.Instance import ClassDescriptor, Instance
+from interpreter.LazySequence import LazySequence, SEQUENCE_METHODS
+from interpreter.ListMethods import LIST_METHODS
 from interpreter.Parser import Parser
-from interpreter.utils.datastructure.StringUtils import StringUtils
+from interpreter.Resolver import Resolver, check_yield_positions
+from interpreter.Scope import Scope, UNSET
+from interpreter.Source import sources
 from interpreter.Tokenizer import Tokenizer
-from interpreter.utils.math.MathUtils import MathUtils
+from interpreter.Trace import tracer, TRACE
 
 
-class BreakException(Exception):
-    """自定义异常，用于处理循环中的 break 语句"""
-    pass
+class ControlSignal:
+    """
+        return / break / continue 的完成信号
+        语句执行后如果需要改变控制流，就返回下面三个单例之一，由外层的代码块一层层向外传递，
+        直到循环(break/continue)或者函数(return)处理它。return 的值保存在 Evaluator.return_value 中，
+        所以整个过程不需要创建任何对象，也不会和用户函数返回的 dict 混淆
+    """
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"ControlSignal({self.name})"
+
+
+# 每个方法调用点最多缓存几种接收者类型
+METHOD_CACHE_SIZE = 4
+
+class MethodCallSite:
+    """
+        一个方法调用点(MethodCallNode)在一个 Evaluator 中的内联缓存: {接收者类型: 调用目标} 和命中/未命中次数
+        缓存的调用目标绑定在填写缓存的 Evaluator 上，所以缓存保存在 Evaluator.method_call_sites 中而不是节点上，
+        同一个 AST 交给多个 Evaluator 执行时互不影响
+    """
+    __slots__ = ("node", "cache", "hits", "misses")
+
+    def __init__(self, node):
+        self.node = node
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+
+RETURN_SIGNAL = ControlSignal("return")
+BREAK_SIGNAL = ControlSignal("break")
+CONTINUE_SIGNAL = ControlSignal("continue")
+
+
+def number_range(start_value, end_value, step_value=1):
+    """
+        for(i: start to end step n) 遍历的数字(包含 end)，三个执行后端共用
+            start < end: 递增; start > end: 递减; 相等时不执行
+            step 是每次前进的距离，方向由 start 和 end 决定，必须是正整数
+    """
+    # 判断是不是小数, 如果传进来的参数是其他类型，range方法自己会报错
+    if type(start_value) == float:
+        raise TypeError(f"only support integer, but got float {start_value}")
+    if type(end_value) == float:
+        raise TypeError(f"only support integer, but got float {end_value}")
+    if type(step_value) is not int or step_value <= 0:
+        raise ValueError(f"for loop step must be a positive integer, but got {step_value!r}")
+    if start_value < end_value:
+        return range(start_value, end_value + 1, step_value)
+    if start_value > end_value:
+        return range(start_value, end_value - 1, -step_value)
+    return range(0)
+
+
+# 运算符 -> Python 函数，三个执行后端共用(Compiler 编译时解析一次)
+BINARY_OPERATORS = {
+    'PLUS': operator.add,
+    'MINUS': operator.sub,
+    'MUL': operator.mul,
+    'DIV': operator.truediv,
+    'POW': operator.pow,
+    'MOD': operator.mod,
+    'FLOOR_DIV': operator.floordiv,
+    'GT': operator.gt,
+    'LT': operator.lt,
+    'LE': operator.le,
+    'GE': operator.ge,
+    'EQ': operator.eq,
+    'NEQ': operator.ne,
+}
+
+
+def logical_and(left_val, right_val):
+    # 对于算术比较，直接得到bool类型的值了，字符串转bool
+    if left_val == "True":
+        left_val = True
+    if left_val == "False":
+        left_val = False
+    if right_val == "True":
+        right_val = True
+    if right_val == "False":
+        right_val = False
+    if not isinstance(left_val, bool) or not isinstance(right_val, bool):
+        raise TypeError("逻辑运算只适合布尔类型!")
+    return left_val and right_val
+
+
+def logical_or(left_val, right_val):
+    return left_val or right_val
+
+
+BINARY_OPERATORS['AND'] = logical_and
+BINARY_OPERATORS['OR'] = logical_or
 
 
 class Evaluator:
-    def __init__(self):
-        # 环境变量
-        self.environment = {
+    def __init__(self, legacy_loop_exit=False):
+        # 环境变量: 全局作用域，函数调用时创建的帧通过 parent 链接到这里
+        self.environment = Scope({
             "arg_to_instance": {
                 # "painterVan": "x",
             },  # 建立传入参数和实例的映射，用于多态的实现  {形参: 实参, 形参: 实参}
@@ -43,9 +139,29 @@ class Evaluator:
             "structs": {},  # 记录结构体
             "enums": {}  # 记录枚举类型
 
-        }
+        }, is_function=True)
         self.current_object = None  # 当前this指向的对象
         self.packages = {}  # 导入的模块
+        self.return_value = None  # 遇到 return 时保存返回值，配合 RETURN_SIGNAL 使用
+        self.method_call_sites = {}  # MethodCallNode -> MethodCallSite, 方法调用的内联缓存(见 evaluate_method_call_dispatch)
+        # 兼容旧版本的 loop: 循环体的每条语句之后都重新计算条件(见 evaluate_legacy_loop)
+        self.legacy_loop_exit = legacy_loop_exit
+        # 节点类型 -> 求值方法
+        self.dispatch_table = self.build_dispatch_table()
+        # 生成器函数中含有 yield 的语句: 节点类型 -> 生成器版本的执行方法(见 generate_block)
+        self.generator_table = {
+            IfStatementNode: self.generate_if,
+            LoopNode: self.generate_loop,
+            DoWhileNode: self.generate_do_while,
+            ForInNode: self.generate_for_in,
+            ForRangeNumberNode: self.generate_for_range_number,
+        }
+        self.yield_statements = {}  # 语句 -> 语句中有没有 yield, 见 contains_yield()
+        # 函数名 -> 内置函数
+        self.builtins = self.build_builtin_table()
+        # 只对这个求值器有效的内置函数(register_builtin)，找不到时再查全局的 NATIVE_BUILTINS，
+        # 这样创建求值器之后用 Builtins.register_builtin 注册的函数也能调用
+        self.native_builtins = {}
 
     def evaluate(self, node):
         """
@@ -53,209 +169,390 @@ class Evaluator:
             用于解析AST，得到具体的结果
             比如，对于NumberNode，调用evaluate_number()函数，返回数字的值
 
+            节点类型到求值方法的映射保存在 self.dispatch_table 中，按 type(node) 直接查表，
+            不再逐个 isinstance 判断
         """
-
-        # 数据类型解析
-        if isinstance(node, NumberNode):
-            return self.evaluate_number(node)
-        elif isinstance(node, StringNode):  # ""
-            return self.evaluate_string(node)
-        elif isinstance(node, ListNode):  # []
-            return [self.evaluate(n) for n in node.elements]
-        elif isinstance(node, ObjectNode):  # {}
-            return self.evaluate_object(node)
-        elif isinstance(node, VariableNode):
-            return self.evaluate_variable(node)
-        elif isinstance(node, BooleanNode):
-            if node.value == "True":
-                return True
-            elif node.value == "False":
-                return False
-        # 语句解析
-        elif isinstance(node, IfStatementNode):
-            """
-                  self.condition = condition
-                  self.if_body = if_body
-                  self.elif_ = elif_
-                 self.else_ = else_
-            """
-            return self.evaluate_if_statement(node)
-
-        # 表达式解析
-        elif isinstance(node, BinaryOpNode):
-            return self.evaluate_binary_op(node)
-        elif isinstance(node, AssignmentNode):
-            return self.evaluate_assignment(node)
-
-        # 循环解析
-        elif isinstance(node, BreakNode):
-            # 遇到break语句，抛出BreakException异常，
-            # 然后在循环体外捕获这个异常，跳出循环
-            raise BreakException()
-        elif isinstance(node, LoopNode):
-            self.evaluate_loop(node)
-        # for in 循环解析
-        elif isinstance(node, ForInNode):
-            return self.evaluate_for_in(node)
-
-        # for(idx: 1..10){}
-        elif isinstance(node, ForRangeNumberNode):
-            return self.evaluate_for_range_number(node)
+        try:
+            handler = self.dispatch_table[type(node)]
+        except KeyError:
+            handler = self.resolve_node_handler(node)
+        return handler(node)
+
+    def build_dispatch_table(self):
+        """
+            构建 节点类型 -> 求值方法 的分派表，只在创建求值器时构建一次
+        """
+        return {
+            # 数据类型解析
+            NumberNode: self.evaluate_number,
+            StringNode: self.evaluate_string,  # ""
+            ListNode: self.evaluate_list,  # []
+            ObjectNode: self.evaluate_object,  # {}
+            VariableNode: self.evaluate_variable,
+            BooleanNode: self.evaluate_boolean,
+            SetNode: self.evaluate_set_node,
+            ConstantNode: self.evaluate_constant,  # Optimizer 预先算好的常量
+
+            # 语句解析
+            IfStatementNode: self.evaluate_if_statement,
+
+            # 表达式解析
+            BinaryOpNode: self.evaluate_binary_op,
+            UnaryOpNode: self.evaluate_unary_op,
+            AssignmentNode: self.evaluate_assignment,
+
+            # 循环解析
+            BreakNode: self.evaluate_break,
+            ContinueNode: self.evaluate_continue,
+            LoopNode: self.evaluate_loop,
+            ForInNode: self.evaluate_for_in,  # for in 循环解析
+            ForRangeNumberNode: self.evaluate_for_range_number,  # for(idx: 1..10){}
+            DoWhileNode: self.evaluate_do_while,
 
             # 函数方面
-        elif isinstance(node, FunctionDeclarationNode):
-            # 函数声明，不做任何事情
-            return self.evaluate_function_declaration(node)
-
-        elif isinstance(node, FunctionCallNode):
-            # print("env: ", self.environment)
-            return self.evaluate_function_call(node)
-
-        elif isinstance(node, ReturnNode):
-            # return self.evaluate(node.value) # 原来的代码
-            return self.evaluate(node.value)  # 返回结果
-
-        # 列表索引解析
-        elif isinstance(node, ListIndexNode):
-            return self.evaluate_list_index(node)
-
-        # 多维索引节点
-        elif isinstance(node, MultiListIndexNode):
-            return self.evaluate_multi_list_index(node)
-
-        elif isinstance(node, ObjectIndexNode):
-            return self.evaluate_object_index(node)
-
-        # 引入包
-        elif isinstance(node, ImportModuleNode):
-            # 将包里面的都行都加载到环境变量中
-            return self.import_module(node)
-        # 包的声明
-        elif isinstance(node, PackageDeclarationNode):
-            return self.evaluate_package_declaration(node)
-
-
-        # 类声明解析
-        elif isinstance(node, ClassDeclarationNode):
-            return self.evaluate_class_declaration(node)
-
-        elif isinstance(node, NewObjectNode):
-            return self.evaluate_new_object_expr(node)
-
-        # 方法调用解析  p->show();
-        elif isinstance(node, MethodCallNode):
-            # 能不能再MethodNode里面加个属性, 记录instance的类型，
-            # 比如dict, list, str, 这样在调用方法的时候，就可以根据类型进行调用
-            try:
-                # 看看是不是实例进行方法调用
-                return self.evaluate_method_call(node)
-            except NameError as e:
-                # 如果发生了NameError,可能就是基本数据类型进行方法的调用
-                return self.execute_by_instance_type(node)
-
-        # 类内部方法调用解析 this.xxx();
-        if isinstance(node, CallClassInnerMethod):
-            return self.evaluate_call_class_inner_method(node)
-
+            FunctionDeclarationNode: self.evaluate_function_declaration,
+            FunctionCallNode: self.evaluate_function_call,
+            ReturnNode: self.evaluate_return,
+            YieldNode: self.evaluate_yield,
+
+            # 索引解析
+            ListIndexNode: self.evaluate_list_index,
+            MultiListIndexNode: self.evaluate_multi_list_index,  # 多维索引节点
+            ObjectIndexNode: self.evaluate_object_index,
+
+            # 包的引入和声明
+            ImportModuleNode: self.import_module,
+            PackageDeclarationNode: self.evaluate_package_declaration,
+
+            # 类相关
+            ClassDeclarationNode: self.evaluate_class_declaration,
+            NewObjectNode: self.evaluate_new_object_expr,
+            MethodCallNode: self.evaluate_method_call_dispatch,  # p->show();
+            CallClassInnerMethod: self.evaluate_call_class_inner_method,  # this->xxx();
+            GetMemberNode: self.evaluate_get_instance_member,
+            InterfaceNode: self.evaluate_interface_declaration,
+
+            # 注释
+            CommentNode: self.evaluate_comment,
+
+            # let z = if(true) x : y; 这样的表达式（注意不是语句）
+            IfExprNode: self.evaluate_if_expr,
+            # match表达式
+            MatchExprNode: self.evaluate_match_expr,
+            # switch语句
+            SwitchNode: self.evaluate_switch_statement,
+
+            # 解构赋值
+            DecontructAssignNode: self.evaluate_decontruct_assign,
+            ListDeconstructAssignNode: self.evaluate_list_deconstruct_assign,
+
+            # try catch finally
+            TryCatchFinallyNode: self.evaluate_try_catch_finally,
+
+            # id++;  id--;
+            IncrementNode: self.evaluate_increment,
+            DecrementNode: self.evaluate_decrement,
+
+            # 结构体和枚举
+            StructDeclarationNode: self.evaluate_struct_declaration,
+            StructAssignNode: self.evaluate_struct_assign,  # let z= Point{x:1,y:2};
+            StructAccessNode: self.evaluate_struct_access,  # p::x
+            EnumDeclarationNode: self.evaluate_enum_declaration,
+            EnumAccessNode: self.evaluate_enum_access,
+        }
 
+    def build_builtin_table(self):
+        """
+            构建 函数名 -> 内置函数 的注册表，只在创建求值器时构建一次
+            这里的内置函数需要访问解释器(参数节点、environment)，以节点作为唯一参数调用;
+            只需要参数值的内置函数在 Builtins.NATIVE_BUILTINS 中
+        """
+        builtins = {
+            "isInstance": self.builtin_is_instance,
+            "print": self.builtin_print,
+            "println": self.builtin_println,
+            "printlnHex": self.builtin_println_hex,
+            "printlnBin": self.builtin_println_bin,
+            "printlnOct": self.builtin_println_oct,
+            "listLength": self.builtin_list_length,
+            "listAppend": self.builtin_list_append,
+            "listPopByIndex": self.builtin_list_pop_by_index,
+            "objectKeys": self.builtin_object_keys,
+            "objectValues": self.builtin_object_values,
+            "SetLength": self.builtin_set_length,
+            "SetAdd": self.builtin_set_add,
+            "SetRemove": self.builtin_set_remove,
+            "SetContains": self.builtin_set_contains,
+            "SetIsSubset": self.builtin_set_is_subset,
+            "SetIsSuperset": self.builtin_set_is_superset,
+            "SetClear": self.builtin_set_clear,
+            "SetUnion": self.builtin_set_union,
+            "SetIntersection": self.builtin_set_intersection,
+            "SetDiff": self.builtin_set_diff,
+            "GetParamsByName": self.builtin_get_params_by_name,
+            "GetDefaultValues": self.builtin_get_default_values,
+            "InvokeFunc": self.builtin_invoke_func,
+            "GetFieldsByClassName": self.builtin_get_fields_by_class_name,
+            "GetInstanceFields": self.builtin_get_instance_fields,
+            "GetInstanceMethods": self.builtin_get_instance_methods,
+            "SetInstanceField": self.builtin_set_instance_field,
+            "InvokeInstanceMethod": self.builtin_invoke_instance_method,
+            "partialUpdate": self.builtin_partial_update,
+            "GetMethodAnnotations": self.builtin_get_method_annotations,
+            "GetFieldAnnotations": self.builtin_get_field_annotations,
+            "GetFnAnnotations": self.builtin_get_fn_annotations,
+        }
+        for name in COLOR_PRINTERS:
+            builtins[name] = self.builtin_color_println
+        return builtins
 
+    def register_builtin(self, name, func):
+        """
+            为这个求值器注册内置函数，func 以求值后的参数调用，比如:
+                evaluator.register_builtin("Twice", lambda x: x * 2)
+            对所有求值器生效的注册使用 Builtins.register_builtin
+        """
+        if not callable(func):
+            raise TypeError(f"builtin '{name}' must be callable, but got {type(func)}")
+        self.native_builtins[name] = func
 
+    def register_node_handler(self, node_type, handler):
+        """
+            为新的节点类型注册求值方法，供嵌入方扩展语言使用
+            handler 以节点作为唯一参数调用，比如:
+                evaluator.register_node_handler(MyNode, lambda node: ...)
+            也可以覆盖已有节点类型的求值方法
+        """
+        self.dispatch_table[node_type] = handler
 
-        elif isinstance(node, GetMemberNode):
-            return self.evaluate_get_instance_member(node)
+    def handler_for(self, node):
+        # 和 evaluate 一样查找 node 的求值方法，给需要反复执行同一个节点的循环预先查好
+        try:
+            return self.dispatch_table[type(node)]
+        except KeyError:
+            return self.resolve_node_handler(node)
 
-        # 注释
-        elif isinstance(node, CommentNode):
-            # 注释不做任何事情
-            pass
+    def resolve_node_handler(self, node):
+        """
+            分派表中没有 type(node) 时调用：沿着继承链查找已注册的父类，
+            找到后缓存到分派表中，下次直接命中
+        """
+        for node_type in type(node).__mro__[1:]:
+            handler = self.dispatch_table.get(node_type)
+            if handler is not None:
+                self.dispatch_table[type(node)] = handler
+                return handler
+        raise TypeError(f"Unexpected node type: {type(node)}")
 
-        # 解析  this.xxx();
-        elif isinstance(node, CallClassInnerMethod):
-            return self.evaluate_call_class_inner_method(node)
+    def evaluate_list(self, node: ListNode):
+        return [self.evaluate(n) for n in node.elements]
 
-        # let z = if(true) x : y; 这样的表达式（注意不是语句）
-        elif isinstance(node, IfExprNode):
-            return self.evaluate_if_expr(node)
+    def evaluate_boolean(self, node: BooleanNode):
+        if node.value == "True":
+            return True
+        elif node.value == "False":
+            return False
 
+    def evaluate_break(self, node: BreakNode):
+        # 遇到break语句，返回 BREAK_SIGNAL，由外层的循环处理
+        return BREAK_SIGNAL
 
-        # match表达式解析
-        # let z = match(x) {
-        #     case 1: 'One',
-        #     case 2: 'Two',
-        #     case 3: 'Three'
-        # };
-        elif isinstance(node, MatchExprNode):
-            return self.evaluate_match_expr(node)
+    def evaluate_continue(self, node: ContinueNode):
+        # 遇到continue语句，返回 CONTINUE_SIGNAL，外层的循环结束本次迭代
+        return CONTINUE_SIGNAL
 
-        # switch语句
-        elif isinstance(node, SwitchNode):
-            self.evaluate_switch_statement(node)
+    def evaluate_return(self, node: ReturnNode):
+        # 返回值保存起来，返回 RETURN_SIGNAL，由函数调用处取出返回值
+        self.return_value = self.evaluate(node.value)
+        return RETURN_SIGNAL
 
-        # 解构赋值节点
-        elif isinstance(node, DecontructAssignNode):
-            return self.evaluate_decontruct_assign(node)
+    def evaluate_yield(self, node: YieldNode):
+        # 生成器函数中的 yield 由 generate_block 执行，能走到这里的 yield 不在生成器支持的位置
+        raise SyntaxError(f"yield can only be used in a function body, directly or inside if/loop/for/do-while"
+                          f"{sources.where(node.position)}")
 
-        # 列表解构赋值 解构列表赋值, 比如 let [a, _,b] = [1, 2,3];
-        elif isinstance(node, ListDeconstructAssignNode):
-            return self.evaluate_list_deconstruct_assign(node)
+    def execute_block(self, statements):
+        """
+            执行代码块(if/循环体等)
+            遇到 return/break/continue 信号就停止执行，并把信号返回给外层；正常执行完返回 None
+        """
+        for statement in statements:
+            result = self.evaluate(statement)
+            if result.__class__ is ControlSignal:
+                return result
+        return None
 
-        # 接口定义
-        elif isinstance(node, InterfaceNode):
-            self.evaluate_interface_declaration(node)
+    def completion_value(self, result):
+        """
+            函数体执行完后得到函数的返回值:
+                RETURN_SIGNAL -> return 的值
+                break/continue 不能跨越函数 -> None
+                其他 -> 最后一条语句的值 (比如 lambda x: x+1)
+        """
+        if result.__class__ is ControlSignal:
+            if result is RETURN_SIGNAL:
+                value = self.return_value
+                self.return_value = None
+                return value
+            return None
+        return result
 
-        # try catch finally
-        elif isinstance(node, TryCatchFinallyNode):
-            return self.evaluate_try_catch_finally(node)
+    def new_function_scope(self, func_dict, arguments: dict):
+        """
+            创建函数调用的作用域: 父作用域是定义函数时的作用域(closure)
+            Resolver 解析过的函数(有 layout)，参数和局部变量放在槽位中
+        """
+        scope = Scope(parent=func_dict.get("closure", self.environment), is_function=True,
+                      layout=func_dict.get("layout"))
+        scope.update(arguments)
+        return scope
 
-        # inc  id++;
-        elif isinstance(node, IncrementNode):
-            return self.evaluate_increment(node)
+    def new_method_scope(self, instance: Instance, method_dict, args_pass_in):
+        """
+            创建方法调用的作用域:  参数帧 -> 字段帧 -> 调用处的作用域
+                字段帧: 函数帧，layout 是类的字段下标，slots 就是实例的 slots 列表，对字段的读写直接作用在实例上
+                参数帧: 块帧，方法的参数和方法体中新定义的变量放在这里
+            这样调用方法不需要把环境、字段、参数合并成一个新字典，执行完每条语句后也不需要把字段写回实例
+        """
+        field_frame = Scope(parent=self.environment, is_function=True, layout=instance.cls.field_index,
+                            slots=instance.slots)
+        return Scope(dict(zip(method_dict['args'], args_pass_in)), parent=field_frame)
 
-        # dec id--;
-        elif isinstance(node, DecrementNode):
-            return self.evaluate_decrement(node)
-        # setNode
-        elif isinstance(node, SetNode):
-            return self.evaluate_set_node(node)
+    def execute_function_body(self, statements):
+        # 执行函数体，返回函数的返回值
+        result = None
+        for statement in statements:
+            result = self.evaluate(statement)
+            if result.__class__ is ControlSignal:
+                break
+        return self.completion_value(result)
 
-        # StructDeclarationNode
-        elif isinstance(node, StructDeclarationNode):
-            return self.evaluate_struct_declaration(node)
+    def evaluate_unary_op(self, node: UnaryOpNode):
+        # 目前只有逻辑非: not x
+        if node.operator == 'not':
+            return not self.evaluate(node.operand)
+        raise ValueError(f"Unknown operator: {node.operator}")
 
-        # let z= Point{x:1,y:2};
-        elif isinstance(node, StructAssignNode):
-            return self.evaluate_struct_assign(node)
+    def evaluate_comment(self, node: CommentNode):
+        # 注释不做任何事情
+        return None
 
-        # StructAccessNode 访问结构体的属性  比如: p::x
-        elif isinstance(node, StructAccessNode):
-            return self.evaluate_struct_access(node)
-        # EnumDeclarationNode
-        elif isinstance(node, EnumDeclarationNode):
-            return self.evaluate_enum_declaration(node)
+    def evaluate_method_call_dispatch(self, node: MethodCallNode):
+        """
+            x->method() 的入口，使用调用点上的内联缓存(inline cache)
 
-        # EnumAccessNode
-        elif isinstance(node, EnumAccessNode):
-            return self.evaluate_enum_access(node)
+            接收者的类型: 实例用它的类描述(ClassDescriptor)，str/list/dict/set 等用 Python 类型。
+            每个 MethodCallNode 有自己的缓存 {接收者类型: 调用目标}，最多 METHOD_CACHE_SIZE 种类型(多态缓存)，
+            同一个调用点再次遇到同样类型的接收者时，直接调用缓存的目标，不再查找方法、也不再靠 NameError 回退。
+            缓存和命中/未命中次数保存在这个 Evaluator 的 method_call_sites 中(见 MethodCallSite)，method_cache_stats() 可以汇总
+        """
+        caller = node.instance_name
+        self.current_object = caller  # 记录当前的对象，用于this的解析
 
-        # do while
-        elif isinstance(node, DoWhileNode):
-            return self.evaluate_do_while(node)
+        # 类名调用静态方法，不缓存
+        if caller in self.environment["objects"]:
+            return self.evaluate_method_call(node)
 
+        receiver = self.environment["instances"].get(caller)
+        if receiver is not None:
+            receiver_type = receiver.cls
+        else:
+            try:
+                receiver = self.environment[caller]
+            except KeyError:
+                raise NameError(f"Object {caller} not found.") from None
+            receiver_type = type(receiver)
+
+        site = self.method_call_sites.get(node)
+        if site is None:
+            site = self.method_call_sites[node] = MethodCallSite(node)
+        cache = site.cache
+        target = cache.get(receiver_type)
+        if target is not None:
+            site.hits += 1
         else:
-            raise TypeError(f"Unexpected node type: {type(node)}")
+            site.misses += 1
+            target = self.lookup_method_target(node, receiver_type)
+            if len(cache) < METHOD_CACHE_SIZE:
+                cache[receiver_type] = target
+        return target(node, receiver)
+
+    def lookup_method_target(self, node: MethodCallNode, receiver_type):
+        """
+            缓存未命中时查找调用目标，返回 target(node, receiver)
+        """
+        method_name = node.method_name
+        if receiver_type.__class__ is ClassDescriptor:
+            method_dict = receiver_type.methods.get(method_name)
+            # 找到了public方法: 调用实例的方法
+            if method_dict is not None and not method_name[0].islower():
+                def call_method(call_node, instance):
+                    args_pass_in = [self.evaluate(arg) for arg in call_node.arguments]
+                    return self.call_instance_method(instance, method_dict, args_pass_in)
+
+                return call_method
+            # private方法或者没有这个方法, 和以前一样按变量的值的类型处理
+            return lambda call_node, receiver: self.execute_by_instance_type(call_node)
+
+        # 列表的高阶方法(map/filter/reduce...)，接收者直接传给 ListMethods.py 中的函数
+        if issubclass(receiver_type, list) and method_name in LIST_METHODS:
+            def call_list_method(call_node, xlist):
+                return self.call_list_method(xlist, method_name, [self.evaluate(arg) for arg in call_node.arguments])
+
+            return call_list_method
+        # 惰性序列的方法(见 LazySequence.py)
+        if receiver_type is LazySequence:
+            if method_name not in SEQUENCE_METHODS:
+                raise AttributeError(f"lazy sequence has no method '{method_name}'")
+
+            def call_sequence_method(call_node, seq):
+                return self.call_list_method(seq, method_name, [self.evaluate(arg) for arg in call_node.arguments],
+                                             SEQUENCE_METHODS)
+
+            return call_sequence_method
+
+        # 基本数据类型的方法
+        for value_type, type_method_call in ((str, self.evaluate_string_type_method_call),
+                                             (list, self.evaluate_list_type_method_call),
+                                             (dict, self.evaluate_dict_type_method_call),
+                                             (set, self.evaluate_set_type_method_call)):
+            if issubclass(receiver_type, value_type):
+                return lambda call_node, receiver: type_method_call(call_node)
+        return lambda call_node, receiver: None
+
+    def method_cache_stats(self):
+        """
+            内联缓存的统计信息，用于性能分析:
+            {"hits": 总命中次数, "misses": 总未命中次数,
+             "sites": [{"site": "p->Hello", "hits": .., "misses": .., "receivers": [接收者类型, ..]}, ..]}
+        """
+        sites = []
+        for site in self.method_call_sites.values():
+            sites.append({
+                "site": f"{site.node.instance_name}->{site.node.method_name}",
+                "hits": site.hits,
+                "misses": site.misses,
+                "receivers": [receiver_type.name if receiver_type.__class__ is ClassDescriptor
+                              else receiver_type.__name__ for receiver_type in site.cache],
+            })
+        return {
+            "hits": sum(site["hits"] for site in sites),
+            "misses": sum(site["misses"] for site in sites),
+            "sites": sites,
+        }
 
     def evaluate_do_while(self, node: DoWhileNode):
         """
             实现 do while 循环
         """
-
-        for statement in node.body:
-            self.evaluate(statement)
-        cond = self.evaluate(node.condition)
-        while cond:
-            for statement in node.body:
-                self.evaluate(statement)
-            cond = self.evaluate(node.condition)
+        while True:
+            signal = self.execute_block(node.body)
+            if signal is not None and signal is not CONTINUE_SIGNAL:
+                if signal is BREAK_SIGNAL:
+                    return None
+                return signal  # return
+            if not self.evaluate(node.condition):
+                return None
 
     def execute_by_instance_type(self, node: MethodCallNode):
         """
@@ -267,7 +564,7 @@ class Evaluator:
 
         # 根据数据类型进行对应方法的调用，也就是说，这样存在一个对类型的隐士判断
         if isinstance(var_value, str):
-            print("str 实例")
+            tracer.trace("str 实例")
             return self.evaluate_string_type_method_call(node)
         if isinstance(var_value, list):
             return self.evaluate_list_type_method_call(node)
@@ -335,11 +632,8 @@ class Evaluator:
         method_name = node.method_name
         # 获取参数的值
         arguments = [self.evaluate(arg) for arg in node.arguments]
-        print("======================================")
-        print("变量名称: ", var_name)
-        print("方法每次: ", method_name)
-        print("参数: ", arguments)
-        print("==========")
+        if tracer.level >= TRACE:
+            tracer.trace("变量名称: ", var_name, " 方法: ", method_name, " 参数: ", arguments)
         if method_name == "geKeys":
             return list(self.environment[var_name].keys())
         if method_name == "getValues":
@@ -375,11 +669,8 @@ class Evaluator:
         method_name = node.method_name
         # 获取参数的值
         arguments = [self.evaluate(arg) for arg in node.arguments]
-        print("======================================")
-        print("变量名称: ", var_name)
-        print("方法每次: ", method_name)
-        print("参数: ", arguments)
-        print("======================================")
+        if tracer.level >= TRACE:
+            tracer.trace("变量名称: ", var_name, " 方法: ", method_name, " 参数: ", arguments)
 
         # 常见方法
         if method_name == "upper":
@@ -445,14 +736,9 @@ class Evaluator:
         # print("var_name==================> ", var_name)
 
         method_name = node.method_name
-        print("arguments==================> ", node.arguments)
-
         arguments = [self.evaluate(arg) for arg in node.arguments]
-        print("======================================")
-        # print("var_name: ", var_name)
-        # print("method_name: ", method_name)
-        # print("arguments: ", arguments)
-        print("======================================")
+        if tracer.level >= TRACE:
+            tracer.trace("变量名称: ", var_name, " 方法: ", method_name, " 参数: ", arguments)
 
         # 列表的append方法
         if method_name == "append":
@@ -604,7 +890,7 @@ class Evaluator:
                 raise NameError(f"name '{var_name}' is not defined")
             value = self.environment[var_name]
             # 支持任意数量和任意类型类型的数据的长度
-            print("len = ", len(value))
+            tracer.trace("len = ", len(value))
             return len(value)
 
         # combine, 类似join方法
@@ -623,107 +909,90 @@ class Evaluator:
 
             return separator.join(xlist)
 
-        # FunctionDeclarationNode
-        # filter()方法
-        if method_name == "filter":
-            # 列表的filter方法
+        # 高阶方法: map/filter/reduce/flatMap/sortBy/groupBy/any/all/zip/take/drop(见 ListMethods.py)
+        if method_name in LIST_METHODS:
             if var_name not in self.environment:
                 raise NameError(f"name '{var_name}' is not defined")
             xlist = self.environment[var_name]
             if type(xlist) != list:
-                raise TypeError(f"can only filter list, but got {type(xlist)}")
-            # 支持任意数量和任意类型类型的数据的过滤
-            filter_func_dict = arguments[0]
-            return self.filter_server(filter_func_dict, xlist)
-
-        # map()方法
-        if method_name == "map":
-            # 列表的map方法
-            if var_name not in self.environment:
-                raise NameError(f"name '{var_name}' is not defined")
-            xlist = self.environment[var_name]
-            if type(xlist) != list:
-                raise TypeError(f"can only map list, but got {type(xlist)}")
-            # 支持任意数量和任意类型类型的数据的映射
-            map_func_dict = arguments[0]
-            return self.map_server(map_func_dict, xlist)
+                raise TypeError(f"can only {method_name} list, but got {type(xlist)}")
+            return self.call_list_method(xlist, method_name, arguments)
         # ===============set类型的方法=======================
 
-    def map_server(self, map_func, xlist):
-        """
-            服务map函数的, 可以服务map等函数
-            map_func_dict: 匿名函数，用来map的条件
-            xlist: 待映射的列表
-        """
-        func_dict = map_func  # 值居然是None
-        # print("predicate_param_name: ", func_dict)  # None
-
-        predicate_param_name = func_dict['args'][0]  # 形参名称,比如['x']
-
-        body_statements = func_dict['body']  # 函数体
-
-        local_scope = {}
-
-        previous_environment = self.environment.copy()
-
-        # filtered的结果
-        result = []
-        for element in xlist:
-            # 没迭代一个元素就更新一次环境
-            local_scope[predicate_param_name] = element
-            # 保存当前的环境，以便函数执行完后恢复
-            # 更新环境为局部作用域, 并执行函数体, 这样做，内部函数可以访问外界的变量
-            self.environment.update(local_scope)
-            # ==================执行方法体=============================
-            for statement in body_statements:
-                mapped_value = self.evaluate(statement)
-                if isinstance(statement, ReturnNode):
-                    # 如果符合predicate条件，则添加到结果列表中
-                    result.append(mapped_value)
-        # ========================恢复环境===================
-        # 恢复之前的环境
-        self.environment = previous_environment
-        # print("result: ", result)
-        return result
-
-    def filter_server(self, filter_predicate, xlist):
-        """
-            服务filter函数的, 可以服务map等函数
-            filter_predicate: 匿名函数，用来filter的条件
-            xlist: 待过滤的列表
-        """
-        # func_dict的样子: {
-        #   args': ['x'],
-        #   'body': [ReturnNode(value=BinaryOpNode(left=VariableNode(value=x), op=GT, right=NumberNode(value=1)))]
-
-        func_dict = filter_predicate  # 值居然是None
-        predicate_param_name = func_dict['args'][0]  # 形参名称,比如['x']
-        body_statements = func_dict['body']  # 函数体
-
-        local_scope = {}
-
-        previous_environment = self.environment.copy()
-
-        # filtered的结果
-        result = []
-        for element in xlist:
-            # 没迭代一个元素就更新一次环境
-            local_scope[predicate_param_name] = element
-            # 保存当前的环境，以便函数执行完后恢复
-            # 更新环境为局部作用域, 并执行函数体, 这样做，内部函数可以访问外界的变量
-            self.environment.update(local_scope)
-            # ==================执行方法体=============================
-            for statement in body_statements:
-                return_value = self.evaluate(statement)
-                if isinstance(statement, ReturnNode):
-                    # 如果符合predicate条件，则添加到结果列表中
-                    if return_value:
-                        result.append(element)
-        # ========================恢复环境===================
-        # 恢复之前的环境
-        self.environment = previous_environment
-        # print("result: ", result)
-        return result
+    def call_list_method(self, xlist, method_name, arguments, methods=LIST_METHODS):
+        # 调用 ListMethods.py(或者 LazySequence.py)中的高阶方法，作为第一个参数的 Fight 函数先包装成 Python 函数
+        method, takes_function = methods[method_name]
+        if takes_function and arguments:
+            arguments = [self.function_caller(arguments[0]), *arguments[1:]]
+        elif takes_function and method_name not in ("any", "all"):
+            raise TypeError(f"{method_name} expects a function argument")
+        return method(xlist, *arguments)
+
+    def function_caller(self, func_dict):
+        """
+            把 Fight 的函数值(函数字典)包装成 Python 函数，供 map/filter 等高阶方法对每个元素调用:
+                每次调用新建一个小的函数帧(父作用域是定义函数时的作用域)，位置参数直接绑定到帧中，
+                有 layout 时写到槽位; 缺少的参数使用默认值，多余的参数忽略
+            不经过 FunctionCallNode，没有命名参数的处理，函数体中的局部变量也不会留到下一次调用
+        """
+        if func_dict.__class__ is not dict or "body" not in func_dict:
+            if callable(func_dict):
+                return func_dict
+            raise TypeError(f"expected a function, but got {type(func_dict)}")
+        params = func_dict["args"]
+        body = func_dict["body"]
+        closure = func_dict.get("closure", self.environment)
+        layout = func_dict.get("layout")
+        defaults = func_dict.get("defaults") or {}
+        param_count = len(params)
+        param_slots = None if layout is None else [layout[name] for name in params]
+        # 局部变量只有参数(比如 lambda x: x * 2)时，参数列表本身就是槽位列表
+        params_only = layout is not None and len(layout) == param_count and param_slots == list(range(param_count))
+        generator = func_dict.get("generator", False)
+        # 函数体只有一条语句时(最常见的回调)，预先查好它的求值方法; return 语句直接对返回值的表达式求值
+        if len(body) == 1 and not generator:
+            statement = body[0].value if body[0].__class__ is ReturnNode else body[0]
+            handler = self.handler_for(statement)
+        else:
+            statement = handler = None
+        execute_function_body = self.execute_function_body
+
+        def call(*arguments):
+            if len(arguments) != param_count:
+                arguments = self.fit_arguments(params, defaults, arguments)
+            if params_only:
+                frame = Scope(None, closure, True, layout, list(arguments))
+            elif layout is None:
+                frame = Scope(dict(zip(params, arguments)), closure, True)
+            else:
+                frame = Scope(None, closure, True, layout)
+                slots = frame.slots
+                for slot, value in zip(param_slots, arguments):
+                    slots[slot] = value
+            if generator:
+                return self.start_generator(body, frame)
+            previous_environment = self.environment
+            self.environment = frame
+            try:
+                if handler is None:
+                    return execute_function_body(body)
+                result = handler(statement)
+                if result.__class__ is ControlSignal:
+                    return self.completion_value(result)
+                return result
+            finally:
+                self.environment = previous_environment
+
+        return call
+
+    def fit_arguments(self, params, defaults, arguments):
+        # 多余的参数忽略，缺少的参数用默认值补齐(默认值在调用处求值，和普通函数调用一致)
+        arguments = list(arguments[:len(params)])
+        for name in params[len(arguments):]:
+            if name not in defaults:
+                raise ValueError(f"Function expects parameter '{name}' but got nothing.")
+            arguments.append(self.evaluate(defaults[name]))
+        return arguments
 
     def evaluate_enum_access(self, node: EnumAccessNode):
         """
@@ -734,8 +1003,8 @@ class Evaluator:
                 1，存在；返回值
                 2，不存在；raise NameError
         """
-        print("node: ", node)
-        print("env: ", self.environment["enums"])
+        tracer.trace("node: ", node)
+        tracer.trace("env: ", self.environment["enums"])
         # 检擦枚举类是否存在
         if node.enum_name not in self.environment["enums"]:
             raise NameError(f"Enum {node.enum_name} not found!")
@@ -748,13 +1017,13 @@ class Evaluator:
             枚举类型定义
         """
         # 枚举类型定义
-        print("node: ", node)
+        tracer.trace("node: ", node)
         enum_values = []
         for enum_name in node.enum_values:
             enum_values.append(enum_name)
         self.environment["enums"][node.enum_name] = enum_values
         # print(f"Enum {node.enum_name} declared.")
-        print("env: ", self.environment)
+        tracer.trace("env: ", self.environment)
         return None
 
     def evaluate_struct_access(self, node: StructAccessNode):
@@ -770,7 +1039,7 @@ class Evaluator:
         # struct_dict 比如: {'type': 'struct', 'name': 'Point', 'value': {'x': 1, 'y': 2}}
 
         # 访问不存在的属性
-        print("fieldname: ", node.field_name)
+        tracer.trace("fieldname: ", node.field_name)
         if node.field_name not in struct_dict["value"]:
             return False
         return struct_dict["value"][node.field_name]
@@ -862,78 +1131,69 @@ class Evaluator:
             TimeoutError: "TimeoutError",
         }
 
-        # 定义打印红色字体的函数
-        def print_red(text):
-            print("\033[91m{}\033[0m".format(text))
-
+        # try/catch/finally 里面的 return/break/continue 信号需要传递到外层
+        signal = None
         try:
-            for statement in node.try_block:
-                self.evaluate(statement)
+            signal = self.execute_block(node.try_block)
         except Exception as e:
 
             # 异常映射
             # 将Python异常转换为你的语言的异常
             caught_exception = exception_mapping.get(type(e), "Exception")
-            print_red(f"Caught Exception: {e}")
+            # 诊断信息交给 tracer(默认关闭)，不再混在程序的输出里
+            tracer.info(f"Caught Exception: {e}")
             # 捕获异常  catch_block = [{err_type: [stmt1, stmt2, stmt3] }]
             for catch_dict in node.catch_block:
                 for err_type in catch_dict:
                     # 遍历catch_block字典，找到对应的异常类型
                     if err_type == caught_exception:
-                        for stmt in catch_dict[err_type]:
-                            self.evaluate(stmt)
+                        signal = self.execute_block(catch_dict[err_type])
         finally:
             # 没有异常，执行finally语句
-            for finally_statement in node.finally_block:
-                self.evaluate(finally_statement)
+            finally_signal = self.execute_block(node.finally_block)
+            if finally_signal is not None:
+                signal = finally_signal
+        return signal
 
     def evaluate_for_range_number(self, node: ForRangeNumberNode):
-        # 两种类型： 1，递增 2，递减  如果传进来的参数是小说，range方法自己会报错
-
-        # for(idx: 1..10){}
-        # 解析for循环语句
+        """
+            for(idx: 1 to 10){}  for(idx: 10 to 1 step 3){}
+            数字循环是计算密集的代码最常用的结构，单独优化:
+                1, 数字序列直接用 range(见 number_range)
+                2, 循环变量写在槽位(函数中)或者循环自己的块作用域中，每次迭代只有一次赋值
+                3, 循环体每条语句的求值方法在循环开始前查好，迭代时直接调用，不经过 evaluate/execute_block
+                4, break/continue/return 是语句返回的信号，迭代中没有 try
+        """
         # 先计算表达式的值
         start_value = self.evaluate(node.start_num)
         end_value = self.evaluate(node.end_num)
-
-        # 判断是不是小数
-        if type(start_value) == float:
-            raise TypeError(f"only support integer, but got float {start_value}")
-        if type(end_value) == float:
-            raise TypeError(f"only support integer, but got float {end_value}")
+        step_value = 1 if node.step is None else self.evaluate(node.step)
+        numbers = number_range(start_value, end_value, step_value)
 
         # 保存之前的环境变量
-        previous_environment = self.environment.copy()
-
-        # 设置初始变量
-        self.environment[node.var_name] = -100
-
-        # for(idx: 1..10){} 递增类型
-        if start_value < end_value:
-            # 遍历每个元素
-            for i in range(start_value, end_value + 1):
-                # print("i = ",i)
-                self.environment[node.var_name] = i
-                try:
-                    for statement in node.body:
-                        self.evaluate(statement)
-                except BreakException:
-                    break
+        previous_environment = self.environment
 
-        # for(idx: 10..1){} 倒退类型
-        if start_value > end_value:
-            # 遍历每个元素
-            for i in range(start_value, end_value - 1, -1):
-                # print("i = ",i)
-                self.environment[node.var_name] = i
-                try:
-                    for statement in node.body:
-                        self.evaluate(statement)
-                except BreakException:
-                    break
+        # 循环变量放在循环自己的块作用域中，循环体对外层变量的赋值会保留下来
+        loop_scope = Scope(parent=previous_environment)
+        self.environment = loop_scope
+        loop_vars = loop_scope.vars
+        var_name = node.var_name
+        body = [(self.handler_for(statement), statement) for statement in node.body]
 
-        # 还原环境变量
-        self.environment = previous_environment.copy()
+        try:
+            for i in numbers:
+                loop_vars[var_name] = i
+                for handler, statement in body:
+                    result = handler(statement)
+                    if result.__class__ is ControlSignal:
+                        if result is CONTINUE_SIGNAL:
+                            break
+                        if result is BREAK_SIGNAL:
+                            return None
+                        return result  # return
+        finally:
+            # 还原环境变量
+            self.environment = previous_environment
 
     def evaluate_interface_declaration(self, node: InterfaceNode):
         # 处理接口定义: 将接口加入到environment中, 类实现的时候要用到
@@ -998,14 +1258,11 @@ class Evaluator:
         # print("condition_value: ", condition_value)
         for case in node.cases:  # case是xxNode()，需要解析
             # print("case: ", self.evaluate(case))
+            # case 里面的 return/break/continue 信号交给外层处理
             if self.evaluate(case) == condition_value:
-                for statement in node.cases[case]:
-                    self.evaluate(statement)
-                break
+                return self.execute_block(node.cases[case])
             elif self.evaluate(case) == "default":
-                for statement in node.cases[case]:
-                    self.evaluate(statement)
-                break
+                return self.execute_block(node.cases[case])
 
     def evaluate_match_expr(self, node: MatchExprNode):
         # 解析match表达式
@@ -1031,7 +1288,8 @@ class Evaluator:
         """
         # 计算条件表达式
         condition_value = self.evaluate(node.condition)
-        print("condition_value: ", condition_value)
+        if tracer.level >= TRACE:
+            tracer.trace("condition_value: ", condition_value)
         if type(condition_value) != bool:
             raise TypeError(f"Condition expression must be a boolean, but got {type(condition_value)}")
 
@@ -1047,50 +1305,36 @@ class Evaluator:
             在调用实例的方法时，记录caller, 也就是调用方法的实例，在方法内部如果遇到this，
             就知道了调用者是谁，从而找到调用者的实例，然后从实例中获取方法的定义，并调用方法
 
-            特别地，在执行方法的，时候，每执行一条语句，就需要更新实例字段，
-            因为可能某一条语句就直接更新了实例字段，所以需要更新实例字段，如此，方法内部的方法想要访问才能
-            得到最新的值
+            方法体通过字段帧直接读写实例的字段(见 new_method_scope)，内部的方法可以直接得到最新的值
         """
         # 记录当前的对象，用于this的解析，也就是确定this指向的对象
         instance_name = self.current_object
-        print("current_object: ", self.current_object)
+        if tracer.level >= TRACE:
+            tracer.trace("current_object: ", self.current_object)
         # 方法名称
         method_name = node.method_name
         # 调用方法的参数
         args_pass_in = [self.evaluate(arg) for arg in node.arguments]
 
         # 找到instance_name的实例
-        instance_dict = self.environment["instances"][instance_name]
-        # print(f"instance_dict: {instance_name}的定义  ", instance_dict)
+        instance = self.environment["instances"][instance_name]
 
-        # 找到方法的定义
-        method_dict = instance_dict["methods"][method_name]
+        # 通过实例的类找到方法的定义
+        method_dict = instance.cls.methods[method_name]
         # print(f"method_dict: {method_name}的定义  ", method_dict)
 
         # 保存旧环境
         old_env = self.environment
 
-        # 创建新环境，包含实例字段和方法参数
-        self.environment = {
-            **old_env,  # 包含全局环境,是指可以访问类外面的变量
-            **instance_dict['fields'],
-            **dict(zip(method_dict['args'], args_pass_in)),
-            # "constants": []  # 记录声明的常量
-        }
+        # 创建方法的作用域: 参数帧 -> 字段帧 -> 旧环境，所以可以访问类外面的变量
+        self.environment = self.new_method_scope(instance, method_dict, args_pass_in)
 
         # 执行方法体
-        result = None
-        for statement in method_dict['body']:
-            result = self.evaluate(statement)
-            # 更新实例字段————每每执行一条语句之后，因为可能某一条语句就直接更新了实例字段，所以需要更新实例字段
-            for field_name in instance_dict['fields']:
-                if field_name in self.environment:
-                    instance_dict['fields'][field_name] = self.environment[field_name]
-
-        # 恢复旧环境
-        self.environment = old_env
-
-        return result
+        try:
+            return self.execute_function_body(method_dict['body'])
+        finally:
+            # 恢复旧环境
+            self.environment = old_env
 
     def evaluate_get_instance_member(self, node: GetMemberNode):
         """
@@ -1110,16 +1354,16 @@ class Evaluator:
         # instance_name = node.instance_name
         instance_name = node.instance_or_class_name
         field_name = node.member_name
-        instance_dict = self.environment["instances"][instance_name]
+        instance = self.environment["instances"][instance_name]
         # 判断是否存在这个字段
-        if field_name not in instance_dict["fields"]:
+        if not instance.has_field(field_name):
             raise NameError(f"Field {field_name} not found in instance {instance_name}")
 
         # 判断属性是否是public
         if field_name[0].islower():
             raise NameError(f"Field {field_name} is not public (no such field)")
 
-        return instance_dict["fields"][field_name]
+        return instance.get_field(field_name)
 
     def evaluate_method_call(self, node: MethodCallNode):
         """
@@ -1133,6 +1377,8 @@ class Evaluator:
                 对实例属性的修改不会同步到实例字段中
             version 2:
                 对实例属性的修改会同步到实例字段中
+            version 3:
+                方法体通过字段帧直接读写实例的字段，不再合并环境、也不再每条语句之后写回
             node.arguments
                     实参
         """
@@ -1158,19 +1404,14 @@ class Evaluator:
             args_pass_in = [self.evaluate(arg) for arg in node.arguments]
             # 保存旧环境
             old_env = self.environment
-            # 创建新环境，包含方法参数
-            self.environment = {
-                **old_env,  # 包含全局环境,是指可以访问类外面的变量
-                **dict(zip(method_dict['args'], args_pass_in)),
-                # "constants": []  # 记录声明的常量
-            }
+            # 创建新环境，包含方法参数, 父作用域是旧环境，所以可以访问类外面的变量
+            self.environment = Scope(dict(zip(method_dict['args'], args_pass_in)), parent=old_env, is_function=True)
             # 执行方法体
-            result = None
-            for statement in method_dict['body']:
-                result = self.evaluate(statement)
-            # 恢复旧环境
-            self.environment = old_env
-            return result
+            try:
+                return self.execute_function_body(method_dict['body'])
+            finally:
+                # 恢复旧环境
+                self.environment = old_env
         # ====================类调用方法结束============================================
 
         # print("caller: ", caller)
@@ -1183,61 +1424,39 @@ class Evaluator:
 
         try:
             # 尝试找到该对象
-            # 实例对象的所有东西
-            instance_dict = self.environment["instances"][caller]
-            # 对象的所有方法
-            method_dict = instance_dict["methods"][method_name]
+            # 实例对象
+            instance = self.environment["instances"][caller]
+            # 方法通过实例的类查找
+            method_dict = instance.cls.methods[method_name]
         except KeyError:
             # 找不到该对象
             raise NameError(f"Object {caller} not found.")
 
+        return self.call_instance_method(instance, method_dict, args_pass_in)
+        # ====================version 2========end====================================
+
+    def call_instance_method(self, instance: Instance, method_dict, args_pass_in):
         # 保存旧环境
         old_env = self.environment
 
-        # 创建新环境，包含实例字段和方法参数
-        self.environment = {
-            **old_env,  # 包含全局环境,是指可以访问类外面的变量
-            **instance_dict['fields'],
-            **dict(zip(method_dict['args'], args_pass_in)),
-            # "constants": []  # 记录声明的常量
-        }
-        #
-        # 执行方法体
-        result = None
-        for statement in method_dict['body']:
-            result = self.evaluate(statement)
-            # if isinstance(statement,ReturnNode):
-            #     break
-            # 更新实例字段————每每执行一条语句之后，因为可能某一条语句就直接更新了实例字段，所以需要更新实例字段
-            for field_name in instance_dict['fields']:
-                if field_name in self.environment:
-                    instance_dict['fields'][field_name] = self.environment[field_name]
-
-        # 原先实例更新的版本，和上面的for在同一个level
-        # for field_name in instance_dict['fields']:
-        #     if field_name in self.environment:
-        #         instance_dict['fields'][field_name] = self.environment[field_name]
-
-        # 恢复旧环境
-        self.environment = old_env
+        # 创建方法的作用域: 参数帧 -> 字段帧 -> 旧环境，所以可以访问类外面的变量
+        self.environment = self.new_method_scope(instance, method_dict, args_pass_in)
 
-        return result
-        # ====================version 2========end====================================
+        # 执行方法体
+        try:
+            return self.execute_function_body(method_dict['body'])
+        finally:
+            # 恢复旧环境
+            self.environment = old_env
 
     def evaluate_new_object_expr(self, node: NewObjectNode):
         """
-            从environment中获取类定义，就是复制属性、方法、及其init
+            从environment中获取类定义，创建实例并执行init
+
+            实例只保存类描述(ClassDescriptor)的引用和字段值的 slots 列表，
+            方法、init、字段注解都通过 instance.cls 查找，不再复制到每个实例中(见 Instance.py)
         """
         # print("node: ", node)
-
-        # 用于存储实例化后的对象
-        return_instance = {
-            "fields": {},
-            "methods": {},
-            "init": {},
-            "parent_name": node.class_name,
-            "fields_annotations": {},
-        }
         class_name = node.class_name
         # print("类名: ", class_name)
 
@@ -1245,84 +1464,47 @@ class Evaluator:
         original_class_definition = self.environment["objects"][class_name]
         # print("original_class_definition: ", original_class_definition)
 
-        # 处理fields
-        for field_name in original_class_definition['fields']:
-            field_value = original_class_definition['fields'][field_name]
-            # 如果属性的首字母大写，则加入到新对象的属性中（看作publlic）,否则不加入 (继承public类型的属性)
-            return_instance["fields"][field_name] = field_value
-        # print("return_instance(处理prototype的fields后): ",return_instance)
-
-        # 处理fields_annotations
-        for field_name in original_class_definition['fields_annotations']:
-            field_annotation = original_class_definition['fields_annotations'][field_name]
-            return_instance["fields_annotations"][field_name] = field_annotation
-
-        # 处理methods
-        for method_name in original_class_definition['methods']:
-            method_body = original_class_definition['methods'][method_name]['body']
-            method_args = original_class_definition['methods'][method_name]['args']
-            method_default_values = original_class_definition['methods'][method_name]['default_values']
-            return_instance["methods"][method_name] = {
-                # 函数注解
-                "annotations": original_class_definition['methods'][method_name]["annotations"],
-                "args": method_args,
-                "body": method_body,
-                "default_values": method_default_values,
-            }
-        # print("return_instance(处理prototype的methods后): ",return_instance)
+        # 用于存储实例化后的对象: 字段值是类的默认值的副本
+        descriptor = original_class_definition['descriptor']
+        return_instance = descriptor.new_instance()
 
         # 处理init
-        if original_class_definition['init']:
-            init_args = original_class_definition['init']['args']
-            init_body = original_class_definition['init']['body']
-            init_default_values = original_class_definition['init']['default_values']
-            return_instance["init"] = {
-                "args": init_args,
-                "body": init_body,
-                "default_values": init_default_values
-            }
-            # print("return_instance(处理prototype的init后): ",return_instance)
+        init_dict = descriptor.init
+        if init_dict:
+            init_args = init_dict['args']
+            init_body = init_dict['body']
             # init内部有两类语句： 1，赋值语句(涉及的变量和fields中的名称一样，看作对属性的赋值)  2，其他语句（比如赋值、输出等）
 
-            # 将传进来的参数赋值到 return_instance["fields"]里面去
-            # print("\nreturn_instance['fields']: ",return_instance["fields"])
-            # print("要初始化init_args的变量(及其顺序): ",init_args)
-            # print("传进来的参数(node.arguments):",node.arguments)
-
-            # 字段赋值  取出node.arguments的第一个参数，赋值给return_instance["fields"]中对应的字段
-            # 处理 let 字段 = 值; 这样的语句
-            # fields = list(return_instance["fields"].keys())
-            # print("fields: ",fields)
-            # for i in range(len(init_args)):
-            #         field_name = fields[i]
-            #         return_instance["fields"][field_name] = self.evaluate(node.arguments[i])
-            # print("赋值后的return_instance['fields']: ",return_instance["fields"])
-
             # =============为了让init内部可以访问变量，需要设置新环境=====为了下面的for statement in init_body可以访问变量服务===============================
             # 记录旧环境
             old_env = self.environment
-            self.environment = self.environment = {
+            init_env = Scope({
                 "constants": [],  # 记录声明的常量
                 "objects": {},  # 导入的类和创建的对象
-            }
-            # 将传进来的参数放到新环境里面
+            }, is_function=True)
+            # 将传进来的参数放到新环境里面(参数在旧环境中求值)
             for i in range(len(node.arguments)):
                 arg_name = init_args[i]  # 获取参数名称，从哪获取呢?
                 arg_value = self.evaluate(node.arguments[i])  # 取出参数的值
-                self.environment[arg_name] = arg_value
+                init_env.define(arg_name, arg_value)
+            self.environment = init_env
             # print("environment: ", self.environment)
 
             # =============为了让init内部可以访问变量，需要设置新环境====================================
 
-            # 2, 处理非赋值语句
-            for statement in init_body:
-                # 再遇到赋值语句额时候发生错误，因为已经赋值过了，所以这里不再处理对字段的赋值语句
-                if isinstance(statement, AssignmentNode) and statement.name in return_instance["fields"]:
-                    return_instance["fields"][statement.name] = self.evaluate(statement.value)
-                else:
-                    self.evaluate(statement)  # 处理语句，比如函数调用、赋值语句等
-            # 回复旧环境
-            self.environment = old_env
+            try:
+                # 2, 处理非赋值语句
+                for statement in init_body:
+                    # 对字段的赋值语句直接写到实例的 slots 中
+                    if isinstance(statement, AssignmentNode) and return_instance.has_field(statement.name):
+                        return_instance.set_field(statement.name, self.evaluate(statement.value))
+                    # 处理语句，比如函数调用、赋值语句等; init 中的 return 结束初始化
+                    elif self.evaluate(statement).__class__ is ControlSignal:
+                        self.return_value = None
+                        break
+            finally:
+                # 回复旧环境
+                self.environment = old_env
         # print("return_instance最终: ", return_instance)
 
         # =======================处理对象调用方法===============================
@@ -1416,8 +1598,8 @@ class Evaluator:
 
         # 处理方法
         for method_name in node.methods:
-            print("node.methods[method_name].annotations= =================> ", node.methods[method_name].annotations,
-                  "\n")
+            tracer.debug("node.methods[method_name].annotations= =================> ",
+                         node.methods[method_name].annotations)
 
             class_dict['methods'][method_name] = {
                 # 注解注解
@@ -1438,7 +1620,7 @@ class Evaluator:
         # print("init: ", class_dict['init'])
         # 将类定义存储在环境中
         self.environment["objects"][class_name] = class_dict
-        print("class_dict: ", self.environment["objects"][class_name])
+        tracer.debug("class_dict: ", self.environment["objects"][class_name])
 
         # ==============extends========测试=========================================
         # 有一个问题, 初始类问题,
@@ -1470,7 +1652,6 @@ class Evaluator:
             # print("此时的node: ", node)
             # print("父类: ", node.parent_name)
             # print("此时的环境: ", self.environment)
-            print(type(node.parent_name))
             # print("父类： ", self.environment["objects"][node.parent_name])
 
             extended_fields = {}
@@ -1481,7 +1662,7 @@ class Evaluator:
                 if parent_field_name[0].isupper() and not ifSubclassHasAttribute(node.classname, parent_field_name):
                     extended_fields[parent_field_name] = self.environment["objects"][node.parent_name]["fields"][
                         parent_field_name]
-            print("extended_fields:", extended_fields)
+            tracer.debug("extended_fields:", extended_fields)
 
             # 处理父类的methods
             for parent_method_name in self.environment["objects"][node.parent_name]["methods"]:
@@ -1489,7 +1670,7 @@ class Evaluator:
                 if parent_method_name[0].isupper() and not ifSubclassHasMethod(node.classname, parent_method_name):
                     extended_methods[parent_method_name] = self.environment["objects"][node.parent_name]["methods"][
                         parent_method_name]
-            print("extended_methods:", extended_methods)
+            tracer.debug("extended_methods:", extended_methods)
 
             # ============关键一步==============================
             # 将方法和属性合并到class_dict中
@@ -1526,6 +1707,9 @@ class Evaluator:
                         f"Class '{class_name}' does not implement method '{method_name}' declared in interface '{interface_name}'")
         # ========================处理接口实现问题===============================
 
+        # 类描述: 继承合并完之后创建，这个类的所有实例共用
+        class_dict['descriptor'] = ClassDescriptor(class_name, class_dict)
+
     def import_module(self, node: ImportModuleNode):
         """
             引入包，将包里面的变量、代码等都加载到环境变量中
@@ -1536,7 +1720,7 @@ class Evaluator:
             # 将导入的包内容添加到当前环境
             # 这里的 imported_env 是一个字典，里面包含了导入的包中的变量和函数等, 其中的key是没有包作为前缀的
             # imported_env.items() 的格式是:[('add', {args: [], body: []})]这样
-            for name, value in imported_env.items():
+            for name, value in imported_env.vars.items():
                 # print("name: ", name)
                 # print("value: ", value)
                 # 模块名称.方法名称
@@ -1567,20 +1751,23 @@ class Evaluator:
         """
 
         # 创建的新环境变量要和self.environment形式一致，才能正常工作，也就才能定义常量
-        package_env = {
+        package_env = Scope({
             "constants": []
-        }
+        }, is_function=True)
         old_env = self.environment
         self.environment = package_env
 
-        for statement in node.package_body:
-            self.evaluate(statement)
+        try:
+            for statement in node.package_body:
+                self.evaluate(statement)
+        finally:
+            self.environment = old_env
 
         # ================核心===================================
         # 将包的环境保存到 self.packages 字典中，以便将来可能的导入。
+        # 包里面定义的函数的 closure 就是 package_env, 所以导入后仍然可以访问包内部的变量
         self.packages[node.package_name] = package_env
         # print("@@@self.packages: ", self.packages)
-        self.environment = old_env
 
     def evaluate_function_call(self, node: FunctionCallNode):
         """
@@ -1593,550 +1780,451 @@ class Evaluator:
                                          args=[
                                              StringNode(value=add function被调用...)])]}}
         """
-        color_map = {
-            'println': (Fore.RESET, None),
-            'printlnRed': (Fore.RED, None),
-            'printlnYellow': (Fore.YELLOW, None),
-            'printlnBlue': (Fore.BLUE, None),
-            'printlnCyan': (Fore.CYAN, None),
-            'printlnRedBg': (Fore.RESET, Back.RED),
-            'printlnLightGreen': (Fore.LIGHTGREEN_EX, None)
-        }
+        # ===================处理嵌套函数调用=========================================
+        # 得到的是函数调用节点
+        if isinstance(node.name, FunctionCallNode):
+            # print("函数调用节点: ", node)
+            # node.name是一个FunctionCallNode，也就是fcn嵌套fcn
+            func_dict = self.evaluate(node.name)
+            # 参数是传递给func_dict描述的方法的！！！
+            return self.eval_by_func_dict(func_dict, node.args)
+        # ===================处理嵌套函数调用=========================================
 
-        # 检查一个实例对象是不是另一个类的实例
-        if node.name == "isInstance":
-            args = [self.evaluate(arg) for arg in node.args]
-            instance = args[0]  # instance被解析为一个ditc对象，包含fiels和methods等
-            print("instance: ", instance)
-            classname = args[1]
-            # print("classname: ",classname)
-            if instance["parent_name"] == classname:
-                return True
-            else:
-                return False
-                # 简单示例，仅支持打印函数
-        if node.name == 'print':
-            args = [self.evaluate(arg) for arg in node.args]
-            print(*args, end="")
-            return None
+        # 先查找用户自定义的函数, 找不到再查内置函数注册表(见 Builtins.py)
+        func_dict = self.environment.get(node.name)
+        if func_dict.__class__ is not dict or "body" not in func_dict:
+            builtin_function = self.builtins.get(node.name)
+            if builtin_function is not None:
+                return builtin_function(node)
+            native_function = self.native_builtins.get(node.name)
+            if native_function is None:
+                native_function = NATIVE_BUILTINS.get(node.name)
+            if native_function is not None:
+                # 评估参数, 调用方法并返回结果
+                return native_function(*[self.evaluate(arg) for arg in node.args])
+            if func_dict is None:
+                raise NameError(f"Function '{node.name}' not defined{sources.where(node.position)}")
+
+        # ========================调用用户自定义的函数==============================
+        """
+            将外界传入的参数放入函数的局部作用域中，然后执行函数体，
+            这样做，内部函数可以访问外界传入的变量
+        """
+        # 如果 func 是一个函数（包括 Lambda 函数）
+        func_args = func_dict['args']  # 形参名称,比如 ['a', 'b']
+        body_statements = func_dict['body']  # 函数体
+        return_value = None  # 函数返回值
 
-        # 简单示例，仅支持打印函数
-        if node.name == 'println':
-            args = [self.evaluate(arg) for arg in node.args]
-            print(*args)
-            return None
+        # ============默认参数的部分===========================
+        # FunctionCallNode(
+        #       name=add,
+        #       args=[NumberNode(value=111111), StringNode(value=empty str)])
+        # node.args:  是实际传入的参数  func_args：是形参,函数参数名称(list类型)
+        local_scope = {}
+        # print("node: ", node)
+        # func_dict["defaults"]指的是函数声明时候放到environment中的默认值
+        default_values = func_dict["defaults"]
+        arg_keys = list(default_values.keys())
+        for arg_key in arg_keys:
+            local_scope[arg_key] = self.evaluate(default_values[arg_key])
+        """
+            1,node是FunctionDeclarationNode,包含了函数定义时候的具体细节,而不是FunctionCallNode
+        """
+        # =========================================================
+        # 参数检查(个数)
+        # if len(func_args) != len(node.args):  # 参数检查， 这里仅仅支持位置参数
+        #     raise ValueError(
+        #         f"Function '{node.name}' expects {len(func_args)} arguments but got {len(node.args)}.")
+
+        # 将实际参数与形参对应
+        # node.args: 实际传入的参数  func_args: 形参名称
+        # arg_name: 形式参数名  arg_value: 实际参数值
+        # ====================位置参数处理=====================================
+
+        # print(" zip(func_args, node.args): ", list(zip(func_args, node.args)))
+        # zip(func_args, node.args): [('x', FunctionDeclarationNode(is_static=False, name=cb, args=['y'], body=[
+        #     FunctionCallNode(name=print, args=[VariableNode(value=y)], named_arg_values={})], default_values={}, ))]
+        # node.args是实参，func_args是形参
+        # print("测试func_args: ", func_args)
+        for arg_name, arg_value in zip(func_args, node.args):
+            local_scope[arg_name] = self.evaluate(arg_value)
 
-        # 打印十六进制
-        elif node.name == 'printlnHex':
-            args = [self.evaluate(arg) for arg in node.args]
-            hex_args = []
-            for arg in args:
-                if isinstance(arg, int):
-                    hex_args.append(hex(arg))
-                elif isinstance(arg, str):
-                    # 如果是字符串，尝试将其转换为整数后再转换为十六进制
-                    try:
-                        hex_args.append(hex(int(arg)))
-                    except ValueError:
-                        hex_args.append(arg)  # 如果无法转换，保持原样
-                else:
-                    hex_args.append(str(arg))  # 其他类型保持原样
-            print(*hex_args)
-            return None
+        # 将命名参数放到环境中
+        # 命名参数，比如 add(a=1, b=2)
+        # print("node: ", node.named_arg_values.items())
+        for named_arg, named_arg_value in node.named_arg_values.items():
+            local_scope[named_arg] = self.evaluate(named_arg_value)
 
-        elif node.name == 'printlnBin':
-            args = [self.evaluate(arg) for arg in node.args]
-            bin_args = []
-            for arg in args:
-                if isinstance(arg, int):
-                    bin_args.append(bin(arg))
-                elif isinstance(arg, str):
-                    # 如果是字符串，尝试将其转换为整数后再转换为二进制
-                    try:
-                        bin_args.append(bin(int(arg)))
-                    except ValueError:
-                        bin_args.append(arg)  # 如果无法转换，保持原样
-                else:
-                    bin_args.append(str(arg))  # 其他类型保持原样
-            print(*bin_args)
-            return None
+        # ===============检查参数=============在默认参数和传入参数合并后判断参数是否齐全============
+        # print("需要的参数: ",func_args)
+        for format_param in func_args:
+            if format_param not in local_scope:
+                raise ValueError(f"Function '{node.name}' expects parameter '{format_param}' but got nothing.")
 
-        # 输出八进制
-        elif node.name == 'printlnOct':
-            args = [self.evaluate(arg) for arg in node.args]
-            oct_args = []
-            for arg in args:
-                if isinstance(arg, int):
-                    oct_args.append(oct(arg))
-                elif isinstance(arg, str):
-                    # 如果是字符串，尝试将其转换为整数后再转换为八进制
-                    try:
-                        oct_args.append(oct(int(arg)))
-                    except ValueError:
-                        oct_args.append(arg)  # 如果无法转换，保持原样
-                else:
-                    oct_args.append(str(arg))  # 其他类型保持原样
-            print(*oct_args)
-            return None
+        # =======================环境================================
+        # 创建函数的局部作用域, 父作用域是定义函数时的作用域(closure), 这样做，内部函数可以访问外界的变量
+        function_scope = self.new_function_scope(func_dict, local_scope)
+        if func_dict.get("generator"):
+            # 生成器函数: 调用时不执行函数体，返回惰性序列(见 start_generator)
+            return self.start_generator(body_statements, function_scope)
+        # 保存当前的环境，以便函数执行完后恢复
+        previous_environment = self.environment
+        self.environment = function_scope
 
-        # 带颜色的打印函数
-        if node.name in color_map:
-            args = [self.evaluate(arg) for arg in node.args]
-            foreground_color, background_color = color_map[node.name]
+        try:
+            # ==================执行方法体=============================
+            # 任意深度(if里面的循环里面的if...)的 return 都以 RETURN_SIGNAL 的形式传递到这里
+            return self.execute_function_body(body_statements)
+        finally:
+            # ========================恢复环境===================
+            # 恢复之前的环境(包括遇到return提前返回的情况)
+            self.environment = previous_environment
+        # ======================================================
 
-            if background_color:
-                print(background_color, *args, Fore.RESET)
-            else:
-                print(foreground_color, *args, Fore.RESET)
-            return None
+    # ===========================内置函数===========================
+    # 函数名 -> 方法 的映射见 build_builtin_table()
 
-        if node.name == "listLength":
-            # args是一个list, 只有一个元素
-            if len(node.args) != 1:
-                raise ValueError(f"Function '{node.name}' expects 1 argument but got {len(node.args)}.")
-            args: List = self.evaluate(node.args[0])
-            return len(args)
+    def builtin_is_instance(self, node: FunctionCallNode):
+        # 检查一个实例对象是不是另一个类的实例
+        args = [self.evaluate(arg) for arg in node.args]
+        instance = args[0]  # instance是Instance对象，instance.cls是它的类描述
+        tracer.debug("instance: ", instance)
+        classname = args[1]
+        # print("classname: ",classname)
+        if isinstance(instance, Instance) and instance.cls.name == classname:
+            return True
+        else:
+            return False
 
-        # args=[StringNode(value=list length is: ), VariableNode(value=len)])
-        if node.name == "listAppend":
-            # 添加的单个元素  listAppend(list名称, value)
-            if len(node.args) == 2:
-                # 1,获取要添加的元素
-                element_to_add = self.evaluate(node.args[1])
-                # 2, 获取要添加元素的list
-                # 特性：可以添加任意类型的元素，比如字符串，数字，对象，列表等，
-                list_appended: List = self.evaluate(node.args[0])
-                # 3, 添加元素
-                list_appended.append(element_to_add)
-                return list_appended
+    def builtin_print(self, node: FunctionCallNode):
+        args = [self.evaluate(arg) for arg in node.args]
+        print(*args, end="")
+        return None
+
+    def builtin_println(self, node: FunctionCallNode):
+        args = [self.evaluate(arg) for arg in node.args]
+        print(*args)
+        return None
+
+    def builtin_println_hex(self, node: FunctionCallNode):
+        # 打印十六进制
+        args = [self.evaluate(arg) for arg in node.args]
+        hex_args = []
+        for arg in args:
+            if isinstance(arg, int):
+                hex_args.append(hex(arg))
+            elif isinstance(arg, str):
+                # 如果是字符串，尝试将其转换为整数后再转换为十六进制
+                try:
+                    hex_args.append(hex(int(arg)))
+                except ValueError:
+                    hex_args.append(arg)  # 如果无法转换，保持原样
             else:
-                raise NameError(f"List '{node.name}' not defined")
+                hex_args.append(str(arg))  # 其他类型保持原样
+        print(*hex_args)
+        return None
 
-        # 删除指定位置的元素
-        if node.name == "listPopByIndex":
-            # listPopByIndex(list名称, index)
-
-            # 检查参数类型 int expected
-            if not isinstance(self.evaluate(node.args[1]), int):
-                raise ValueError(f"int expected, but got {self.evaluate(node.args[1])}.")
-
-            if len(node.args) == 2:
-                # 1,获取要添加的元素
-                index_to_pop = self.evaluate(node.args[1])
-                # 2, 获取要添加元素的list
-                # 特性：可以添加任意类型的元素，比如字符串，数字，对象，列表等，
-                list_to_pop: List = self.evaluate(node.args[0])
-                # 3, 添加元素
-                # list_to_pop.pop(index_to_pop - 1)
-                list_to_pop.pop(index_to_pop)
-
-                return list_to_pop
+    def builtin_println_bin(self, node: FunctionCallNode):
+        args = [self.evaluate(arg) for arg in node.args]
+        bin_args = []
+        for arg in args:
+            if isinstance(arg, int):
+                bin_args.append(bin(arg))
+            elif isinstance(arg, str):
+                # 如果是字符串，尝试将其转换为整数后再转换为二进制
+                try:
+                    bin_args.append(bin(int(arg)))
+                except ValueError:
+                    bin_args.append(arg)  # 如果无法转换，保持原样
             else:
-                raise NameError(f"List '{node.name}' not defined")
+                bin_args.append(str(arg))  # 其他类型保持原样
+        print(*bin_args)
+        return None
 
-        # 对象的两个方法
-        if node.name == "objectKeys":
-            # objectKeys(obj)
-            if len(node.args) != 1:
-                raise ValueError(f"Function '{node.name}' expects 1 argument but got {len(node.args)}.")
-            args: dict = self.evaluate(node.args[0])
-            return list(args.keys())
-
-        if node.name == "objectValues":
-            # objectValues(obj)
-            if len(node.args) != 1:
-                raise ValueError(f"Function '{node.name}' expects 1 argument but got {len(node.args)}.")
-            args: dict = self.evaluate(node.args[0])
-            return list(args.values())
-        if node.name == "SetLength":
-            myset = self.evaluate(node.args[0])
-            return len(myset)
-        if node.name == "SetAdd":
-            myset = self.evaluate(node.args[0])
-            element = self.evaluate(node.args[1])
-            try:
-                myset.add(element)
-                return True
-            except:
-                return False
-        if node.name == "SetRemove":
-            myset = self.evaluate(node.args[0])
-            element = self.evaluate(node.args[1])
-            try:
-                myset.remove(element)
-                return True
-            except:
-                return False
+    def builtin_println_oct(self, node: FunctionCallNode):
+        # 输出八进制
+        args = [self.evaluate(arg) for arg in node.args]
+        oct_args = []
+        for arg in args:
+            if isinstance(arg, int):
+                oct_args.append(oct(arg))
+            elif isinstance(arg, str):
+                # 如果是字符串，尝试将其转换为整数后再转换为八进制
+                try:
+                    oct_args.append(oct(int(arg)))
+                except ValueError:
+                    oct_args.append(arg)  # 如果无法转换，保持原样
+            else:
+                oct_args.append(str(arg))  # 其他类型保持原样
+        print(*oct_args)
+        return None
 
-        if node.name == "SetContains":
-            myset = self.evaluate(node.args[0])
-            element = self.evaluate(node.args[1])
-            return element in myset
+    def builtin_color_println(self, node: FunctionCallNode):
+        # 带颜色的打印函数
+        args = [self.evaluate(arg) for arg in node.args]
+        foreground_color, background_color = COLOR_PRINTERS[node.name]
 
-        if node.name == "SetIsSubset":
-            myset1 = self.evaluate(node.args[0])
-            myset2 = self.evaluate(node.args[1])
-            return myset1.issubset(myset2)
+        if background_color:
+            print(background_color, *args, Fore.RESET)
+        else:
+            print(foreground_color, *args, Fore.RESET)
+        return None
 
-        if node.name == "SetIsSuperset":
-            myset1 = self.evaluate(node.args[0])
-            myset2 = self.evaluate(node.args[1])
-            return myset1.issuperset(myset2)
+    def builtin_list_length(self, node: FunctionCallNode):
+        # args是一个list, 只有一个元素
+        if len(node.args) != 1:
+            raise ValueError(f"Function '{node.name}' expects 1 argument but got {len(node.args)}.")
+        args: List = self.evaluate(node.args[0])
+        return len(args)
 
-        if node.name == "SetClear":
-            myset = self.evaluate(node.args[0])
-            myset.clear()
-            return True
+    def builtin_list_append(self, node: FunctionCallNode):
+        # args=[StringNode(value=list length is: ), VariableNode(value=len)])
+        # 添加的单个元素  listAppend(list名称, value)
+        if len(node.args) == 2:
+            # 1,获取要添加的元素
+            element_to_add = self.evaluate(node.args[1])
+            # 2, 获取要添加元素的list
+            # 特性：可以添加任意类型的元素，比如字符串，数字，对象，列表等，
+            list_appended: List = self.evaluate(node.args[0])
+            # 3, 添加元素
+            list_appended.append(element_to_add)
+            return list_appended
+        else:
+            raise NameError(f"List '{node.name}' not defined")
 
-        if node.name == "SetUnion":
-            myset1 = self.evaluate(node.args[0])
-            myset2 = self.evaluate(node.args[1])
-            return myset1.union(myset2)
-        if node.name == "SetIntersection":
-            myset1 = self.evaluate(node.args[0])
-            myset2 = self.evaluate(node.args[1])
-            return myset1.intersection(myset2)
+    def builtin_list_pop_by_index(self, node: FunctionCallNode):
+        # 删除指定位置的元素
+        # listPopByIndex(list名称, index)
+
+        # 检查参数类型 int expected
+        if not isinstance(self.evaluate(node.args[1]), int):
+            raise ValueError(f"int expected, but got {self.evaluate(node.args[1])}.")
+
+        if len(node.args) == 2:
+            # 1,获取要添加的元素
+            index_to_pop = self.evaluate(node.args[1])
+            # 2, 获取要添加元素的list
+            # 特性：可以添加任意类型的元素，比如字符串，数字，对象，列表等，
+            list_to_pop: List = self.evaluate(node.args[0])
+            # 3, 添加元素
+            # list_to_pop.pop(index_to_pop - 1)
+            list_to_pop.pop(index_to_pop)
+
+            return list_to_pop
+        else:
+            raise NameError(f"List '{node.name}' not defined")
 
-        if node.name == "SetDiff":
-            myset1 = self.evaluate(node.args[0])
-            myset2 = self.evaluate(node.args[1])
-            return myset1.difference(myset2)
+    def builtin_object_keys(self, node: FunctionCallNode):
+        # 对象的两个方法
+        # objectKeys(obj)
+        if len(node.args) != 1:
+            raise ValueError(f"Function '{node.name}' expects 1 argument but got {len(node.args)}.")
+        args: dict = self.evaluate(node.args[0])
+        return list(args.keys())
+
+    def builtin_object_values(self, node: FunctionCallNode):
+        # objectValues(obj)
+        if len(node.args) != 1:
+            raise ValueError(f"Function '{node.name}' expects 1 argument but got {len(node.args)}.")
+        args: dict = self.evaluate(node.args[0])
+        return list(args.values())
+
+    def builtin_set_length(self, node: FunctionCallNode):
+        myset = self.evaluate(node.args[0])
+        return len(myset)
+
+    def builtin_set_add(self, node: FunctionCallNode):
+        myset = self.evaluate(node.args[0])
+        element = self.evaluate(node.args[1])
+        try:
+            myset.add(element)
+            return True
+        except:
+            return False
 
-        if node.name == "GetParamsByName":
-            func_name = self.evaluate(node.args[0])
-            return self.environment[func_name]["args"]
+    def builtin_set_remove(self, node: FunctionCallNode):
+        myset = self.evaluate(node.args[0])
+        element = self.evaluate(node.args[1])
+        try:
+            myset.remove(element)
+            return True
+        except:
+            return False
 
+    def builtin_set_contains(self, node: FunctionCallNode):
+        myset = self.evaluate(node.args[0])
+        element = self.evaluate(node.args[1])
+        return element in myset
+
+    def builtin_set_is_subset(self, node: FunctionCallNode):
+        myset1 = self.evaluate(node.args[0])
+        myset2 = self.evaluate(node.args[1])
+        return myset1.issubset(myset2)
+
+    def builtin_set_is_superset(self, node: FunctionCallNode):
+        myset1 = self.evaluate(node.args[0])
+        myset2 = self.evaluate(node.args[1])
+        return myset1.issuperset(myset2)
+
+    def builtin_set_clear(self, node: FunctionCallNode):
+        myset = self.evaluate(node.args[0])
+        myset.clear()
+        return True
+
+    def builtin_set_union(self, node: FunctionCallNode):
+        myset1 = self.evaluate(node.args[0])
+        myset2 = self.evaluate(node.args[1])
+        return myset1.union(myset2)
+
+    def builtin_set_intersection(self, node: FunctionCallNode):
+        myset1 = self.evaluate(node.args[0])
+        myset2 = self.evaluate(node.args[1])
+        return myset1.intersection(myset2)
+
+    def builtin_set_diff(self, node: FunctionCallNode):
+        myset1 = self.evaluate(node.args[0])
+        myset2 = self.evaluate(node.args[1])
+        return myset1.difference(myset2)
+
+    def builtin_get_params_by_name(self, node: FunctionCallNode):
+        func_name = self.evaluate(node.args[0])
+        return self.environment[func_name]["args"]
+
+    def builtin_get_default_values(self, node: FunctionCallNode):
         # 通过方法名称获取默认参数
-        if node.name == "GetDefaultValues":
-            func_name = self.evaluate(node.args[0])
-            defaults = self.environment[func_name]["defaults"]
-            # defaults:  {'x': NumberNode(value=1)}
-            # print("defaults: ", defaults)
-            for key in defaults:
-                defaults[key] = self.evaluate(defaults[key])
-            return defaults
-
+        func_name = self.evaluate(node.args[0])
+        defaults = self.environment[func_name]["defaults"]
+        # defaults:  {'x': NumberNode(value=1)}
+        # print("defaults: ", defaults)
+        for key in defaults:
+            defaults[key] = self.evaluate(defaults[key])
+        return defaults
+
+    def builtin_invoke_func(self, node: FunctionCallNode):
         # 通过方法名称调用函数
         # InvokeFunc("方法名称", {})
-        if node.name == "InvokeFunc":
-            name_and_params = [self.evaluate(arg) for arg in node.args]
-            print("name_and_params: ", name_and_params)
-            # 比如: name_and_params:  ['cb', {'x': 5}]
-            return self.invokefunc_server(self.environment[name_and_params[0]], name_and_params[1])
+        name_and_params = [self.evaluate(arg) for arg in node.args]
+        tracer.debug("name_and_params: ", name_and_params)
+        # 比如: name_and_params:  ['cb', {'x': 5}]
+        return self.invokefunc_server(self.environment[name_and_params[0]], name_and_params[1])
 
+    def builtin_get_fields_by_class_name(self, node: FunctionCallNode):
         # 返回类名的字段
-        if node.name == "GetFieldsByClassName":
-            print("GetFields的参数: ", node.args)
-            if len(node.args) > 1:
-                raise ValueError(f"Function '{node.name}' expects 1 argument but got {len(node.args)}.")
-            # 传入的参数就是类名
-            classname = self.evaluate(node.args[0])
-            # 从环境中获取fields的学习
-            fields = self.environment["objects"][classname]["fields"]
-            print("fields: ", fields)
-            return fields
-
+        tracer.debug("GetFields的参数: ", node.args)
+        if len(node.args) > 1:
+            raise ValueError(f"Function '{node.name}' expects 1 argument but got {len(node.args)}.")
+        # 传入的参数就是类名
+        classname = self.evaluate(node.args[0])
+        # 从环境中获取fields的学习
+        fields = self.environment["objects"][classname]["fields"]
+        tracer.debug("fields: ", fields)
+        return fields
+
+    def builtin_get_instance_fields(self, node: FunctionCallNode):
         # GetInstanceFields
-        if node.name == "GetInstanceFields":
-            instance_name = f"{node.args[0].value}"
-            # print("instance_name: ",instance_name)
-            # {'fields': {'Name': 'Fight从入门到精通', 'Price': 99}, 'methods': {}...}
-            instance_dict = self.environment["instances"][instance_name]
-            return instance_dict['fields']
+        instance_name = f"{node.args[0].value}"
+        # print("instance_name: ",instance_name)
+        # {'Name': 'Fight从入门到精通', 'Price': 99}
+        instance = self.environment["instances"][instance_name]
+        return instance.fields()
 
+    def builtin_get_instance_methods(self, node: FunctionCallNode):
         # 获取实例的方法的相关信息
-        if node.name == "GetInstanceMethods":
-            print("node.args:  ", node.args)
-            instance_name = f"{node.args[0].value}"
-            instance_methods_dict = self.environment["instances"][instance_name]["methods"]
-            print("instance_methods_dict: ", instance_methods_dict)
-
-            result = []
-            for method_name in instance_methods_dict:
-                single_method_dict = instance_methods_dict[method_name]
-                # single method dict: {'args': ['x', 'y'], 'body': []}
-                del single_method_dict['body']
-                single_method_dict['method_name'] = method_name
-                result.append(single_method_dict)
-                for arg in single_method_dict['default_values']:
-                    print("arg: ", arg)
-                    single_method_dict['default_values'][arg] = self.evaluate(single_method_dict['default_values'][arg])
-            return result
+        tracer.debug("node.args:  ", node.args)
+        instance_name = f"{node.args[0].value}"
+        # 方法是类的所有实例共用的，这里返回副本，不能修改
+        instance_methods_dict = self.environment["instances"][instance_name].cls.methods
+        tracer.debug("instance_methods_dict: ", instance_methods_dict)
+
+        result = []
+        for method_name in instance_methods_dict:
+            # single method dict: {'args': ['x', 'y'], 'body': []}
+            single_method_dict = {key: value for key, value in instance_methods_dict[method_name].items()
+                                  if key != 'body'}
+            single_method_dict['method_name'] = method_name
+            result.append(single_method_dict)
+            default_values = {}
+            for arg in single_method_dict['default_values']:
+                tracer.debug("arg: ", arg)
+                default_values[arg] = self.evaluate(single_method_dict['default_values'][arg])
+            single_method_dict['default_values'] = default_values
+        return result
 
+    def builtin_set_instance_field(self, node: FunctionCallNode):
         # 设置实例的字段值 SetInstanceField(instance_name,{field:value,field2:value2})
-        if node.name == "SetInstanceField":
-
-            instance_name = f"{node.args[0].value}"
-            field_and_value = self.evaluate(node.args[1])
-            # 可以修改多个属性和值
-            fields = list(field_and_value.keys())
-            values = list(field_and_value.values())
-            for i in range(len(fields)):
-                if fields[i] in self.environment["instances"][instance_name]["fields"]:
-                    self.environment["instances"][instance_name]["fields"][fields[i]] = values[i]
-                else:
-                    raise NameError(f"Field '{fields[i]}' not defined in instance '{instance_name}'")
-            return True
 
+        instance_name = f"{node.args[0].value}"
+        field_and_value = self.evaluate(node.args[1])
+        # 可以修改多个属性和值
+        fields = list(field_and_value.keys())
+        values = list(field_and_value.values())
+        for i in range(len(fields)):
+            instance = self.environment["instances"][instance_name]
+            if instance.has_field(fields[i]):
+                instance.set_field(fields[i], values[i])
+            else:
+                raise NameError(f"Field '{fields[i]}' not defined in instance '{instance_name}'")
+        return True
+
+    def builtin_invoke_instance_method(self, node: FunctionCallNode):
         # 调用实例的方法 InvokeInstanceMethod(instance_name, "method_name", args_dict)
         # 似乎仅仅支持命名参数
-        if node.name == "InvokeInstanceMethod":
-            print("node.args=====>  ", node.args)
-            instance_name = f"{node.args[0].value}"
-            method_name = self.evaluate(node.args[1])
-            args = self.evaluate(node.args[2])
-            print("instance_name: ", instance_name)
-            print("method_name: ", method_name)
-            print("args: ", args)
-            return self.invokefunc_server(self.environment["instances"][instance_name]["methods"][method_name], args)
-
+        tracer.debug("node.args=====>  ", node.args)
+        instance_name = f"{node.args[0].value}"
+        method_name = self.evaluate(node.args[1])
+        args = self.evaluate(node.args[2])
+        tracer.debug("instance_name: ", instance_name)
+        tracer.debug("method_name: ", method_name)
+        tracer.debug("args: ", args)
+        return self.invokefunc_server(self.environment["instances"][instance_name].cls.methods[method_name], args)
+
+    def builtin_partial_update(self, node: FunctionCallNode):
         # partialUpdate
         # args: [VariableNode(value=p), ObjectNode(properties={'x': NumberNode(value=4)})]
-        if node.name == "partialUpdate":
-            # 返回 False 或者 True 表示是否成功
-            instance_name = f"{node.args[0].value}"
-            # 比如  {'x': 4}
-            if instance_name not in self.environment:
-                return False
-            update_dict = self.evaluate(node.args[1])
-            for modification_key_name in update_dict:
-                self.environment[instance_name]["value"][modification_key_name] = update_dict[modification_key_name]
-            return True
+        # 返回 False 或者 True 表示是否成功
+        instance_name = f"{node.args[0].value}"
+        # 比如  {'x': 4}
+        if instance_name not in self.environment:
+            return False
+        update_dict = self.evaluate(node.args[1])
+        for modification_key_name in update_dict:
+            self.environment[instance_name]["value"][modification_key_name] = update_dict[modification_key_name]
+        return True
 
+    def builtin_get_method_annotations(self, node: FunctionCallNode):
         # GetMethodAnnotations
-        if node.name == "GetMethodAnnotations":
-            # GetMethodAnnotations(instance_name: 实例, method_name:str)
-            instance_name = f"{node.args[0].value}"
-            method_name = self.evaluate(node.args[1])
-            # print("GetMethodAnnotations: ", instance_name, method_name)
-            try:
-                annotations = self.environment["instances"][instance_name]["methods"][method_name]["annotations"]
-                for key in annotations:
-                    # 解析出值
-                    annotations[key] = self.evaluate(annotations[key])
-                return annotations
-            except:
-                return {}
+        # GetMethodAnnotations(instance_name: 实例, method_name:str)
+        instance_name = f"{node.args[0].value}"
+        method_name = self.evaluate(node.args[1])
+        # print("GetMethodAnnotations: ", instance_name, method_name)
+        try:
+            annotations = self.environment["instances"][instance_name].cls.methods[method_name]["annotations"]
+            # 解析出值(注解是类的所有实例共用的，不能原地修改)
+            return {key: self.evaluate(annotations[key]) for key in annotations}
+        except:
+            return {}
 
+    def builtin_get_field_annotations(self, node: FunctionCallNode):
         # GetFieldAnnotations
-        if node.name == "GetFieldAnnotations":
-            # GetFieldAnnotations(instance_name: 实例, field_name:str)
-            instance_name = f"{node.args[0].value}"
-            field_name = self.evaluate(node.args[1])
-            # print("GetFieldAnnotations: ", instance_name, field_name)
-            try:
-                annotations = self.environment["instances"][instance_name]["fields_annotations"]
-                print("annotations: ", annotations)
-                return {field_name: annotations[field_name]}
-            except:
-                return {}
-
-        # ===============借用python的字符串方法===================================
-        # name就是method_name
-        # dir(StringUtils) 得到StringUtils的所有方法，包括自定义的，dir返回列表
-        if node.name in dir(StringUtils):
-            # 获取方法
-            method = getattr(StringUtils, node.name)
-            # 评估参数
-            args = [self.evaluate(arg) for arg in node.args]
-            # 调用方法并返回结果
-            return method(*args)
-        # ============================FileSystemUtils==============================
-        if node.name in dir(FileSystemUtils):
-            # 获取方法
-            method = getattr(FileSystemUtils, node.name)
-            # 评估参数
-            args = [self.evaluate(arg) for arg in node.args]
-            # 调用方法并返回结果
-            return method(*args)
-        # =============================FileSystemUtils===============================
-
-        # =======================RandomUtils===================================================
-        if node.name in dir(RandomUtils):
-            # 获取方法
-            method = getattr(RandomUtils, node.name)
-            # 评估参数
-            args = [self.evaluate(arg) for arg in node.args]
-            # 调用方法并返回结果
-            return method(*args)
-
-        # =======================RandomUtils===================================================
-
-        # ===================借用python的列表方法======================================
-        if node.name in dir(ListUtils):
-            # 获取方法
-            method = getattr(ListUtils, node.name)
-            # 评估参数
-            args = [self.evaluate(arg) for arg in node.args]
-            # 调用方法并返回结果
-            return method(*args)
-
-        # ====================借用python的字典方法=============================================================
-        if node.name in dir(DictUtils):
-            method = getattr(DictUtils, node.name)
-            args = [self.evaluate(arg) for arg in node.args]
-            return method(*args)
-
-        # ====================借用python的数学模块=============================================================
-        if node.name in dir(MathUtils):
-            method = getattr(MathUtils, node.name)
-            args = [self.evaluate(arg) for arg in node.args]
-            return method(*args)
-
-        # =============================借用其他 common的方法。比如type=========
-        if node.name in dir(CommonUtils):
-            method = getattr(CommonUtils, node.name)
-            args = [self.evaluate(arg) for arg in node.args]
-            return method(*args)
-
-        # =============================借用python的time模块===================================
-        if node.name in dir(TimeUtils):
-            method = getattr(TimeUtils, node.name)
-            args = [self.evaluate(arg) for arg in node.args]
-            return method(*args)
-        if node.name == "GetFnAnnotations":
-            # 获取方法的注释
-            annotations = {}
-            func_description = self.evaluate(node.args[0])
-            if "annotations" in func_description:
-                annotations = func_description["annotations"]
-            # print("func_description: ",annotations)
-            return annotations
-
-        # ========================version1=================================
-        # 这段代码之所以没有能够解析外部传来的变量，是因为没有将传入的参数放到environment
-
-        # 自定义函数
-        # if node.name in self.environment:
-        #     # 函数字典
-        #     func_dict = self.environment[node.name]
-        #     # node.args是数组，需要将其中的元素都求值
-        #     args: List = [self.evaluate(arg) for arg in func_dict['args']]
-        #     body_statements = func_dict['body']
-        #     # 进入函数作用域
-        #     for statement in body_statements:
-        #         # 递归调用，直到所有语句都求值完毕
-        #         self.evaluate(statement)
-
-        # ========================version2==========it seems to be working========================
-        """
-            将外界传入的参数放入environment中，然后执行函数体，
-            这样做，内部函数可以访问外界传入的变量
-        """
-        # ====================处理传入的参数为匿名函数或者箭头函数====================================
-        # 仅仅函数作为参数时，仅仅支持位置参数
-
-        # ===================处理嵌套函数调用=========================================
-        # 得到的是函数调用节点
-        if isinstance(node.name, FunctionCallNode):
-            # print("函数调用节点: ", node)
-            # node.name是一个FunctionCallNode，也就是fcn嵌套fcn
-            func_dict = self.evaluate(node.name)
-            # 参数是传递给func_dict描述的方法的！！！
-            r = self.eval_by_func_dict(func_dict, node.args)
-            # print("args: ", args)
-            # print("result: ", func_dict)
-            # print("r: ", r)
-            return r
-        # ===================处理嵌套函数调用=========================================
-        # 使用Node解求值
-        if node.name in self.environment:
-            # 准备函数的参数和体
-            # print("===============> node.name: ", node.name)
-            # print("=======x====> args:  ", node.args)
-            # 结果是None
-            # print("self.environment[node.name] = ", self.environment[node.name])
-            func_dict = self.environment[node.name]
-
-            # 如果 func 是一个函数（包括 Lambda 函数）
-            func_args = func_dict['args']  # 形参名称,比如 ['a', 'b']
-            body_statements = func_dict['body']  # 函数体
-            return_value = None  # 函数返回值
-
-            # ============默认参数的部分===========================
-            # FunctionCallNode(
-            #       name=add,
-            #       args=[NumberNode(value=111111), StringNode(value=empty str)])
-            # node.args:  是实际传入的参数  func_args：是形参,函数参数名称(list类型)
-            local_scope = {}
-            # print("node: ", node)
-            # self.environment[node.name]["defaults"]指的是函数声明时候放到environment中的默认值
-            default_values = self.environment[node.name]["defaults"]
-            arg_keys = list(default_values.keys())
-            for arg_key in arg_keys:
-                local_scope[arg_key] = self.evaluate(default_values[arg_key])
-            """
-                1,node是FunctionDeclarationNode,包含了函数定义时候的具体细节,而不是FunctionCallNode
-            """
-            # =========================================================
-            # 参数检查(个数)
-            # if len(func_args) != len(node.args):  # 参数检查， 这里仅仅支持位置参数
-            #     raise ValueError(
-            #         f"Function '{node.name}' expects {len(func_args)} arguments but got {len(node.args)}.")
-
-            # 将实际参数与形参对应
-            # node.args: 实际传入的参数  func_args: 形参名称
-            # arg_name: 形式参数名  arg_value: 实际参数值
-            # ====================位置参数处理=====================================
-
-            # print(" zip(func_args, node.args): ", list(zip(func_args, node.args)))
-            # zip(func_args, node.args): [('x', FunctionDeclarationNode(is_static=False, name=cb, args=['y'], body=[
-            #     FunctionCallNode(name=print, args=[VariableNode(value=y)], named_arg_values={})], default_values={}, ))]
-            # node.args是实参，func_args是形参
-            # print("测试func_args: ", func_args)
-            for arg_name, arg_value in zip(func_args, node.args):
-                local_scope[arg_name] = self.evaluate(arg_value)
-
-            # 将命名参数放到环境中
-            # 命名参数，比如 add(a=1, b=2)
-            # print("node: ", node.named_arg_values.items())
-            for named_arg, named_arg_value in node.named_arg_values.items():
-                local_scope[named_arg] = self.evaluate(named_arg_value)
-
-            # ===============检查参数=============在默认参数和传入参数合并后判断参数是否齐全============
-            # print("需要的参数: ",self.environment[node.name]['args'])
-            for format_param in self.environment[node.name]['args']:
-                if format_param not in local_scope:
-                    raise ValueError(f"Function '{node.name}' expects parameter '{format_param}' but got nothing.")
-
-            # =======================环境================================
-            # 保存当前的环境，以便函数执行完后恢复
-            previous_environment = self.environment.copy()
-            # 更新环境为局部作用域, 并执行函数体, 这样做，内部函数可以访问外界的变量
-            self.environment.update(local_scope)
-
-            # ==================执行方法体=============================
-            return_value = None  # 默认的返回值
-            for statement in body_statements:
-                # print("statement: ", statement)
-                # 1, 拦截 在if elif else外的 return 语句
-                if isinstance(statement, ReturnNode):
-                    # return return_value.value  # 直接返回返回值
-                    return_value = self.evaluate(statement)
-                    return return_value
-
-                # 2, 拦截 if elif else 里面的 return 语句
-                # ==================if elif else里面的return =====================
-                # return_value判断是不是None, 如果不是None, 说明有了返回值，那么就是直接返回！！！
-                # statement可能是某个ifstatement语句，而ifstatement语句可能有return语句，所以需要判断一下
-                # 是否返回了值，如果返回了，说明就不用再往下执行了
-                return_value = self.evaluate(statement)
-                # if elif else里面的return的值使用dict继续包装，具体可以看if_statement()
-                if isinstance(return_value, dict) and "fight_tag" in return_value:
-                    # print("dict 类型")
-                    return return_value["value"]  # 直接返回返回值
-                # ==================if elif else里面的return=====================
-
-            # ========================恢复环境===================
-            # 恢复之前的环境
-            self.environment = previous_environment
-
-            # =======================返回值=========================
-            # 上面的for in 循环,如果for in 遇到return,会直接返回,这里就不会执行
-            return return_value  # 确保返回函数的返回值
-            # ======================================================
-        else:
-            raise NameError(f"Function '{node.name}' not defined")
+        # GetFieldAnnotations(instance_name: 实例, field_name:str)
+        instance_name = f"{node.args[0].value}"
+        field_name = self.evaluate(node.args[1])
+        # print("GetFieldAnnotations: ", instance_name, field_name)
+        try:
+            annotations = self.environment["instances"][instance_name].cls.fields_annotations
+            tracer.debug("annotations: ", annotations)
+            return {field_name: annotations[field_name]}
+        except:
+            return {}
+
+    def builtin_get_fn_annotations(self, node: FunctionCallNode):
+        # 获取方法的注释
+        annotations = {}
+        func_description = self.evaluate(node.args[0])
+        if "annotations" in func_description:
+            annotations = func_description["annotations"]
+        # print("func_description: ",annotations)
+        return annotations
 
     def invokefunc_server(self, func_dictx, args):
         """
@@ -2155,22 +2243,22 @@ class Evaluator:
         for named_arg, named_arg_value in args.items():
             local_scope[named_arg] = named_arg_value
         # =======================环境================================
+        # 创建函数的局部作用域, 并执行函数体, 这样做，内部函数可以访问外界的变量
+        function_scope = self.new_function_scope(func_dict, local_scope)
+        if func_dict.get("generator"):
+            # 生成器函数: 调用时不执行函数体，返回惰性序列(见 start_generator)
+            return self.start_generator(body_statements, function_scope)
         # 保存当前的环境，以便函数执行完后恢复
-        previous_environment = self.environment.copy()
-        # 更新环境为局部作用域, 并执行函数体, 这样做，内部函数可以访问外界的变量
-        self.environment.update(local_scope)
-
-        # ==================执行方法体=============================
-        return_value = None  # 默认的返回值
-        for statement in body_statements:
-            return_value = self.evaluate(statement)
-            if isinstance(return_value, ReturnNode):
-                return return_value.value  # 直接返回返回值
-        # ========================恢复环境===================
-        # 恢复之前的环境
-        self.environment = previous_environment
+        previous_environment = self.environment
+        self.environment = function_scope
 
-        return return_value  # 确保返回函数的返回值
+        try:
+            # ==================执行方法体=============================
+            return self.execute_function_body(body_statements)
+        finally:
+            # ========================恢复环境===================
+            # 恢复之前的环境
+            self.environment = previous_environment
 
     def eval_by_func_dict(self, func_dictx, args):
         """
@@ -2193,63 +2281,57 @@ class Evaluator:
         #       args=[NumberNode(value=111111), StringNode(value=empty str)])
         # node.args:  是实际传入的参数  func_args：是形参,函数参数名称(list类型)
         local_scope = {}
-        print("args: ", args)
+        tracer.trace("args: ", args)
         # node.args是实参，func_args是形参
         for arg_name, arg_value in zip(func_args, args):
             local_scope[arg_name] = self.evaluate(arg_value)
 
         # =======================环境================================
+        # 创建函数的局部作用域, 并执行函数体, 这样做，内部函数可以访问外界的变量
+        function_scope = self.new_function_scope(func_dict, local_scope)
+        if func_dict.get("generator"):
+            # 生成器函数: 调用时不执行函数体，返回惰性序列(见 start_generator)
+            return self.start_generator(body_statements, function_scope)
         # 保存当前的环境，以便函数执行完后恢复
-        previous_environment = self.environment.copy()
-        # 更新环境为局部作用域, 并执行函数体, 这样做，内部函数可以访问外界的变量
-        self.environment.update(local_scope)
-
-        # ==================执行方法体=============================
-        return_value = None  # 默认的返回值
-        for statement in body_statements:
-            return_value = self.evaluate(statement)
-            if isinstance(return_value, ReturnNode):
-                return return_value.value  # 直接返回返回值
-
-        # ========================恢复环境===================
-        # 恢复之前的环境
-        self.environment = previous_environment
+        previous_environment = self.environment
+        self.environment = function_scope
 
-        # =======================返回值=========================
-        # 上面的for in 循环,如果for in 遇到return,会直接返回,这里就不会执行
-        return return_value  # 确保返回函数的返回值
+        try:
+            # ==================执行方法体=============================
+            return self.execute_function_body(body_statements)
+        finally:
+            # ========================恢复环境===================
+            # 恢复之前的环境
+            self.environment = previous_environment
 
     def evaluate_for_in(self, node: ForInNode):
         # print("node: ",node)
         # print("variable:", node.variable)
 
         # 保存之前的环境变量
-        previous_environment = self.environment.copy()
+        previous_environment = self.environment
 
-        # 设置初始变量
-        self.environment[node.variable] = "xxxx"
         # print("environment:", self.environment)
         iter_obj = self.evaluate(node.iteration_obj)
-        # print("iter_obj:", iter_obj)
-
-        """
-                        try:
-                            self.evaluate(statement)
-                        except BreakException:
-                            break
-        """
 
-        # 遍历每个元素
-        for item in iter_obj:
-            self.environment[node.variable] = item
-            try:
-                for statement in node.body:
-                    self.evaluate(statement)
-            except BreakException:
-                break
+        # 循环变量放在循环自己的块作用域中，循环体对外层变量的赋值会保留下来
+        loop_scope = Scope(parent=previous_environment)
+        self.environment = loop_scope
+        loop_vars = loop_scope.vars
+        # print("iter_obj:", iter_obj)
 
-        # 还原环境变量
-        self.environment = previous_environment.copy()
+        try:
+            # 遍历每个元素
+            for item in iter_obj:
+                loop_vars[node.variable] = item
+                signal = self.execute_block(node.body)
+                if signal is not None and signal is not CONTINUE_SIGNAL:
+                    if signal is BREAK_SIGNAL:
+                        break
+                    return signal  # return
+        finally:
+            # 还原环境变量
+            self.environment = previous_environment
 
     def evaluate_object_index(self, node: ObjectIndexNode):
         # ===============版本2============================================
@@ -2339,7 +2421,8 @@ class Evaluator:
         # 先看看是不是在环境中已经存在了
 
         # name = map
-        print("node.name: ", node.name)
+        if tracer.level >= TRACE:
+            tracer.trace("node.name: ", node.name)
 
         if node.name in self.environment:
             # raise NameError(f"Function '{node.name}' already defined")
@@ -2351,6 +2434,9 @@ class Evaluator:
                     "args": node.args,
                     "body": node.body,
                     "defaults": node.default_values,  # 假设在 AST 中传递默认值
+                    "closure": self.environment,  # 定义函数时的作用域
+                    "layout": node.layout,  # 局部变量的槽位布局
+                    "generator": self.is_generator_function(node),  # 函数体中有 yield
                 }
             raise NameError(f"Function '{node.name}' already defined")
 
@@ -2380,6 +2466,9 @@ class Evaluator:
             "body": node.body,
             #
             "defaults": node.default_values,  # 假设在 AST 中传递默认值
+            "closure": self.environment,  # 定义函数时的作用域, 调用时作为函数作用域的父作用域
+            "layout": node.layout,  # 局部变量的槽位布局, 由 Resolver 设置
+            "generator": self.is_generator_function(node),  # 函数体中有 yield, 调用时返回惰性序列
         }
         self.environment[node.name] = result
 
@@ -2389,77 +2478,45 @@ class Evaluator:
     def evaluate_if_statement(self, node):
         # 评估条件表达式
         condition_value: bool = self.evaluate(node.condition)
-        print("condition_value: ", condition_value)
+        if tracer.level >= TRACE:
+            tracer.trace("condition_value: ", condition_value)
 
-        # 根据条件的结果执行相应的代码块
+        # 根据条件的结果执行相应的代码块, if / elif / else 只会执行其中一个
+        # 代码块中的 return/break/continue(任意深度) 以信号的形式返回给外层
         if condition_value:  # 如果条件为真，执行 if 代码块
             # if_body是一个列表，可能有多个语句
-            for statement in node.if_body:
-                # ============新增： 如果在if语句中遇到return,可以返回值到外界==========
-                if isinstance(statement, ReturnNode):
-                    # print("遇到return node", statement)
-                    # print("self.evaluate(statement.value): ", self.evaluate(statement.value))
-                    # return self.evaluate(statement.value)  # 直接返回返回值 ======> 原来的代码
-                    return {"fight_tag": True, "value": self.evaluate(statement.value)}  # 直接返回返回值
-
-                # ============测试==========
-                else:
-                    self.evaluate(statement)
-            # return
-        # print("还继续执行?")
+            return self.execute_block(node.if_body)
         # elif_: [{"condition": condition, "elif_statements": [statement1, statement2, statement3]}]
         for elseif_dict in node.elif_:
             condition_value: bool = self.evaluate(elseif_dict['condition'])
             if condition_value:
-                # return self.evaluate(elseif.body)
-                elif_statements = elseif_dict['elif_statements']
-                for statement in elif_statements:
-                    # ============新增： 如果在if语句中遇到return,可以返回值到外界==========
-                    if isinstance(statement, ReturnNode):
-                        # return self.evaluate(statement.value)  # 直接返回返回值
-                        return {"fight_tag": True, "value": self.evaluate(statement.value)}  # 直接返回返回值
-                    # ============测试==========
-                    self.evaluate(statement)
-                return
-        else:
-            # 如果有 else 部分，执行 else 代码块
-            else_statements = node.else_
-
-            # 一个问题？ for in 遇到return , 会直接返回，还是接着处理所有的语句? 是直接返回！！！
-            for statement in else_statements:
-                # ============新增： 如果在if语句中遇到return,可以返回值到外界==========
-                if isinstance(statement, ReturnNode):
-                    # return self.evaluate(statement.value)  # 直接返回返回值
-                    return {"fight_tag": True, "value": self.evaluate(statement.value)}  # 直接返回返回值
-                # ============测试==========
-                else:
-                    # print("else处的statement: ", statement)
-                    self.evaluate(statement)
+                return self.execute_block(elseif_dict['elif_statements'])
+        # 如果有 else 部分，执行 else 代码块
+        return self.execute_block(node.else_)
 
     def evaluate_object(self, node):
         return {k: self.evaluate(v) for k, v in node.k_v.items()}
 
-    def evaluate_string(self, node):
-
-        # ================old version=====================
-        # return node.value
-        # ==============old version=====================
-
-        # ===============同时考虑包含模板字符串和不包含模板字符串=================================
-        # 解析里面的模板字符串，替换变量值
-        template_str = node.value
-
-        # 使用正则表达式查找 ${} 中的变量
-        def replace_variable(match):
-            var_name = match.group(1)  # 提取变量名
-            # 返回变量的值，如果未定义则返回原变量名
-            return str(self.environment.get(var_name, var_name))
+    def evaluate_string(self, node: StringNode):
+        """
+            普通字符串直接返回; 模板字符串把 ${变量名} 替换成变量的值，未定义的变量替换成变量名本身
+            模板在创建节点时已经拆分好(StringNode.parts)，这里只查找变量并拼接一次
+        """
+        if node.parts is None:
+            return node.value
+        return self.render_template(node.parts)
 
-        # 使用正则表达式进行替换
-        result = re.sub(r'\${(.*?)}', replace_variable, template_str)
+    def render_template(self, parts):
+        pieces = list(parts)
+        get = self.environment.get
+        for index in range(1, len(pieces), 2):
+            name = pieces[index]
+            value = get(name, name)
+            pieces[index] = value if value.__class__ is str else str(value)
+        return ''.join(pieces)
 
-        return result
-        # ===============同时考虑包含模板字符串和不包含模板字符串=================================
+    def evaluate_constant(self, node: ConstantNode):
+        return node.value
 
     def evaluate_number(self, node):
         # node是字符串类型,需要转换为数字类型
@@ -2475,69 +2532,40 @@ class Evaluator:
         """
             变量存放在list里面
         """
-        if node.value in self.environment:
+        # Resolver 解析过的局部变量直接按槽位读取
+        if node.resolved is not None:
+            value = self.environment.load(*node.resolved)
+            if value is not UNSET:
+                return value
+        try:
             return self.environment[node.value]
-        else:
-            raise NameError(f"Variable '{node.value}' not defined")
+        except KeyError:
+            raise NameError(f"Variable '{node.value}' not defined{sources.where(node.position)}") from None
 
     def evaluate_binary_op(self, node):
-        left_val = self.evaluate(node.left)
-        right_val = self.evaluate(node.right)
-
-        if node.op == 'PLUS':
-            return left_val + right_val
-        elif node.op == 'MINUS':
-            return left_val - right_val
-        elif node.op == 'MUL':
-            return left_val * right_val
-        elif node.op == 'DIV':
-            return left_val / right_val
-        elif node.op == 'POW':
-            return left_val ** right_val
-        elif node.op == "MOD":
-            return left_val % right_val
-        elif node.op == 'FLOOR_DIV':
-            return left_val // right_val
-        # 逻辑比较
-        elif node.op == 'GT':  # 大于
-            return left_val > right_val
-
-        elif node.op == 'LT':  # 小于
-            return left_val < right_val
-
-        elif node.op == 'LE':  # 小于等于
-            return left_val <= right_val
-
-        elif node.op == 'GE':  # 大于等于
-            return left_val >= right_val
-
-        elif node.op == 'EQ':  # 等于
-            return left_val == right_val
-
-        elif node.op == 'NEQ':  # 不等于
-            return left_val != right_val
-
-        # 逻辑运算
-        elif node.op == 'AND':
-            # 对于算术比较，直接得到bool类型的值了
-            # 字符串转bool
-            if left_val == "True":
-                left_val = True
-            if left_val == "False":
-                left_val = False
-            if right_val == "True":
-                right_val = True
-            if right_val == "False":
-                right_val = False
-            # ================ 对逻辑运算的类型进行检查======================
-            if not isinstance(left_val, bool) or not isinstance(right_val, bool):
-                raise TypeError("逻辑运算只适合布尔类型!")
-            return left_val and right_val
-
-        elif node.op == 'OR':
-            return left_val or right_val
-        else:
-            raise ValueError(f"Unknown operator: {node.op}")
+        """
+            二元运算，运算符的语义见 BINARY_OPERATORS
+            a + b + c + ... 解析成向左展开的 BinaryOpNode 链(left 是下一个 BinaryOpNode)，
+            沿 left 向下找到最左边的操作数，再从下往上依次计算，几万项的链也不会递归太深
+        """
+        left = node.left
+        if left.__class__ is not BinaryOpNode:
+            operation = BINARY_OPERATORS.get(node.op)
+            if operation is None:
+                raise ValueError(f"Unknown operator: {node.op}")
+            return operation(self.evaluate(left), self.evaluate(node.right))
+
+        chain = [node]
+        while left.__class__ is BinaryOpNode:
+            chain.append(left)
+            left = left.left
+        value = self.evaluate(left)
+        for link in reversed(chain):
+            operation = BINARY_OPERATORS.get(link.op)
+            if operation is None:
+                raise ValueError(f"Unknown operator: {link.op}")
+            value = operation(value, self.evaluate(link.right))
+        return value
 
     def evaluate_assignment(self, node):
         """
@@ -2568,6 +2596,9 @@ class Evaluator:
                 # evaluate_assignment中进行处理，对于 def main(){}这类函数，参数需要在
                 # evaluate_function_declaration中处理,这就是差异！！！
                 "defaults": node.value.default_values,  # 假设在 AST 中传递默认值
+                "closure": self.environment,  # 定义函数时的作用域
+                "layout": node.value.layout,  # 局部变量的槽位布局
+                "generator": self.is_generator_function(node.value),  # 函数体中有 yield
             }
         else:
             # =======================常量检查===============================
@@ -2579,35 +2610,200 @@ class Evaluator:
             # 否则，直接求值
             value = self.evaluate(node.value)
 
-            # 赋值
+            # 赋值: Resolver 解析过的局部变量直接写槽位;
+            # 在 for 循环的块作用域中给还没有赋值的局部变量赋值时，和没有解析时一样定义在块作用域中
+            if node.resolved is not None:
+                frame = self.environment.function_frame()
+                if frame is self.environment or frame.slots[node.resolved] is not UNSET:
+                    frame.slots[node.resolved] = value
+                    return value
             self.environment[node.name] = value
             return value
 
-    def evaluate_loop(self, node):
+    def evaluate_loop(self, node: LoopNode):
+        """
+            loop(condition){body}
+            每次迭代开始之前判断一次条件，循环体总是完整执行(除非遇到 break/continue/return):
+                break 结束循环，continue 进入下一次迭代(重新判断条件)，return 信号交给外层
+            和数字 for 循环一样，循环体每条语句的求值方法在循环开始前查好
+        """
+        if self.legacy_loop_exit:
+            return self.evaluate_legacy_loop(node)
+        condition = node.condition
+        evaluate = self.evaluate
+        body = [(self.handler_for(statement), statement) for statement in node.body]
+        while evaluate(condition):
+            for handler, statement in body:
+                result = handler(statement)
+                if result.__class__ is ControlSignal:
+                    if result is CONTINUE_SIGNAL:
+                        break
+                    if result is BREAK_SIGNAL:
+                        return None
+                    return result  # return
+        return None
+
+    def evaluate_legacy_loop(self, node: LoopNode):
         """
-            self.condition = condition
-            self.body = body
+            旧版本的 loop: 循环体的每条语句执行之后都重新计算一次条件，用最后一次的结果决定是否继续，
+            条件有副作用(函数调用、id++ 等)时会执行很多次。
+            只在 legacy_loop_exit 时使用(python -m interpreter.main x.fight --legacy-loop-exit)
         """
-        # 用于跳出while循环
-        break_flag = False
         condition_value: bool = self.evaluate(node.condition)
         # 不断判断条件
         while condition_value:
             for statement in node.body:
                 # print("statement: ",statement)
-                # 1，可能遇到跳出循环的情况
-                if isinstance(statement, BreakNode):
-                    break_flag = True
-                # if break_flag == False:
-                try:
-                    self.evaluate(statement)
-                    # 2，重新计算条件表达式
-                    condition_value = self.evaluate(node.condition)
-                except BreakException:
-                    break_flag = True
-                    break
-            if break_flag:
+                result = self.evaluate(statement)
+                # 1，可能遇到跳出循环、continue、return的情况
+                if result.__class__ is ControlSignal:
+                    if result is BREAK_SIGNAL:
+                        return None
+                    if result is RETURN_SIGNAL:
+                        return result
+                    break  # continue: 直接进入下一次循环
+                # 2，重新计算条件表达式
+                condition_value = self.evaluate(node.condition)
+            else:
+                continue
+            condition_value = self.evaluate(node.condition)
+
+    # ===========================生成器===========================
+
+    def is_generator_function(self, node: FunctionDeclarationNode):
+        """
+            函数体中(不包括内部函数)有没有 yield
+            Resolver 已经标记了 node.generator; 没有经过 Resolver 的 AST(Parser 之后直接交给 Evaluator)在定义函数时检查一次，
+            同时和 Resolver 一样检查 yield 的位置
+        """
+        if not node.generator and self.contains_yield(node):
+            check_yield_positions(node.body)
+            node.generator = True
+        return node.generator
+
+    def start_generator(self, body, frame):
+        """
+            函数体中有 yield 的函数是生成器函数(见 is_generator_function)，
+            调用时只创建函数帧(绑定参数)，不执行函数体，返回 LazySequence; 遍历序列时才执行函数体，每遇到一个 yield 产生一个元素。
+            和其他惰性序列一样可以重复遍历: 每次遍历都用参数帧的副本从头执行函数体。
+
+            求值器是递归执行的，不能在任意深度暂停，所以生成器函数的函数体由 generate_xxx 执行:
+            它们是 Python 的生成器，执行到 yield 时把值交出去、暂停在那里，下一次取值时从那里继续。
+            只有含有 yield 的语句(if/loop/for/do-while)需要这样执行，其他语句仍然用 evaluate 执行;
+            try/switch 等语句中的 yield 会报错(见 evaluate_yield)。
+            return 结束生成器(返回值忽略)，break/continue 和普通循环一样。
+        """
+        def make_iterator():
+            slots = None if frame.slots is None else list(frame.slots)
+            return self.run_generator(body, Scope(dict(frame.vars), frame.parent, True, frame.layout, slots))
+
+        return LazySequence(make_iterator, "generator")
+
+    def run_generator(self, body, frame):
+        """
+            每取一个元素: 切换到生成器自己的环境，执行到下一个 yield，记下生成器当时的环境(可能在循环的块作用域中)，
+            再切换回取值处的环境
+            生成器中的语句不用 try/finally 恢复环境: 没有遍历完就被丢弃的生成器，Python 会在任意时刻关闭它
+        """
+        steps = self.generate_block(body)
+        environment = frame
+        while True:
+            caller_environment = self.environment
+            self.environment = environment
+            try:
+                value = next(steps)
+            except StopIteration as stop:
+                # 清除 return 保存的返回值
+                self.completion_value(stop.value)
+                return
+            finally:
+                environment = self.environment
+                self.environment = caller_environment
+            yield value
+
+    def generate_block(self, statements):
+        # execute_block 的生成器版本: yield 语句产生一个值，含有 yield 的语句交给 generator_table 中的方法
+        for statement in statements:
+            if statement.__class__ is YieldNode:
+                yield self.evaluate(statement.value)
+                continue
+            generate = self.generator_table.get(statement.__class__)
+            if generate is not None and self.contains_yield(statement):
+                result = yield from generate(statement)
+            else:
+                result = self.evaluate(statement)
+            if result.__class__ is ControlSignal:
+                return result
+        return None
+
+    def contains_yield(self, node):
+        # 语句中(不包括内部函数)有没有 yield，每个语句只检查一次
+        found = self.yield_statements.get(node)
+        if found is None:
+            found = False
+            stack = [node]
+            while stack and not found:
+                current = stack.pop()
+                if current.__class__ is YieldNode:
+                    found = True
+                elif current.__class__ is not FunctionDeclarationNode or current is node:
+                    stack.extend(current.iter_children())
+            self.yield_statements[node] = found
+        return found
+
+    def generate_if(self, node: IfStatementNode):
+        if self.evaluate(node.condition):
+            return (yield from self.generate_block(node.if_body))
+        for elseif_dict in node.elif_:
+            if self.evaluate(elseif_dict['condition']):
+                return (yield from self.generate_block(elseif_dict['elif_statements']))
+        return (yield from self.generate_block(node.else_))
+
+    def generate_loop(self, node: LoopNode):
+        # 和 evaluate_loop 一样每次迭代开始前判断一次条件(不支持 legacy_loop_exit)
+        while self.evaluate(node.condition):
+            signal = yield from self.generate_block(node.body)
+            if signal is not None and signal is not CONTINUE_SIGNAL:
+                if signal is BREAK_SIGNAL:
+                    return None
+                return signal  # return
+        return None
+
+    def generate_do_while(self, node: DoWhileNode):
+        while True:
+            signal = yield from self.generate_block(node.body)
+            if signal is not None and signal is not CONTINUE_SIGNAL:
+                if signal is BREAK_SIGNAL:
+                    return None
+                return signal  # return
+            if not self.evaluate(node.condition):
+                return None
+
+    def generate_for_in(self, node: ForInNode):
+        iter_obj = self.evaluate(node.iteration_obj)
+        return (yield from self.generate_iteration(node, node.variable, iter_obj))
+
+    def generate_for_range_number(self, node: ForRangeNumberNode):
+        start_value = self.evaluate(node.start_num)
+        end_value = self.evaluate(node.end_num)
+        step_value = 1 if node.step is None else self.evaluate(node.step)
+        return (yield from self.generate_iteration(node, node.var_name, number_range(start_value, end_value, step_value)))
+
+    def generate_iteration(self, node, var_name, items):
+        # for in 和数字 for 循环共用: 循环变量的位置和 evaluate_for_in 相同，离开循环时恢复环境
+        previous_environment = self.environment
+        loop_scope = Scope(parent=previous_environment)
+        self.environment = loop_scope
+        loop_vars = loop_scope.vars
+        signal = None
+        for item in items:
+            loop_vars[var_name] = item
+            signal = yield from self.generate_block(node.body)
+            if signal is not None and signal is not CONTINUE_SIGNAL:
                 break
+            signal = None
+        self.environment = previous_environment
+        return None if signal is BREAK_SIGNAL else signal
 
 
 # 测试Evaluator
@@ -2643,6 +2839,9 @@ if __name__ == '__main__':
     for node in ast:
         print(node)
 
+    # 变量解析: 给函数的局部变量分配槽位
+    Resolver().resolve(ast)
+
     # 求值器
     evaluator = Evaluator()
     print("=================evaluator=====================\n")
@@ -0,0 +1,172 @@
+import functools
+import itertools
+
+"""
+goal:
+    惰性序列(lazy sequence)
+
+    列表的 map/filter/take 等方法(ListMethods.py)每一步都生成一个完整的新列表，
+    数据很大(比如读不进内存的日志文件)时，连续几步操作会同时存在好几个大列表。
+    LazySequence 只保存 "怎样得到迭代器" 的函数，map/filter/take 等操作只是把函数包一层，
+    直到遍历(for in、toList、reduce...)时才一个一个地计算元素，中间不生成任何列表。
+
+    序列的来源:
+        xs->lazy()            列表(也可以是字符串、集合、字典的 key)，可以重复遍历
+        Lazy(xs)              同上
+        ReadLines(path)       文件的每一行(去掉换行符)，每次遍历重新打开文件，内存中只有当前行
+        生成器函数的调用结果   函数体中有 yield 的函数，调用时不执行函数体，遍历时才执行(见 Evaluator.start_generator)，
+                              每次遍历都从头执行
+    每次遍历都重新计算(不缓存元素)，所以序列可以重复遍历，代价是每次遍历都会重新执行回调函数。
+    惰性的方法返回新的序列: map filter flatMap take drop takeWhile dropWhile zip
+    立即求值的方法遍历序列: toList reduce any all first count
+
+use:
+    SEQUENCE_METHODS: 方法名 -> (Python 函数, 第一个参数是不是函数)，和 ListMethods.LIST_METHODS 一样由 Evaluator 调用
+        let lines = ReadLines("app.log");
+        let errors = lines->filter(lambda line: line->contains("ERROR"));
+        let firstTen = errors->take(10);
+        for(line in firstTen){ @println(line); }
+"""
+
+
+class LazySequence:
+    __slots__ = ("make_iterator", "description")
+
+    def __init__(self, make_iterator, description="sequence"):
+        # make_iterator(): 每次遍历时调用，返回新的迭代器
+        self.make_iterator = make_iterator
+        self.description = description
+
+    @classmethod
+    def of(cls, iterable):
+        # 可以重复遍历的数据(列表、字符串、集合、字典、range)
+        if isinstance(iterable, LazySequence):
+            return iterable
+        return cls(lambda: iter(iterable), type(iterable).__name__)
+
+    def __iter__(self):
+        return self.make_iterator()
+
+    def derive(self, make_iterator, operation):
+        return LazySequence(make_iterator, f"{self.description}->{operation}")
+
+    def __repr__(self):
+        return f"<lazy {self.description}>"
+
+
+# ===========================惰性的方法===========================
+
+def sequence_map(seq, func):
+    return seq.derive(lambda: map(func, seq), "map")
+
+
+def sequence_filter(seq, predicate):
+    return seq.derive(lambda: filter(predicate, seq), "filter")
+
+
+def sequence_flat_map(seq, func):
+    # 和 list_flat_map 一样: f 返回列表或序列时展开一层，返回其他值时直接作为元素
+    def flat_map():
+        for x in seq:
+            value = func(x)
+            if isinstance(value, (list, LazySequence)):
+                yield from value
+            else:
+                yield value
+
+    return seq.derive(flat_map, "flatMap")
+
+
+def sequence_take(seq, count):
+    count = check_count("take", count)
+    return seq.derive(lambda: itertools.islice(seq, count), "take")
+
+
+def sequence_drop(seq, count):
+    count = check_count("drop", count)
+    return seq.derive(lambda: itertools.islice(seq, count, None), "drop")
+
+
+def sequence_take_while(seq, predicate):
+    return seq.derive(lambda: itertools.takewhile(predicate, seq), "takeWhile")
+
+
+def sequence_drop_while(seq, predicate):
+    return seq.derive(lambda: itertools.dropwhile(predicate, seq), "dropWhile")
+
+
+def sequence_zip(seq, *others):
+    # [x1, y1], [x2, y2], ...  长度和最短的一个相同，others 可以是列表或者序列
+    return seq.derive(lambda: map(list, zip(seq, *others)), "zip")
+
+
+# ===========================立即求值的方法===========================
+
+def sequence_to_list(seq):
+    return list(seq)
+
+
+def sequence_reduce(seq, func, *initial):
+    if len(initial) > 1:
+        raise TypeError(f"reduce expects at most 2 arguments, but got {1 + len(initial)}")
+    return functools.reduce(func, seq, *initial)
+
+
+def sequence_any(seq, predicate=bool):
+    return any(predicate(x) for x in seq)
+
+
+def sequence_all(seq, predicate=bool):
+    return all(predicate(x) for x in seq)
+
+
+def sequence_first(seq, default=None):
+    # 只计算第一个元素，序列是空的时候返回 default
+    return next(iter(seq), default)
+
+
+def sequence_count(seq):
+    count = 0
+    for _ in seq:
+        count += 1
+    return count
+
+
+def check_count(method_name, count):
+    # take/drop 的个数必须是非负整数，列表的 take/drop(ListMethods.py) 也用它检查
+    if type(count) is not int or count < 0:
+        raise ValueError(f"{method_name} expects a non-negative integer, but got {count!r}")
+    return count
+
+
+# ===========================序列的来源(内置函数)===========================
+
+def lazy(iterable):
+    return LazySequence.of(iterable)
+
+
+def read_lines(path):
+    def lines():
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                yield line.rstrip("\n")
+
+    return LazySequence(lines, f"lines of {path}")
+
+
+SEQUENCE_METHODS = {
+    "map": (sequence_map, True),
+    "filter": (sequence_filter, True),
+    "flatMap": (sequence_flat_map, True),
+    "take": (sequence_take, False),
+    "drop": (sequence_drop, False),
+    "takeWhile": (sequence_take_while, True),
+    "dropWhile": (sequence_drop_while, True),
+    "zip": (sequence_zip, False),
+    "toList": (sequence_to_list, False),
+    "reduce": (sequence_reduce, True),
+    "any": (sequence_any, True),
+    "all": (sequence_all, True),
+    "first": (sequence_first, False),
+    "count": (sequence_count, False),
+}
@@ -0,0 +1,111 @@
+from interpreter.LazySequence import lazy, check_count
+
+"""
+goal:
+    列表的高阶方法:
+        xs->map(f)  xs->filter(f)  xs->reduce(f, 初始值)  xs->flatMap(f)  xs->sortBy(f)  xs->groupBy(f)
+        xs->any(f)  xs->all(f)  xs->zip(ys)  xs->take(n)  xs->drop(n)
+        xs->lazy()  得到列表的惰性序列，之后的 map/filter/take 不再生成中间列表(见 LazySequence.py)
+
+    这里只处理 Python 的值: 作为参数的 Fight 函数已经由 Evaluator.function_caller 包装成 Python 函数，
+    每次调用都在新的小函数帧中绑定参数，不会修改调用处的环境，也不会把参数留在全局环境中。
+    结果总是新的列表或字典，原来的列表不变。
+
+use:
+    LIST_METHODS: 方法名 -> (Python 函数, 第一个参数是不是函数)
+    Evaluator 调用 func(列表, *参数):
+        let doubled = xs->map(lambda x: x * 2);
+        let total = xs->reduce(def(acc, x){ return acc + x; }, 0);
+        let groups = words->groupBy(def(w){ return StrLength(w); });
+"""
+
+
+def list_map(xs, func):
+    return [func(x) for x in xs]
+
+
+def list_filter(xs, predicate):
+    return [x for x in xs if predicate(x)]
+
+
+def list_reduce(xs, func, *initial):
+    # reduce(f) 从第一个元素开始累积，reduce(f, 初始值) 从初始值开始
+    if len(initial) > 1:
+        raise TypeError(f"reduce expects at most 2 arguments, but got {1 + len(initial)}")
+    iterator = iter(xs)
+    if initial:
+        accumulator = initial[0]
+    else:
+        accumulator = next(iterator, _EMPTY)
+        if accumulator is _EMPTY:
+            raise TypeError("reduce of empty list with no initial value")
+    for x in iterator:
+        accumulator = func(accumulator, x)
+    return accumulator
+
+
+def list_flat_map(xs, func):
+    # f 返回列表时展开一层，返回其他值时直接加入结果
+    result = []
+    for x in xs:
+        value = func(x)
+        if isinstance(value, list):
+            result.extend(value)
+        else:
+            result.append(value)
+    return result
+
+
+def list_sort_by(xs, key):
+    # 稳定排序: key 相同的元素保持原来的顺序
+    return sorted(xs, key=key)
+
+
+def list_group_by(xs, key):
+    # {key: [元素, ...]}，key 按第一次出现的顺序排列
+    groups = {}
+    for x in xs:
+        groups.setdefault(key(x), []).append(x)
+    return groups
+
+
+def list_any(xs, predicate=bool):
+    return any(predicate(x) for x in xs)
+
+
+def list_all(xs, predicate=bool):
+    return all(predicate(x) for x in xs)
+
+
+def list_zip(xs, *others):
+    # [[x1, y1], [x2, y2], ...]，长度和最短的列表相同
+    for other in others:
+        if not isinstance(other, list):
+            raise TypeError(f"can only zip list, but got {type(other)}")
+    return [list(items) for items in zip(xs, *others)]
+
+
+def list_take(xs, count):
+    return xs[:check_count("take", count)]
+
+
+def list_drop(xs, count):
+    return xs[check_count("drop", count):]
+
+
+_EMPTY = object()
+
+LIST_METHODS = {
+    "map": (list_map, True),
+    "filter": (list_filter, True),
+    "reduce": (list_reduce, True),
+    "flatMap": (list_flat_map, True),
+    "sortBy": (list_sort_by, True),
+    "groupBy": (list_group_by, True),
+    "any": (list_any, True),
+    "all": (list_all, True),
+    "zip": (list_zip, False),
+    "take": (list_take, False),
+    "drop": (list_drop, False),
+    "lazy": (lazy, False),
+}
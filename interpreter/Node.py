@@ -1,2 +1,77 @@
+"""
+goal:
+    所有 AST 节点的基类
+
+    节点都使用 __slots__，没有每个实例一个的 __dict__: 生成的大脚本有上百万个节点，__dict__ 占了 AST 的大部分内存。
+    每个节点类型声明两样东西(和 Python 的 ast 模块一样用 _fields 这个名字，因为 fields 本身是结构体、类节点的字段):
+        _fields:   构成语法结构的字段(和构造函数参数的顺序相同)，遍历 AST 只看这些字段
+        __slots__: _fields + 后续阶段写在节点上的附加信息(Resolver 的 resolved/layout 等)
+    position 是所有节点都有的附加信息，由 Parser 设置，没有设置时读取得到 None。
+    pickle 时节点的状态是所有槽位的值组成的元组(见 __getstate__)。
+
+    _fields 中的字段在构造之后不再修改，需要改写 AST 的阶段(比如 Optimizer)用 replace() 生成新的节点;
+    构造函数的默认值不再是共享的 []/{}，每个节点都有自己的列表和字典。
+
+    遍历:
+        node.iter_children()   按 _fields 的顺序产生直接子节点(展开列表、元组、字典的 key 和 value)
+        iter_nodes(value)      value 中的节点(value 可以是节点、列表、元组、字典)
+"""
+
+
 class Node:
-    pass
+    __slots__ = ("position",)
+    _fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # 节点的所有槽位(pickle 按这个顺序保存)，和不属于 _fields 的附加信息(replace() 需要复制)
+        cls._state_names = tuple(cls.__dict__.get("__slots__", ())) + Node.__slots__
+        cls._extra_names = tuple(name for name in cls._state_names if name not in cls._fields)
+
+    def __getattr__(self, name):
+        # 只有没有赋值的槽位才会走到这里: 没有位置信息的节点 position 是 None
+        if name == "position":
+            return None
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def iter_children(self):
+        for name in self._fields:
+            yield from iter_nodes(getattr(self, name))
+
+    def replace(self, **changes):
+        """
+            返回一个替换了部分字段的新节点，其他字段、position 和附加信息和原节点相同
+                node.replace(left=ConstantNode(1))
+        """
+        for name in changes:
+            if name not in self._fields:
+                raise AttributeError(f"'{type(self).__name__}' has no field '{name}'")
+        # 构造函数的参数和 _fields 的顺序相同，通过构造函数新建比逐个复制槽位快得多
+        node = type(self)(*[changes[name] if name in changes else getattr(self, name) for name in self._fields])
+        for name in self._extra_names:
+            try:
+                setattr(node, name, object.__getattribute__(self, name))
+            except AttributeError:
+                pass
+        return node
+
+    # pickle(AST 缓存)只保存槽位的值: 比默认的 {槽位名: 值} 小，加载也更快
+    def __getstate__(self):
+        return tuple([getattr(self, name, None) for name in self._state_names])
+
+    def __setstate__(self, state):
+        for name, value in zip(self._state_names, state):
+            setattr(self, name, value)
+
+
+def iter_nodes(value):
+    if isinstance(value, Node):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from iter_nodes(item)
+    elif isinstance(value, dict):
+        # match/switch 的 key 也是节点
+        for key, item in value.items():
+            yield from iter_nodes(key)
+            yield from iter_nodes(item)
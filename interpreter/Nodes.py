@@ -1,11 +1,17 @@
+import re
 from typing import List, Dict
 
 from interpreter.Node import Node
 
+# 模板字符串中的 ${变量名}
+TEMPLATE_PATTERN = re.compile(r'\${(.*?)}')
+
 
 # 函数组合表达式
 # let z = f & g & inc;
 class CombineNode(Node):
+    __slots__ = _fields = ("combined_name", "funcs")
+
     def __init__(self, combined_name, funcs):
         self.combined_name = combined_name
         self.funcs = funcs
@@ -16,6 +22,8 @@ class CombineNode(Node):
 
 # set<1,2,3>
 class SetNode(Node):
+    __slots__ = _fields = ("set_values",)
+
     def __init__(self, set_values):
         self.set_values = set_values
 
@@ -25,6 +33,8 @@ class SetNode(Node):
 
 # id--;
 class DecrementNode(Node):
+    __slots__ = _fields = ("var_name",)
+
     def __init__(self, var_name):
         self.var_name = var_name
 
@@ -34,6 +44,8 @@ class DecrementNode(Node):
 
 # id++;
 class IncrementNode(Node):
+    __slots__ = _fields = ("var_name",)
+
     def __init__(self, var_name):
         self.var_name = var_name
 
@@ -43,6 +55,8 @@ class IncrementNode(Node):
 
 # try 代码块
 class TryCatchFinallyNode(Node):
+    __slots__ = _fields = ("try_block", "catch_block", "finally_block")
+
     def __init__(self, try_block, catch_block, finally_block):
         self.try_block = try_block
         # [{ ERR_TYPE: [代码列表]  }, {}, {}]
@@ -55,21 +69,26 @@ class TryCatchFinallyNode(Node):
 
 # for(idx: 1..10){}
 class ForRangeNumberNode(Node):
-    def __init__(self, var_name, start_num, end_num, body):
+    __slots__ = _fields = ("var_name", "start_num", "end_num", "body", "step")
+
+    def __init__(self, var_name, start_num, end_num, body, step=None):
         self.var_name = var_name  # 变量名
         self.start_num = start_num  # 开始数字
         self.end_num = end_num  # 结束数字
         self.body = body  # 循环体
+        self.step = step  # 步长表达式，没有写 step 时是 None(步长为 1)
 
     def __repr__(self):
-        return f"ForRangeNumberNode(var_name={self.var_name}, start_num={self.start_num}, end_num={self.end_num}, body={self.body})"
+        return f"ForRangeNumberNode(var_name={self.var_name}, start_num={self.start_num}, end_num={self.end_num}, step={self.step}, body={self.body})"
 
 
 # switch语句
 class SwitchNode(Node):
-    def __init__(self, expr, cases: dict = {}):
+    __slots__ = _fields = ("expr", "cases")
+
+    def __init__(self, expr, cases: dict = None):
         self.expr = expr  # 表达式
-        self.cases = cases  # 字典，key是case的表达式，value是case对应的语句
+        self.cases = {} if cases is None else cases  # 字典，key是case的表达式，value是case对应的语句
 
     def __repr__(self):
         return f"SwitchNode(expr={self.expr}, cases={self.cases})"
@@ -77,11 +96,13 @@ class SwitchNode(Node):
 
 # match表达式
 class MatchExprNode(Node):
-    def __init__(self, expr, case_value_dict: dict = {}):
+    __slots__ = _fields = ("expr", "case_value_dict")
+
+    def __init__(self, expr, case_value_dict: dict = None):
         # match(x) {1 => "value"}
         self.expr = expr  # 比如x
         #  1 => "value",  这样的表达式
-        self.case_value_dict = case_value_dict
+        self.case_value_dict = {} if case_value_dict is None else case_value_dict
 
     def __repr__(self):
         return f"MatchExprNode(expr={self.expr}, cases={self.case_value_dict})"
@@ -89,6 +110,8 @@ class MatchExprNode(Node):
 
 # 处理 if(true) 10: 200 这样的表达式
 class IfExprNode(Node):
+    __slots__ = _fields = ("condition", "expr_if_true", "expr_if_false")
+
     def __init__(self, condition, expr_if_true, expr_if_false):
         self.condition = condition
         self.expr_if_true = expr_if_true
@@ -100,6 +123,8 @@ class IfExprNode(Node):
 
 # 引入模块  import Math
 class CommentNode(Node):
+    __slots__ = _fields = ("comments",)
+
     def __init__(self, comments):
         self.comments = comments
 
@@ -109,11 +134,13 @@ class CommentNode(Node):
 
 # 支持导入真个模块或者模块里面的单个元素
 class ImportModuleNode(Node):
-    def __init__(self, module_name, import_elements: list = [], import_whole_module=True, alias=None):
+    __slots__ = _fields = ("module_name", "import_elements", "import_whole_module", "alias")
+
+    def __init__(self, module_name, import_elements: list = None, import_whole_module=True, alias=None):
         self.module_name = module_name
         self.alias = alias
         # 引入的元素，比如 import {a,b} from "module"  这里的a,b就是import_elements
-        self.import_elements = import_elements
+        self.import_elements = [] if import_elements is None else import_elements
         # 是否引入整个模块，比如 import "module"  这里的module就是import_whole_module
         self.import_whole_module = import_whole_module
 
@@ -123,6 +150,8 @@ class ImportModuleNode(Node):
 
 # 声明模块  比如 package module{ let x = 10;  }
 class PackageDeclarationNode(Node):
+    __slots__ = _fields = ("package_name", "package_body")
+
     def __init__(self, package_name, package_body):
         self.package_name = package_name
         self.package_body = package_body
@@ -133,6 +162,8 @@ class PackageDeclarationNode(Node):
 
 # for in语法节点
 class ForInNode(Node):
+    __slots__ = _fields = ("variable", "iteration_obj", "body")
+
     def __init__(self, variable, iteration_obj, body):
         self.variable = variable
         self.iteration_obj = iteration_obj
@@ -143,6 +174,8 @@ class ForInNode(Node):
 
 
 class UnaryOpNode(Node):
+    __slots__ = _fields = ("operator", "operand")
+
     def __init__(self, operator, operand):
         self.operator = operator  # 操作符，例如 'not'
         self.operand = operand  # 操作数，通常是一个节点（如逻辑表达式）
@@ -152,6 +185,8 @@ class UnaryOpNode(Node):
 
 
 class NumberNode(Node):
+    __slots__ = _fields = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -159,7 +194,20 @@ class NumberNode(Node):
         return f"NumberNode(value={self.value})"
 
 
+# 常量: 字面量和常量表达式在执行前就算好的值(由 Optimizer 生成)，value 是 Python 的 int/float/bool/str
+class ConstantNode(Node):
+    __slots__ = _fields = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f"ConstantNode(value={self.value!r})"
+
+
 class ListNode(Node):
+    __slots__ = _fields = ("elements",)
+
     def __init__(self, elements):
         self.elements = elements
 
@@ -169,6 +217,8 @@ class ListNode(Node):
 
 # 列表索引节点, 如 a[1]
 class ListIndexNode(Node):
+    __slots__ = _fields = ("list_name", "start_index", "end_index")
+
     def __init__(self, name, start_index, end_index=None):
         self.list_name = name
         self.start_index = start_index
@@ -181,6 +231,8 @@ class ListIndexNode(Node):
 # dual list index  双列表索引，如 a[1][2]
 # 多维列表索引，如 a[1][2][3]
 class MultiListIndexNode(Node):
+    __slots__ = _fields = ("list_name", "index_list")
+
     def __init__(self, name, index_list):
         self.list_name = name
         self.index_list = index_list
@@ -190,15 +242,21 @@ class MultiListIndexNode(Node):
 
 
 class VariableNode(Node):
+    _fields = ("value",)
+    __slots__ = _fields + ("resolved",)
+
     def __init__(self, value):
         # self.name = name
         self.value = value
+        self.resolved = None  # (depth, slot)，由 Resolver 设置
 
     def __repr__(self):
         return f"VariableNode(value={self.value})"
 
 
 class BinaryOpNode(Node):
+    __slots__ = _fields = ("left", "op", "right")
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
@@ -209,6 +267,8 @@ class BinaryOpNode(Node):
 
 
 class LoopNode(Node):
+    __slots__ = _fields = ("condition", "body")
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
@@ -218,6 +278,8 @@ class LoopNode(Node):
 
 
 class ReturnNode(Node):
+    __slots__ = _fields = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -225,8 +287,21 @@ class ReturnNode(Node):
         return f"ReturnNode(value={self.value})"
 
 
+# yield expr; 生成器函数产生一个值，取下一个值时从这里继续执行
+class YieldNode(Node):
+    __slots__ = _fields = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f"YieldNode(value={self.value})"
+
+
 # 列表解构赋值
 class ListDeconstructAssignNode(Node):
+    __slots__ = _fields = ("vars_list", "list_obj")
+
     def __init__(self, vars_list, list_obj):
         # 使用列表存放变量名  【"a","b"】
         self.vars_list = vars_list
@@ -238,6 +313,8 @@ class ListDeconstructAssignNode(Node):
 
 # 解构赋值 let {a,b} = {a:1,b:2}
 class DecontructAssignNode(Node):
+    __slots__ = _fields = ("vars_list", "dict_obj")
+
     def __init__(self, vars_list, dict_obj):
         # 使用列表存放变量名  【"a","b"】
         self.vars_list = vars_list
@@ -248,17 +325,23 @@ class DecontructAssignNode(Node):
 
 
 class AssignmentNode(Node):
+    _fields = ("name", "value", "is_constant")
+    __slots__ = _fields + ("resolved",)
+
     # name = value
     def __init__(self, name, value, is_constant=False):
         self.name = name
         self.value = value
         self.is_constant = is_constant
+        self.resolved = None  # 当前函数中的槽位，由 Resolver 设置
 
     def __repr__(self):
         return f"AssignmentNode(name={self.name}, value={self.value}, is_constant={self.is_constant})"
 
 
 class ArrayNode(Node):
+    __slots__ = _fields = ("elements",)
+
     def __init__(self, elements):
         self.elements: List[any] = elements
 
@@ -267,6 +350,8 @@ class ArrayNode(Node):
 
 
 class ObjectNode(Node):
+    __slots__ = _fields = ("k_v",)
+
     def __init__(self, properties):
         self.k_v: Dict[any, any] = properties
 
@@ -276,6 +361,8 @@ class ObjectNode(Node):
 
 # 对象属性索引
 class ObjectIndexNode(Node):
+    __slots__ = _fields = ("object_name", "key_expr")
+
     # 比如 name{"id"}
     def __init__(self, object_name, key_expr):
         self.object_name = object_name
@@ -286,6 +373,8 @@ class ObjectIndexNode(Node):
 
 
 class IfStatementNode(Node):
+    __slots__ = _fields = ("condition", "if_body", "elif_", "else_")
+
     def __init__(self, condition, if_body, elif_, else_):
         self.condition = condition
         self.if_body = if_body
@@ -297,12 +386,14 @@ class IfStatementNode(Node):
 
 
 class FunctionCallNode(Node):
-    def __init__(self, name, args, named_arg_values: dict = {}, is_combined=False):
+    __slots__ = _fields = ("name", "args", "named_arg_values", "is_combined")
+
+    def __init__(self, name, args, named_arg_values: dict = None, is_combined=False):
         # 函数名
         self.name = name
         self.args = args
         # 命名参数的值
-        self.named_arg_values = named_arg_values
+        self.named_arg_values = {} if named_arg_values is None else named_arg_values
         self.is_combined = is_combined
 
     def __repr__(self):
@@ -310,27 +401,34 @@ class FunctionCallNode(Node):
         return f"FunctionCallNode(name={self.name}, args={self.args}, named_arg_values={self.named_arg_values}, is_combined={self.is_combined})"
 
 
-class FunctionDeclarationNode:
-    def __init__(self, name, args, body, default_values: dict = {}, is_static=False, func_type=None, tag=None,
-                 annotations: dict = {}):
+class FunctionDeclarationNode(Node):
+    _fields = ("name", "args", "body", "default_values", "is_static", "func_type", "tag", "annotations")
+    __slots__ = _fields + ("return_type", "layout", "generator")
+
+    def __init__(self, name, args, body, default_values: dict = None, is_static=False, func_type=None, tag=None,
+                 annotations: dict = None):
         # 函数注解
-        self.annotations = annotations
+        self.annotations = {} if annotations is None else annotations
         self.name = name
         self.args = args
         self.body: List = body
-        self.default_values = default_values
+        self.default_values = {} if default_values is None else default_values
         self.return_type = None,
         # 用于判断类的方法是否是静态方法
         self.is_static = is_static
         # 指的是匿名函数、箭头函数、普通函数(def定义的)
         self.func_type = func_type
         self.tag = tag
+        self.layout = None  # 参数和局部变量的槽位布局 {变量名: 下标}，由 Resolver 设置
+        self.generator = False  # 函数体中有 yield(不包括内部函数)，由 Resolver 设置(没有经过 Resolver 时 Evaluator 定义函数时设置)
 
     def __repr__(self):
         return f"FunctionDeclarationNode(annotations = {self.annotations},tag = {self.tag},func_type={self.func_type},name={self.name}, args={self.args}, body={self.body}, default_values={self.default_values}, is_static={self.is_static},)"
 
 
-class BooleanNode:
+class BooleanNode(Node):
+    __slots__ = _fields = ("value",)
+
     def __init__(self, value):
         self.value: bool = value
 
@@ -338,28 +436,52 @@ class BooleanNode:
         return f"BooleanNode(value={self.value})"
 
 
-class StringNode:
+class StringNode(Node):
+    _fields = ("value",)
+    __slots__ = _fields + ("parts",)
+
     def __init__(self, value):
         self.value = value
+        # 模板字符串在创建节点时拆分一次: "a${x}b${y}" -> ("a", "x", "b", "y", "")
+        # 偶数下标是原样输出的文本，奇数下标是变量名; 不含 ${} 的普通字符串是 None
+        parts = TEMPLATE_PATTERN.split(value)
+        self.parts = tuple(parts) if len(parts) > 1 else None
 
     def __repr__(self):
         return f"StringNode(value={self.value})"
 
 
-class BreakNode:
+class BreakNode(Node):
+    __slots__ = _fields = ()
+    value = "break"
+
     def __init__(self):
-        self.value = "break"
+        pass
 
     def __repr__(self):
         return f"BreakNode(value={self.value})"
 
 
+# continue; 结束本次迭代，进入下一次迭代
+class ContinueNode(Node):
+    __slots__ = _fields = ()
+    value = "continue"
+
+    def __init__(self):
+        pass
+
+    def __repr__(self):
+        return f"ContinueNode(value={self.value})"
+
+
 # struct 名称 {x,y,z}
 # 考虑给每个属性一个初始值,-1
 class StructDeclarationNode(Node):
-    def __init__(self, struct_name, fields: dict = {}):
+    __slots__ = _fields = ("struct_name", "fields")
+
+    def __init__(self, struct_name, fields: dict = None):
         self.struct_name = struct_name
-        self.fields = fields  # 表示字段的值
+        self.fields = {} if fields is None else fields  # 表示字段的值
 
     def __repr__(self):
         return f"StructDeclarationNode(name={self.struct_name}, fields={self.fields})"
@@ -367,6 +489,8 @@ class StructDeclarationNode(Node):
 
 # Point{x:1,y:2}
 class StructAssignNode(Node):
+    __slots__ = _fields = ("struct_name", "struct_fields_values")
+
     def __init__(self, struct_name, struct_fields_values):
         # id 比如 Point
         self.struct_name = struct_name
@@ -379,6 +503,8 @@ class StructAssignNode(Node):
 
 # p::x 这样访问结构体实例的属性
 class StructAccessNode(Node):
+    __slots__ = _fields = ("struct_instance_name", "field_name")
+
     def __init__(self, struct_instance_name, field_name):
         self.struct_instance_name = struct_instance_name
         self.field_name = field_name
@@ -388,9 +514,11 @@ class StructAccessNode(Node):
 
 
 class EnumDeclarationNode(Node):
-    def __init__(self, enum_name, enum_values: list = []):
+    __slots__ = _fields = ("enum_name", "enum_values")
+
+    def __init__(self, enum_name, enum_values: list = None):
         self.enum_name = enum_name
-        self.enum_values = enum_values
+        self.enum_values = [] if enum_values is None else enum_values
 
     def __repr__(self):
         return f"EnumDeclarationNode(name={self.enum_name}, fields={self.enum_values})"
@@ -398,6 +526,8 @@ class EnumDeclarationNode(Node):
 
 # let x= enum::Color::Red;
 class EnumAccessNode(Node):
+    __slots__ = _fields = ("enum_name", "enum_property")
+
     def __init__(self, enum_name, enum_property):
         self.enum_name = enum_name
         self.enum_property = enum_property
@@ -407,6 +537,8 @@ class EnumAccessNode(Node):
 
 
 class ChainNode(Node):
+    __slots__ = _fields = ("expr", "handler_list")
+
     def __init__(self, expr, handler_list):
         # 要处理的遍历
         self.expr = expr
@@ -419,6 +551,8 @@ class ChainNode(Node):
 
 # do { } while(true)
 class DoWhileNode(Node):
+    __slots__ = _fields = ("condition", "body")
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
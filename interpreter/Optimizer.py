@@ -0,0 +1,283 @@
+from interpreter.Evaluator import Evaluator
+from interpreter.Node import Node
+from interpreter.Nodes import NumberNode, BooleanNode, StringNode, BinaryOpNode, UnaryOpNode, IfExprNode, \
+    IfStatementNode, ConstantNode
+from interpreter.Parser import Parser
+from interpreter.Source import sources
+from interpreter.Tokenizer import Tokenizer, OPERATOR_TOKENS
+
+"""
+goal:
+    常量折叠(constant folding)，在 Parser.parse() 之后、Resolver 之前运行一次
+
+    以前每次求值 NumberNode 都要判断 '.' in node.value 再 int()/float()，BooleanNode 每次都要和 "True"/"False" 比较，
+    循环体里的 60 * 60 * 24 每次迭代都要重新算一遍。现在执行之前:
+        1, 字面量转换成 ConstantNode(Python 的值): 数字、布尔值、不含模板 ${} 的字符串
+        2, 操作数都是常量的 BinaryOpNode / UnaryOpNode 算出结果，替换成 ConstantNode
+        3, 条件是常量的 IfExprNode 替换成对应的分支
+        4, IfStatementNode 中条件是常量的分支: 永远为假的分支删掉，永远为真的分支之后的 elif/else 删掉
+    折叠用 Evaluator 自己的 evaluate_binary_op / evaluate_unary_op 计算，所以结果和运行时完全一样;
+    计算出错(比如 1 / 0)的表达式不折叠，错误留到运行时按原来的方式报告。
+    结果太大的表达式(比如 2 ^ 100000、"ab" * 1000000)不折叠，避免缓存文件和内存膨胀。
+
+    if 语句只删除分支，不会把分支的语句展开到外层: 块的最后一条语句的值会作为函数(lambda)的返回值，展开会改变它。
+
+    折叠了什么记录在 FoldReport 中: python -m interpreter.main x.fight --fold-report
+
+use:
+    optimizer = Optimizer()
+    ast = optimizer.optimize(Parser(tokens).parse())
+    print(optimizer.report.format())
+"""
+
+# 折叠的结果只能是不可变的值，列表等可变对象每次求值都必须是新的对象
+CONSTANT_TYPES = (int, float, bool, str)
+# 折叠结果的上限: 整数的位数、字符串的长度
+MAX_FOLD_BITS = 4096
+MAX_FOLD_LENGTH = 4096
+
+# 运算符 -> 源代码中的写法(用于报告)
+OPERATOR_SYMBOLS = {token_type: symbol for symbol, (token_type, _) in OPERATOR_TOKENS.items()}
+OPERATOR_SYMBOLS.update({'MINUS': '-', 'AND': 'and', 'OR': 'or'})
+
+
+class FoldReport:
+    # 常量折叠的结果: 每一类折叠的次数 + 每一次表达式折叠/分支删除的位置和内容(字面量的转换只计数)
+    def __init__(self):
+        self.counts = {"literal": 0, "binary": 0, "unary": 0, "if-expr": 0, "if-branch": 0}
+        self.entries = []
+
+    def count(self, kind):
+        self.counts[kind] += 1
+
+    def record(self, kind, position, description):
+        self.counts[kind] += 1
+        self.entries.append((position, kind, description))
+
+    def summary(self):
+        return ("constant folding: {literal} literals, {binary} binary, {unary} unary, {if-expr} if-expr, "
+                "{if-branch} dead if-branches removed").format_map(self.counts)
+
+    def format(self):
+        lines = [self.summary()]
+        for position, kind, description in self.entries:
+            lines.append(f"  {sources.describe(position) or '<unknown>'}: {kind}: {description}")
+        return "\n".join(lines)
+
+
+class Optimizer:
+    def __init__(self):
+        self.report = FoldReport()
+        # 只用来计算常量表达式的求值器
+        self.evaluator = Evaluator()
+        # 节点类型 -> 折叠方法(返回替换后的节点)，其他节点只处理子节点
+        self.visit_table = {
+            NumberNode: self.visit_number,
+            BooleanNode: self.visit_boolean,
+            StringNode: self.visit_string,
+            BinaryOpNode: self.visit_binary_op,
+            UnaryOpNode: self.visit_unary_op,
+            IfExprNode: self.visit_if_expr,
+            IfStatementNode: self.visit_if_statement,
+        }
+
+    def optimize(self, ast):
+        """
+            折叠整个程序(Parser.parse()的结果)，返回折叠后的 ast(顶层列表原地修改)
+            节点的字段不修改，有变化的节点用 replace() 生成新的节点
+            嵌套太深时停止折叠: 每一步替换都和原来的语义相同，已经折叠的部分仍然有效
+        """
+        try:
+            return self.visit(ast)
+        except RecursionError:
+            return ast
+
+    # ===========================遍历===========================
+
+    def visit(self, value):
+        # 返回替换后的值
+        if isinstance(value, Node):
+            visit_method = self.visit_table.get(type(value))
+            if visit_method is None:
+                return self.visit_children(value)
+            return visit_method(value)
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                value[index] = self.visit(item)
+        elif isinstance(value, tuple):
+            return tuple(self.visit(item) for item in value)
+        elif isinstance(value, dict):
+            if any(isinstance(key, Node) for key in value):
+                # match/switch 的 key 也是节点，需要新建字典(保持顺序)
+                return {self.visit(key): self.visit(item) for key, item in value.items()}
+            for key, item in value.items():
+                value[key] = self.visit(item)
+        return value
+
+    def visit_children(self, node):
+        # 返回子节点折叠之后的节点，没有变化时是原来的节点
+        changes = {}
+        for name in node._fields:
+            value = getattr(node, name)
+            new_value = self.visit(value)
+            if new_value is not value:
+                changes[name] = new_value
+        return node.replace(**changes) if changes else node
+
+    # ===========================字面量===========================
+
+    def constant(self, value, node):
+        constant = ConstantNode(value)
+        constant.position = node.position
+        return constant
+
+    def visit_number(self, node: NumberNode):
+        try:
+            value = float(node.value) if '.' in node.value else int(node.value)
+        except ValueError:
+            # 不合法的数字留到运行时报错
+            return node
+        self.report.count("literal")
+        return self.constant(value, node)
+
+    def visit_boolean(self, node: BooleanNode):
+        if node.value not in ("True", "False"):
+            return node
+        self.report.count("literal")
+        return self.constant(node.value == "True", node)
+
+    def visit_string(self, node: StringNode):
+        # 模板字符串需要运行时的变量
+        if node.parts is not None:
+            return node
+        self.report.count("literal")
+        return self.constant(node.value, node)
+
+    # ===========================表达式===========================
+
+    def visit_binary_op(self, node: BinaryOpNode):
+        node = self.visit_children(node)
+        left, right = node.left, node.right
+        if left.__class__ is not ConstantNode or right.__class__ is not ConstantNode:
+            return node
+        if too_large(node.op, left.value, right.value):
+            return node
+        try:
+            value = self.evaluator.evaluate_binary_op(node)
+        except Exception:
+            return node
+        if type(value) not in CONSTANT_TYPES:
+            return node
+        position = node.position if node.position is not None else left.position
+        self.report.record("binary", position, f"{left.value!r} {OPERATOR_SYMBOLS.get(node.op, node.op)} "
+                                               f"{right.value!r} -> {value!r}")
+        constant = ConstantNode(value)
+        constant.position = position
+        return constant
+
+    def visit_unary_op(self, node: UnaryOpNode):
+        node = self.visit_children(node)
+        if node.operand.__class__ is not ConstantNode:
+            return node
+        try:
+            value = self.evaluator.evaluate_unary_op(node)
+        except Exception:
+            return node
+        position = node.position if node.position is not None else node.operand.position
+        self.report.record("unary", position, f"{node.operator} {node.operand.value!r} -> {value!r}")
+        constant = ConstantNode(value)
+        constant.position = position
+        return constant
+
+    def visit_if_expr(self, node: IfExprNode):
+        node = self.visit_children(node)
+        condition = node.condition
+        # 条件不是 bool 时运行时会报 TypeError，不折叠
+        if condition.__class__ is not ConstantNode or type(condition.value) is not bool:
+            return node
+        branch = node.expr_if_true if condition.value else node.expr_if_false
+        self.report.record("if-expr", condition.position,
+                           f"if({condition.value}) -> {'true' if condition.value else 'false'} branch")
+        return branch
+
+    # ===========================if 语句===========================
+
+    def visit_if_statement(self, node: IfStatementNode):
+        """
+            删除 if/elif/else 中不会执行的分支(和 Evaluator 一样按真值判断条件):
+                if(false){A} elif(c){B} else{C}    ->  if(c){B} else{C}
+                if(c){A} elif(True){B} elif(d){D}  ->  if(c){A} else{B}
+                if(true){A} else{C}                ->  if(true){A}
+        """
+        # elif_ 是 [{'condition': 条件, 'elif_statements': 代码块}]，字典和列表一样原地修改
+        node = self.visit_children(node)
+
+        # (条件, 代码块, elif 字典)，if 分支没有 elif 字典
+        branches = [(node.condition, node.if_body, None)] + \
+                   [(elif_dict['condition'], elif_dict['elif_statements'], elif_dict) for elif_dict in node.elif_]
+        live = []
+        final_body = node.else_
+        removed = 0
+        for index, (condition, body, elif_dict) in enumerate(branches):
+            if condition.__class__ is not ConstantNode:
+                live.append((condition, body, elif_dict))
+            elif condition.value:
+                # 永远为真: 它就是最后一个分支，之后的 elif 和 else 都不会执行
+                removed += len(branches) - index - 1 + (1 if node.else_ else 0)
+                final_body = body
+                break
+            else:
+                removed += 1
+        if len(live) == len(branches):
+            return node
+
+        position = node.position if node.position is not None else node.condition.position
+        if live:
+            pruned = node.replace(
+                condition=live[0][0], if_body=live[0][1], else_=final_body,
+                elif_=[elif_dict if elif_dict is not None else {'condition': condition, 'elif_statements': body}
+                       for condition, body, elif_dict in live[1:]])
+        else:
+            # 所有条件都是常量: 只剩下一个一定执行的代码块(可能为空)
+            always = ConstantNode(True)
+            always.position = position
+            pruned = node.replace(condition=always, if_body=final_body, elif_=[], else_=[])
+        if removed:
+            self.report.record("if-branch", position, f"removed {removed} dead branch{'es' if removed > 1 else ''}")
+        return pruned
+
+
+def too_large(op, left, right):
+    # 折叠结果是否可能超过上限(只估计会爆炸式增长的运算)
+    if op == 'POW' and type(left) is int and type(right) is int:
+        return right > 0 and abs(left) > 1 and left.bit_length() * right > MAX_FOLD_BITS
+    if op == 'MUL':
+        if isinstance(left, str) and type(right) is int:
+            return len(left) * right > MAX_FOLD_LENGTH
+        if isinstance(right, str) and type(left) is int:
+            return len(right) * left > MAX_FOLD_LENGTH
+    return False
+
+
+# 测试常量折叠
+if __name__ == '__main__':
+    code = """
+        let seconds = 60 * 60 * 24;
+        let flag = not (1 > 2) and True;
+        let size = if(3 > 2) "big" : "small";
+        if(2 < 1){
+            @println("never");
+        } elif(seconds > 100){
+            @println(seconds);
+        } elif(True){
+            @println("fallback");
+        } else {
+            @println("dead");
+        }
+        let broken = 1 / 0;
+    """
+    optimizer = Optimizer()
+    ast = optimizer.optimize(Parser(Tokenizer(code, "<demo>").tokenize()).parse())
+    for node in ast:
+        print(node)
+    print(optimizer.report.format())
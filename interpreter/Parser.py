@@ -11,8 +11,10 @@ from interpreter.Nodes import (AssignmentNode, FunctionCallNode, BinaryOpNode,
                                ListDeconstructAssignNode, ForRangeNumberNode, TryCatchFinallyNode, IncrementNode,
                                DecrementNode, SetNode, CombineNode, MultiListIndexNode, StructDeclarationNode,
                                StructAssignNode, StructAccessNode, EnumDeclarationNode, EnumAccessNode, ChainNode,
-                               DoWhileNode, )
+                               DoWhileNode, ContinueNode, YieldNode, )
+from interpreter.Source import sources
 from interpreter.Tokenizer import Tokenizer
+from interpreter.Trace import tracer, TRACE
 from interpreter.Nodes import LoopNode, FunctionDeclarationNode
 
 """
@@ -77,11 +79,48 @@ bnf:
             Object (object): 对象解析 （完成）
 """
 
+# 二元运算符的绑定强度(binding power)，越大结合得越紧，同一级别的运算符都是左结合
+#   10: + - or
+#   20: * / // ^ % and == != < > <= >=   (和以前 term() 中的运算符一致，比较运算和 and 与乘除同一级)
+BINDING_POWERS = {
+    "PLUS": 10, "MINUS": 10, "OR": 10,
+    "MUL": 20, "DIV": 20, "FLOOR_DIV": 20, "POW": 20, "MOD": 20, "AND": 20,
+    "EQ": 20, "NEQ": 20, "LT": 20, "GT": 20, "GE": 20, "LE": 20,
+}
+# binary_expr 的运算符栈中表示左括号的标记
+PAREN = object()
+
+
+def located(parse_method):
+    """
+        记录解析出来的节点在源代码中的位置: 节点开始的 token 的 position(见 Source.py)
+        只用在 statement() 和 factor() 上，语句和最小的表达式(变量、函数调用、字面量...)就都有了位置
+    """
+
+    def parse_located(self):
+        # 先取出位置: TokenStream 在解析完一条长语句之后，开头的 token 可能已经丢掉了
+        position = self.positions[self.pos] if self.positions is not None else None
+        node = parse_method(self)
+        # 只设置还没有位置的节点(内层的 statement/factor 已经设置过的不覆盖); 不是节点的返回值没有 position
+        if position is not None and getattr(node, 'position', 0) is None:
+            node.position = position
+        return node
+
+    parse_located.__name__ = parse_method.__name__
+    parse_located.__doc__ = parse_method.__doc__
+    return parse_located
+
 
 class Parser:
     def __init__(self, tokens):
+        # token 列表，或者 Tokenizer.stream() 返回的 TokenStream(按需读取 token，只保留一个小窗口)
         self.tokens = tokens
+        # TokenList/TokenStream 带有每个 token 的位置，普通的列表没有位置信息
+        self.positions = getattr(tokens, 'positions', None)
         self.pos = 0
+        # factor 的解析方法表: token 类型 -> 方法, 关键字 -> 方法
+        self.prefix_parsers = self.build_prefix_parsers()
+        self.keyword_parsers = self.build_keyword_parsers()
         # self.current_class = None  # 新增：跟踪当前正在解析的类
         # self.current_object = None
 
@@ -90,19 +129,33 @@ class Parser:
 
     # 解析程序
     def program(self):
-        statements = []
-        while self.pos < len(self.tokens):
-            statements.append(self.statement())
-        return statements
+        return list(self.statements())
+
+    def statements(self):
+        """
+            逐个产生顶层语句，解析完一条语句就可以执行一条，
+            和 TokenStream 一起使用时，不需要先得到整个 token 列表
+        """
+        while self.has_more_tokens():
+            yield self.statement()
+
+    def has_more_tokens(self):
+        # 不使用 len(self.tokens)，TokenStream 在读完之前不知道长度
+        try:
+            self.tokens[self.pos]
+        except IndexError:
+            return False
+        return True
 
     """
         解析语句, 包括赋值语句、函数调用语句、
         该方法是解析的根本方法
         statement: assignment | function_call_expr | if_statement | loop_statement 
-                | break_statement | return_statement | let_statement | function_declaration
+                | break_statement | return_statement | yield_statement | let_statement | function_declaration
                 | expr END (比如x+1;)
     """
 
+    @located
     def statement(self):
 
         # keyword: ['let', 'if', 'else', "elif", 'break', 'loop', 'function', 'return']
@@ -128,6 +181,8 @@ class Parser:
             return self.loop_statement()
         elif self.current_token_value() == 'break':
             return self.break_statement()
+        elif self.current_token_value() == 'continue':
+            return self.continue_statement()
         # elif self.current_token_type() == 'KEYWORD' and self.current_token_value() == 'function':
         elif self.current_token_value() == 'def':
             return self.function_declaration()
@@ -144,6 +199,8 @@ class Parser:
 
         elif self.current_token_value() == 'return':
             return self.return_statement()
+        elif self.current_token_value() == 'yield':
+            return self.yield_statement()
         elif self.current_token_value() == "for":
             return self.for_in_statement()
 
@@ -193,12 +250,12 @@ class Parser:
         elif self.current_token_type() == "ID" and self.tokens[self.pos + 1][1] == "+" and self.tokens[self.pos + 2][
             1] == "+":
             # id++;
-            print('inc')
+            tracer.trace('inc')
             return self.increment_statement()
         elif self.current_token_type() == "ID" and self.tokens[self.pos + 1][1] == "-" and self.tokens[self.pos + 2][
             1] == "-":
             # id--;
-            print('dec')
+            tracer.trace('dec')
             return self.decrement_statement()
 
         elif self.current_token_value() == "struct":
@@ -264,8 +321,7 @@ class Parser:
             properties.update({property_name: property_value})
         self.eat_current_token_type("RPAREN")  # )
         fnc_dec_node: FunctionDeclarationNode = self.function_declaration()
-        fnc_dec_node.annotations = properties
-        return fnc_dec_node
+        return fnc_dec_node.replace(annotations=properties)
 
     def parse_annotation(self):
         # 解析注解
@@ -302,7 +358,7 @@ class Parser:
         # 比如RED
         enum_property = self.current_token_value()
         self.eat_current_token_type("ID")
-        print("xxx")
+        tracer.trace("xxx")
         return EnumAccessNode(enum_name, enum_property)
 
     def enum_statement(self):
@@ -369,7 +425,7 @@ class Parser:
             stmt = self.statement()
             try_blocks.append(stmt)
         self.eat_current_token_type("RBRACE")  # }
-        print("try_blocks", try_blocks)
+        tracer.trace("try_blocks", try_blocks)
 
         # catch 和finally blocks
         catch_block = []
@@ -581,7 +637,7 @@ class Parser:
         class_name = self.current_token_value()
         self.eat_current_token_type('ID')  # 类名
 
-        print("environment: ", )
+        tracer.trace("class_name: ", class_name)
         parent_name = ""
         # =======================extends=============================
         # extends 继承
@@ -598,7 +654,7 @@ class Parser:
             while self.current_token_type() == "ID":
                 interface_name = self.current_token_value()
                 self.eat_current_token_type('ID')  # 接口名
-                print("implements: ", interface_name)
+                tracer.trace("implements: ", interface_name)
                 interfaces.append(interface_name)
                 if self.current_token_type() == "COMMA":
                     self.eat_current_token_type("COMMA")
@@ -630,7 +686,7 @@ class Parser:
                     field_annotation = None
                     if self.current_token_value() == "@":
                         field_annotation = self.parse_annotation()
-                        print("field_annotation: ", field_annotation)
+                        tracer.trace("field_annotation: ", field_annotation)
 
                     # ======================static test========================
                     is_static = False
@@ -740,7 +796,7 @@ class Parser:
         return node
 
     def module_method_call(self):
-        print("module_method_call: ")
+        tracer.trace("module_method_call: ")
         # 往函数调用方向凑 模块.方法(参数)
         name = self.current_token_value()  # 模块名称
         self.eat_current_token_type('ID')
@@ -768,7 +824,7 @@ class Parser:
                     # 最后一个参数的判断
                     if self.current_token_type() == 'COMMA':
                         self.eat_current_token_type('COMMA')  # ,
-                print("passin_arg_values: ", named_arg_values)
+                tracer.trace("passin_arg_values: ", named_arg_values)
             # ==================解析命名参数===============================================
             else:
                 # ===================原来的解析方式=======位置参数=================================
@@ -838,6 +894,7 @@ class Parser:
         self.eat_current_token_type('END')  # ;
         return AssignmentNode(const_name, const_value, True)
 
+    @located
     def factor(self):
         """
             factor 是最小的组成部分，可以是:
@@ -848,143 +905,155 @@ class Parser:
                  (5) 字符串 "hello world"
                  (6) 数组 [1,2,3]
                  (7) 对象 {name: "value"}
-                 (3)一个括号括起来的表达式 (1+2)
                  (8) 函数调用 add(1,2)
                  (9) not 表达式:  not true
+            根据当前 token 的类型(关键字根据 token 的值)在 prefix_parsers / keyword_parsers 中查找解析方法
         """
-        token = self.current_token_type()
-        if token == 'NUMBER':
-            # 解析数字: 字符串形式
-            node = NumberNode(self.current_token_value())
-            self.eat_current_token_type('NUMBER')
-            print("node: ", node)
-            return node
-            # 解析函数调用表达式
-        elif token == 'ID':
-
-            # 判断是否为函数调用
-            if self.peek_next_token_type() == 'LPAREN':
-                return self.function_call_expr()  # 调用函数解析
-            # 解析列表索引表达式
-            elif self.peek_next_token_type() == 'LBRACKET':
-                return self.index_expr()
-
-            # 解析对象索引表达式  obj{expr}
-            elif self.peek_next_token_type() == 'LBRACE':
-
-                # 尝试解析结构体赋值
-                if self.tokens[self.pos + 3][0] == "COLON":
-                    return self.struct_assign_expr()
-                # 尝试解析对象索引表达式  obj{expr}
-                return self.object_index_expr()
-
-            # 一个大坑: 对于模块调用方法,第一个token是Id, 那么对其的处理
-            # 必须是在 elif token = "ID"分支下
-            # 模块调用方法 比如 let z = module.add(1,2);
-            elif self.peek_next_token_type() == "DOT":
-                if self.tokens[self.pos + 2][0] == "ID":  # ID
-                    if self.tokens[self.pos + 3][0] == "LPAREN":  # LPAREN
-                        return self.module_method_call_expr()
-
-                    else:
-                        # 调用模块里面的变量或者常量  比如 @log(Util.pi);
-                        return self.module_expr()  # 进入module_expr的时候还是ID,也就是模块名称
-
-            # 解析获取对象属性的表达式  let z = p->Age;  @log(p->Age);这样的操作
-            elif self.peek_next_token_type() == 'MINUS' and self.tokens[self.pos + 2][0] == 'GT':
-                # if self.tokens[self.pos + 3][0] != 'LPAREN':  # 说明是获取对象的属性
-                # return self.get_member_expr()  老名字
-                return self.get_member_expr_or_method_call_expr()
-
-            # 解析结构体对象访问属性的   p::x
-            elif self.peek_next_token_type() == 'COLON' and self.tokens[self.pos + 2][0] == 'COLON':
-                return self.struct_access_expr()
-
-            # 解析变量表达式
-            node = VariableNode(self.current_token_value())
-            self.eat_current_token_type('ID')
-            return node
-        # 最小表达式：(1+2)这样的表达式, 递归解析嵌套括号
-        elif token == 'LPAREN':
-            self.eat_current_token_type('LPAREN')
-            node = self.expr()
-            self.eat_current_token_type('RPAREN')
-            return node
-        elif token == 'BOOL':
-            node = BooleanNode(self.current_token_value())
-            self.eat_current_token_type('BOOL')
-            return node
-        elif token == 'STRING':
-            node = StringNode(self.current_token_value())
-            self.eat_current_token_type('STRING')
-            return node
-        # 数组解析
-        elif token == 'LBRACKET':  # [1,2,3]
-            return self.parse_array()
-        elif token == 'LBRACE':  # {name: "value"}
-            return self.parse_object()
-
-        # set集合
-        elif self.current_token_value() == 'set' and self.peek_next_token_type() == "LT":
-            print("执行了set")
-            return self.parse_set()
-
+        token = self.tokens[self.pos]
+        prefix_parser = self.prefix_parsers.get(token[0])
+        if prefix_parser is None:
+            if token[0] == 'KEYWORD':
+                prefix_parser = self.keyword_parsers.get(token[1])
+            if prefix_parser is None:
+                self.unexpected_token()
+        return prefix_parser()
+
+    def build_prefix_parsers(self):
+        # token 类型 -> factor 的解析方法
+        return {
+            'NUMBER': self.number_factor,
+            'ID': self.identifier_factor,
+            # 最小表达式：(1+2)这样的表达式
+            'LPAREN': self.paren_factor,
+            'BOOL': self.bool_factor,
+            'STRING': self.string_factor,
+            'LBRACKET': self.parse_array,  # [1,2,3]
+            'LBRACE': self.parse_object,  # {name: "value"}
             # 解析逻辑表达式
-        elif token == 'NOT':
-            return self.logical_expr()
-
-        # 一下形式的lambda表达式:  let z = def(x,y){ x+y }
-        elif self.current_token_value() == 'def':
-            if self.peek_next_token_type() == 'LPAREN':
-                # 返回FunctionDeclarationNode 即可
-                return self.anonymous_function_declaration()
-
-        # 真的lambda表达式：  let z = lambda x,y:x+y;
-        elif self.current_token_value() == 'lambda':
-            if self.peek_next_token_type() == 'ID':
-                # 返回FunctionDeclarationNode 即可
-                return self.real_lambda_function_declaration()
-
-        # 箭头函数
-        # let z = <<x,y>> =>{};
-        elif self.current_token_type() == 'LT' and self.peek_next_token_type() == "LT":  # <
-            return self.arrow_function_declaration()
-
-
-        # 实例化对象  let z = new 类名();  右侧的: new 类名() 算作表达式
-        elif self.current_token_value() == "new":
-            return self.evaluate_new_expr()
-
-
-        elif self.current_token_value() == 'this':
+            'NOT': self.logical_expr,
+            # 箭头函数  let z = <<x,y>> =>{};
+            'LT': self.arrow_factor,
+        }
+
+    def build_keyword_parsers(self):
+        # 关键字 -> factor 的解析方法
+        return {
+            # set集合
+            'set': self.set_factor,
+            # 一下形式的lambda表达式:  let z = def(x,y){ x+y }
+            'def': self.anonymous_function_factor,
+            # 真的lambda表达式：  let z = lambda x,y:x+y;
+            'lambda': self.lambda_factor,
+            # 实例化对象  let z = new 类名();  右侧的: new 类名() 算作表达式
+            'new': self.evaluate_new_expr,
             # body里面的: ReturnNode(value=ThisNode())
-            return self.parse_this()
-
-        # if () x : y 这样的表达式
-        elif self.current_token_value() == 'if':
-            return self.if_expr()
-
-        # match表达式
-        elif self.current_token_value() == 'match':
-            return self.match_expr()
-
-        # let x= enum::Color::RED;
-        elif self.current_token_value() == "enum" and self.peek_next_token_type() == "COLON":
-            print("entered")
-            return self.enum_access_expr()
-
-
+            'this': self.parse_this,
+            # if () x : y 这样的表达式
+            'if': self.if_expr,
+            # match表达式
+            'match': self.match_expr,
+            # let x= enum::Color::RED;
+            'enum': self.enum_factor,
+        }
+
+    def unexpected_token(self):
+        raise self.syntax_error(
+            f"Unexpected token: {self.current_token_type()}, value = {self.current_token_value()}, "
+            f"next_token = {self.peek_next_token_type()}")
+
+    def number_factor(self):
+        # 解析数字: 字符串形式
+        node = NumberNode(self.tokens[self.pos][1])
+        self.pos += 1
+        if tracer.level >= TRACE:
+            tracer.trace("node: ", node)
+        return node
 
+    def identifier_factor(self):
+        next_token_type = self.tokens[self.pos + 1][0]
+        # 判断是否为函数调用
+        if next_token_type == 'LPAREN':
+            return self.function_call_expr()  # 调用函数解析
+        # 解析列表索引表达式
+        elif next_token_type == 'LBRACKET':
+            return self.index_expr()
+
+        # 解析对象索引表达式  obj{expr}
+        elif next_token_type == 'LBRACE':
+            # 尝试解析结构体赋值
+            if self.tokens[self.pos + 3][0] == "COLON":
+                return self.struct_assign_expr()
+            # 尝试解析对象索引表达式  obj{expr}
+            return self.object_index_expr()
+
+        # 一个大坑: 对于模块调用方法,第一个token是Id, 那么对其的处理
+        # 必须是在 elif token = "ID"分支下
+        # 模块调用方法 比如 let z = module.add(1,2);
+        elif next_token_type == "DOT":
+            if self.tokens[self.pos + 2][0] == "ID":  # ID
+                if self.tokens[self.pos + 3][0] == "LPAREN":  # LPAREN
+                    return self.module_method_call_expr()
+                else:
+                    # 调用模块里面的变量或者常量  比如 @log(Util.pi);
+                    return self.module_expr()  # 进入module_expr的时候还是ID,也就是模块名称
 
+        # 解析获取对象属性的表达式  let z = p->Age;  @log(p->Age);这样的操作
+        elif next_token_type == 'MINUS' and self.tokens[self.pos + 2][0] == 'GT':
+            return self.get_member_expr_or_method_call_expr()
 
+        # 解析结构体对象访问属性的   p::x
+        elif next_token_type == 'COLON' and self.tokens[self.pos + 2][0] == 'COLON':
+            return self.struct_access_expr()
 
-        else:
-            raise SyntaxError(
-                f"Unexpected token: {token}, value = {self.current_token_value()}, next_token = {self.peek_next_token_type()}")
+        # 解析变量表达式
+        node = VariableNode(self.tokens[self.pos][1])
+        self.pos += 1
+        return node
 
+    def paren_factor(self):
+        # 递归解析嵌套括号(binary_expr 中的括号不经过这里)
+        self.eat_current_token_type('LPAREN')
+        node = self.expr()
+        self.eat_current_token_type('RPAREN')
+        return node
 
+    def bool_factor(self):
+        node = BooleanNode(self.tokens[self.pos][1])
+        self.pos += 1
+        return node
 
+    def string_factor(self):
+        node = StringNode(self.tokens[self.pos][1])
+        self.pos += 1
+        return node
 
+    def arrow_factor(self):
+        if self.peek_next_token_type() != "LT":
+            self.unexpected_token()
+        return self.arrow_function_declaration()
+
+    def set_factor(self):
+        if self.peek_next_token_type() != "LT":
+            self.unexpected_token()
+        tracer.trace("执行了set")
+        return self.parse_set()
+
+    def anonymous_function_factor(self):
+        # def 后面不是 ( 时和以前一样返回 None
+        if self.peek_next_token_type() == 'LPAREN':
+            # 返回FunctionDeclarationNode 即可
+            return self.anonymous_function_declaration()
+
+    def lambda_factor(self):
+        if self.peek_next_token_type() == 'ID':
+            # 返回FunctionDeclarationNode 即可
+            return self.real_lambda_function_declaration()
+
+    def enum_factor(self):
+        if self.peek_next_token_type() != "COLON":
+            self.unexpected_token()
+        tracer.trace("entered")
+        return self.enum_access_expr()
 
     def struct_access_expr(self):
         # 进来的时候是ID
@@ -1037,7 +1106,7 @@ class Parser:
             set_values.append(self.expr())
             if self.current_token_type() == 'COMMA':
                 self.eat_current_token_type('COMMA')
-        print("token: ", self.current_token_value())
+        tracer.trace("token: ", self.current_token_value())
         self.eat_current_token_type('GT')  # >
         return SetNode(set_values)
 
@@ -1180,14 +1249,14 @@ class Parser:
         # print("called module_method_call_expr")
         # let z = 模块.add(1,2);
         name = self.current_token_value()  # 模块名称
-        print("name: ", name)
+        tracer.trace("name: ", name)
         self.eat_current_token_type('ID')
         name += self.current_token_value()
-        print("name: ", name)
+        tracer.trace("name: ", name)
 
         self.eat_current_token_type('DOT')  # .
         name += self.current_token_value()
-        print("name: ", name)
+        tracer.trace("name: ", name)
         self.eat_current_token_type('ID')  # 方法名
         self.eat_current_token_type('LPAREN')  # (
 
@@ -1201,7 +1270,7 @@ class Parser:
                 args.append(self.expr())
         self.eat_current_token_type('RPAREN')  # )
         # print("module_method_call_expr的args： ", args)
-        print("进入模块调用")
+        tracer.trace("进入模块调用")
         return FunctionCallNode(name, args)
 
     def arrow_function_declaration(self):
@@ -1324,7 +1393,7 @@ class Parser:
         method_annotation = None
         if self.current_token_value() == "@":
             method_annotation = self.parse_annotation()
-            print("method_annotation: ", method_annotation)
+            tracer.trace("method_annotation: ", method_annotation)
 
         is_static = False
         if self.current_token_value() == "static":
@@ -1405,7 +1474,7 @@ class Parser:
         """
             1, for in解析
                 for(ele in []){}
-            2, for(idx in 1..10){}
+            2, for(idx: 1 to 10){}  for(idx: 0 to 100 step 5){}
         """
         self.eat_current_token_type('KEYWORD')  # for
         self.eat_current_token_type("LPAREN")
@@ -1422,6 +1491,17 @@ class Parser:
             start_value = self.expr()
             self.eat_current_token_type('KEYWORD')  # to
             end_value = self.expr()
+            # step 只在这个位置有特殊含义，不是关键字，变量仍然可以叫 step
+            step_value = None
+            if self.current_token_type() == 'ID' and self.current_token_value() == 'step':
+                self.eat_current_token_type('ID')  # step
+                # step 前面是操作数，Tokenizer 不会把 step -1 中的 '-' 当作负号，这里按 0 - (表达式) 解析，
+                # 这样负数的 step 和 0、小数一样在执行时报 "step must be a positive integer"
+                if self.current_token_type() == 'MINUS':
+                    self.eat_current_token_type('MINUS')
+                    step_value = BinaryOpNode(NumberNode('0'), 'MINUS', self.expr())
+                else:
+                    step_value = self.expr()
             self.eat_current_token_type("RPAREN")  # )
             self.eat_current_token_type("LBRACE")  # {
             # block statements
@@ -1429,7 +1509,7 @@ class Parser:
             while self.current_token_type() != 'RBRACE':
                 block_statements.append(self.statement())
             self.eat_current_token_type("RBRACE")  # }
-            return ForRangeNumberNode(var_name, start_value, end_value, block_statements)
+            return ForRangeNumberNode(var_name, start_value, end_value, block_statements, step_value)
 
         # for in语法
         if self.current_token_value() == 'in':
@@ -1509,11 +1589,11 @@ class Parser:
         block_statements = []  # 存放if语句块中的语句
         while self.current_token_type() != 'RBRACE':
             stmt = self.statement()
-            print("stmt: ", stmt)
+            tracer.trace("stmt: ", stmt)
             block_statements.append(stmt)
 
         self.eat_current_token_type("RBRACE")  # }
-        print("self.current_token_value(): ", self.current_token_value())
+        tracer.trace("self.current_token_value(): ", self.current_token_value())
 
         # 解析elif和else语句
         if self.current_token_value() == 'elif':
@@ -1531,12 +1611,23 @@ class Parser:
         self.eat_current_token_type("END")  # ;
         return BreakNode()
 
+    def continue_statement(self):
+        self.eat_current_token_type('KEYWORD')  # continue
+        self.eat_current_token_type("END")  # ;
+        return ContinueNode()
+
     def return_statement(self):
         self.eat_current_token_type('KEYWORD')  # return
         return_value = self.expr()
         self.eat_current_token_type("END")  # ;
         return ReturnNode(return_value)
 
+    def yield_statement(self):
+        self.eat_current_token_type('KEYWORD')  # yield
+        value = self.expr()
+        self.eat_current_token_type("END")  # ;
+        return YieldNode(value)
+
     def loop_statement(self):
         self.eat_current_token_type('KEYWORD')  # loop
         self.eat_current_token_type("LPAREN")  # (
@@ -1561,11 +1652,11 @@ class Parser:
         self.eat_current_token_type('ID')
         self.eat_current_token_type('ASSIGN')
         value = self.expr()
-        print("进入")
+        tracer.trace("进入")
 
         # =====================================
         if isinstance(value, FunctionDeclarationNode):
-            value.tag = "assignment_value"  # 表示是作为赋值语句的值而已
+            value = value.replace(tag="assignment_value")  # 表示是作为赋值语句的值而已
 
         # 如果value是作为参数解析传递，应该做一个标记
         # print("val: ", value)
@@ -1624,7 +1715,7 @@ class Parser:
                     # 最后一个参数的判断
                     if self.current_token_type() == 'COMMA':
                         self.eat_current_token_type('COMMA')  # ,
-                print("passin_arg_values: ", named_arg_values)
+                tracer.trace("passin_arg_values: ", named_arg_values)
             # ==================解析命名参数===============================================
             else:
                 # ===================原来的解析方式=======位置参数=================================
@@ -1738,14 +1829,76 @@ class Parser:
 
 
 
-        node = self.term()
-        # 优先级比term低
-        operators = ("PLUS", "MINUS", "OR")
-        while self.current_token_type() in operators:
-            op = self.current_token_type()  # 获取操作符的类型
-            self.eat_current_token_type(op)
-            node: Node = BinaryOpNode(node, op, self.term())
-        return node
+        return self.binary_expr(0)
+
+    def binary_expr(self, min_bp):
+        """
+            Pratt 解析二元运算表达式(运算符的绑定强度见 BINDING_POWERS)
+            操作数用 factor() 解析; 括号括起来的表达式不递归调用 expr()，而是在运算符栈中压入一个 PAREN 标记，
+            所以长的运算符链和很深的括号嵌套都不会加深 Python 的调用栈
+            min_bp: 只解析绑定强度大于 min_bp 的运算符(括号里面不受限制)，term() 就是 binary_expr(10)
+        """
+        tokens = self.tokens
+        binding_powers = BINDING_POWERS
+        operands = []
+        # 运算符栈和对应的绑定强度; 左括号是 PAREN, 对应的是左括号的位置
+        operators = []
+        powers = []
+        # 括号的层数
+        depth = 0
+        while True:
+            # ===========操作数: 先把左括号压栈，再解析 factor===========
+            while tokens[self.pos][0] == 'LPAREN':
+                position = self.positions[self.pos] if self.positions is not None else None
+                self.pos += 1
+                # (this->xxx()) 和以前一样直接作为括号里面的值
+                if self.call_class_inner_method():
+                    node = self.evaluate_call_class_inner_method()
+                    self.eat_current_token_type('RPAREN')
+                    if position is not None and getattr(node, 'position', 0) is None:
+                        node.position = position
+                    break
+                operators.append(PAREN)
+                powers.append(position)
+                depth += 1
+            else:
+                node = self.factor()
+            operands.append(node)
+
+            # ===========运算符===========
+            while True:
+                op = tokens[self.pos][0]
+                bp = binding_powers.get(op)
+                if bp is not None and (depth or bp > min_bp):
+                    break
+                if op == 'RPAREN' and depth:
+                    # 归约到左括号为止
+                    while operators[-1] is not PAREN:
+                        right = operands.pop()
+                        operands[-1] = BinaryOpNode(operands[-1], operators.pop(), right)
+                        powers.pop()
+                    operators.pop()
+                    position = powers.pop()
+                    depth -= 1
+                    self.pos += 1
+                    node = operands[-1]
+                    if position is not None and getattr(node, 'position', 0) is None:
+                        node.position = position
+                    continue
+                # 表达式结束
+                while operators:
+                    right = operands.pop()
+                    operands[-1] = BinaryOpNode(operands[-1], operators.pop(), right)
+                return operands[0]
+
+            # 左结合: 栈顶的运算符绑定强度不小于当前运算符时先归约
+            while operators and operators[-1] is not PAREN and powers[-1] >= bp:
+                right = operands.pop()
+                operands[-1] = BinaryOpNode(operands[-1], operators.pop(), right)
+                powers.pop()
+            operators.append(op)
+            powers.append(bp)
+            self.pos += 1
 
     """
         解析乘除法
@@ -1758,17 +1911,8 @@ class Parser:
             位于 factor 和 expr 之间。term 通常用于表示乘法和除法运算的表达式部分。
             比如：3 * 4  ,而3和4是factor，*是operator
         """
-        node = self.factor()  # 先解析factor
-        # 放在这里的比expr中的优先级高，所以先解析term
-        operators = ("MUL", "DIV", "FLOOR_DIV", "POW", "MOD",  # 乘法和除法运算符
-                     "AND", "EQ", "NEQ",  # 逻辑运算符
-                     "LT", "GT", "GE", "LE", "NEQ", "EQ"  # 比较运算符
-                     )
-        while self.current_token_type() in operators:
-            op = self.current_token_type()  # 获取操作符的类型
-            self.eat_current_token_type(op)
-            node: Node = BinaryOpNode(node, op, self.factor())
-        return node
+        # 乘法和除法、逻辑运算符 and、比较运算符: 绑定强度大于 10 的运算符
+        return self.binary_expr(10)
 
     def logical_expr(self):
         """解析逻辑表达式，处理and和or"""
@@ -1793,9 +1937,9 @@ class Parser:
 
     def current_token_value(self):
         # 获取下一个token的value
-        if self.pos <= len(self.tokens) - 1:
+        try:
             return self.tokens[self.pos][1]
-        else:
+        except IndexError:
             return None
 
     def peek_next_token_type(self):
@@ -1809,7 +1953,20 @@ class Parser:
         if self.tokens[self.pos][0] == token_type:
             self.pos += 1
         else:
-            raise SyntaxError(f"Expected {token_type} but got {self.tokens[self.pos][0]}")
+            raise self.syntax_error(f"Expected {token_type} but got {self.tokens[self.pos][0]}")
+
+    def syntax_error(self, message):
+        # 当前 token 所在的文件、行、列(读到末尾时用最后一个 token 的位置)
+        if self.positions is None:
+            return SyntaxError(message)
+        try:
+            try:
+                position = self.positions[self.pos]
+            except IndexError:
+                position = self.positions[-1]
+        except IndexError:
+            return SyntaxError(message)
+        return sources.syntax_error(message, position)
 
     def parse_array(self):
         self.eat_current_token_type('LBRACKET')
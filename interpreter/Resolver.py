@@ -0,0 +1,320 @@
+from interpreter.ClassNodes import ClassDeclarationNode
+from interpreter.Node import Node, iter_nodes
+from interpreter.Nodes import AssignmentNode, VariableNode, FunctionDeclarationNode, IfStatementNode, LoopNode, \
+    ForInNode, ForRangeNumberNode, DoWhileNode, TryCatchFinallyNode, SwitchNode, PackageDeclarationNode, \
+    ListDeconstructAssignNode, DecontructAssignNode, YieldNode, BinaryOpNode
+from interpreter.Parser import Parser
+from interpreter.Source import sources
+from interpreter.Tokenizer import Tokenizer
+
+"""
+goal:
+    变量解析(resolver)，在 Parser.parse() 之后、执行之前运行一次
+
+    给每个函数的参数和局部变量分配一个槽位下标:
+        FunctionDeclarationNode.layout = {变量名: 下标}   参数在前，局部变量在后
+        VariableNode.resolved = (depth, slot)          depth: 向外跨越几个函数, slot: 那个函数的槽位下标
+        AssignmentNode.resolved = slot                 赋值总是赋给当前函数的局部变量
+    同时标记生成器函数: 函数体中(不包括内部函数)有 yield 时 FunctionDeclarationNode.generator = True，
+    并检查 yield 的位置(check_yield_positions)，生成器不支持的位置在解析时就报 SyntaxError
+    解析不到的变量(全局变量、类和包里面的变量、运行时才知道的名字)的 resolved 是 None，执行时仍然按名字查找。
+
+    函数帧(Scope)根据 layout 创建 slots 列表，Evaluator 按 (depth, slot) 直接访问，
+    其他后端(Compiler/Bytecode)也可以使用同样的解析结果。
+
+    局部变量: 参数、函数体中(不包括内部函数)的 let/赋值、解构赋值的变量、def 定义的内部函数
+    类和包是边界: 方法体、init、包里面的变量都不解析，按名字查找
+    for 循环有自己的块作用域: 循环变量和只在循环体中赋值的变量离开循环之后就不存在了，
+    它们不分配槽位，循环体中(包括循环体中定义的函数)用到这些名字时也不解析，按名字查找，所以解析不会改变程序的语义
+"""
+
+
+class FunctionScope:
+    def __init__(self):
+        self.layout = {}
+        self.generator = False
+        # 当前所在的 for 循环的块作用域中的变量名，每进入一层 for 循环压入一个集合
+        self.blocks = []
+
+    def declare(self, name):
+        if name not in self.layout:
+            self.layout[name] = len(self.layout)
+        return self.layout[name]
+
+    def in_block(self, name):
+        for names in self.blocks:
+            if name in names:
+                return True
+        return False
+
+
+class Resolver:
+    def __init__(self):
+        # 函数作用域栈，最后一个是当前函数
+        self.scopes = []
+        # 节点类型 -> 解析方法，其他节点只遍历子节点
+        self.visit_table = {
+            FunctionDeclarationNode: self.visit_function_declaration,
+            VariableNode: self.visit_variable,
+            BinaryOpNode: self.visit_binary_op,
+            AssignmentNode: self.visit_assignment,
+            ForInNode: self.visit_loop_block,
+            ForRangeNumberNode: self.visit_loop_block,
+            YieldNode: self.visit_yield,
+            ClassDeclarationNode: self.visit_class_declaration,
+            PackageDeclarationNode: self.visit_package_declaration,
+        }
+
+    def resolve(self, ast):
+        """
+            解析整个程序(Parser.parse()的结果)，结果直接记录在节点上，返回原来的 ast
+        """
+        self.visit(ast)
+        return ast
+
+    # ===========================遍历===========================
+
+    def visit(self, value):
+        if isinstance(value, Node):
+            visit_method = self.visit_table.get(type(value))
+            if visit_method is None:
+                self.visit_children(value)
+            else:
+                visit_method(value)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                self.visit(item)
+        elif isinstance(value, dict):
+            # match/switch 的 key 也是节点
+            for key, item in value.items():
+                self.visit(key)
+                self.visit(item)
+
+    def visit_children(self, node):
+        for child in node.iter_children():
+            self.visit(child)
+
+    def without_scopes(self, visit, *args):
+        # 类和包是边界，里面的变量按名字查找
+        saved_scopes = self.scopes
+        self.scopes = []
+        try:
+            visit(*args)
+        finally:
+            self.scopes = saved_scopes
+
+    # ===========================解析规则===========================
+
+    def visit_function_declaration(self, node: FunctionDeclarationNode):
+        # 默认值和注解在定义函数的作用域中求值
+        self.visit(node.default_values)
+        self.visit(node.annotations)
+
+        scope = FunctionScope()
+        for arg in node.args:
+            scope.declare(arg)
+        # 先收集函数体中所有的局部变量，这样在赋值之前读取也能解析到同一个槽位
+        self.declare_block(node.body, scope.declare)
+        node.layout = scope.layout
+
+        self.scopes.append(scope)
+        try:
+            self.visit(node.body)
+        finally:
+            self.scopes.pop()
+        if scope.generator:
+            check_yield_positions(node.body)
+        node.generator = scope.generator
+
+    def visit_variable(self, node: VariableNode):
+        depth = 0
+        for scope in reversed(self.scopes):
+            if scope.in_block(node.value):
+                break
+            slot = scope.layout.get(node.value)
+            if slot is not None:
+                node.resolved = (depth, slot)
+                return
+            depth += 1
+        node.resolved = None
+
+    def visit_binary_op(self, node: BinaryOpNode):
+        # a + b + c + ... 是向左展开的链，沿 left 循环向下，不按链的长度递归
+        rights = []
+        while node.__class__ is BinaryOpNode:
+            rights.append(node.right)
+            node = node.left
+        self.visit(node)
+        for right in reversed(rights):
+            self.visit(right)
+
+    def visit_assignment(self, node: AssignmentNode):
+        if self.scopes:
+            scope = self.scopes[-1]
+            node.resolved = None if scope.in_block(node.name) else scope.layout.get(node.name)
+        self.visit(node.value)
+
+    def visit_loop_block(self, node):
+        # 迭代的对象(或者起止数字、步长)在进入循环的块作用域之前求值
+        if isinstance(node, ForInNode):
+            name = node.variable
+            self.visit(node.iteration_obj)
+        else:
+            name = node.var_name
+            self.visit([node.start_num, node.end_num, node.step])
+        if not self.scopes:
+            self.visit(node.body)
+            return
+        # 块作用域中的变量: 循环变量，和循环体中赋值、但不是函数的局部变量的名字
+        scope = self.scopes[-1]
+        names = set()
+        self.declare_block(node.body, names.add, loop_bodies=True)
+        block = {block_name for block_name in names if block_name not in scope.layout}
+        block.add(name)
+        scope.blocks.append(block)
+        try:
+            self.visit(node.body)
+        finally:
+            scope.blocks.pop()
+
+    def visit_yield(self, node: YieldNode):
+        # 函数外(全局、类的方法)的 yield 不能执行，解析时就报错，避免被外层的 try 吞掉
+        if not self.scopes:
+            raise yield_position_error(node)
+        self.scopes[-1].generator = True
+        self.visit(node.value)
+
+    def visit_class_declaration(self, node: ClassDeclarationNode):
+        def visit_class():
+            # 方法和 init 不是函数作用域，里面定义的函数才是
+            methods = list((node.methods or {}).values())
+            if isinstance(node.static_methods, dict):
+                methods += list(node.static_methods.values())
+            if node.init:
+                methods.append(node.init)
+            for method in methods:
+                self.visit(method.default_values)
+                self.visit(method.annotations)
+                self.visit(method.body)
+            self.visit(node.fields)
+            self.visit(node.static_fields)
+            self.visit(node.fields_annotations)
+
+        self.without_scopes(visit_class)
+
+    def visit_package_declaration(self, node: PackageDeclarationNode):
+        self.without_scopes(self.visit, node.package_body)
+
+    # ===========================收集局部变量===========================
+
+    def declare_block(self, statements, declare, loop_bodies=False):
+        """
+            对 statements 中赋值的每个变量名调用 declare(name)
+            loop_bodies=False 时不进入 for 循环: 循环变量和循环体中的变量属于循环的块作用域
+        """
+        for statement in statements:
+            if isinstance(statement, FunctionDeclarationNode):
+                # def inner(){} 定义的内部函数也是局部变量, 但不进入它的函数体
+                if statement.tag is None:
+                    declare(statement.name)
+            elif isinstance(statement, AssignmentNode):
+                declare(statement.name)
+            elif isinstance(statement, (ListDeconstructAssignNode, DecontructAssignNode)):
+                for name in statement.vars_list:
+                    if isinstance(name, str):
+                        declare(name)
+            elif isinstance(statement, ForInNode):
+                if loop_bodies:
+                    declare(statement.variable)
+                    self.declare_block(statement.body, declare, loop_bodies)
+            elif isinstance(statement, ForRangeNumberNode):
+                if loop_bodies:
+                    declare(statement.var_name)
+                    self.declare_block(statement.body, declare, loop_bodies)
+            elif isinstance(statement, (LoopNode, DoWhileNode)):
+                self.declare_block(statement.body, declare, loop_bodies)
+            elif isinstance(statement, IfStatementNode):
+                self.declare_block(statement.if_body, declare, loop_bodies)
+                for elif_dict in statement.elif_:
+                    self.declare_block(elif_dict['elif_statements'], declare, loop_bodies)
+                self.declare_block(statement.else_, declare, loop_bodies)
+            elif isinstance(statement, TryCatchFinallyNode):
+                self.declare_block(statement.try_block, declare, loop_bodies)
+                for catch_dict in statement.catch_block:
+                    for catch_statements in catch_dict.values():
+                        self.declare_block(catch_statements, declare, loop_bodies)
+                self.declare_block(statement.finally_block, declare, loop_bodies)
+            elif isinstance(statement, SwitchNode):
+                for case_statements in statement.cases.values():
+                    self.declare_block(case_statements, declare, loop_bodies)
+
+
+# ===========================检查 yield 的位置===========================
+
+def yield_position_error(node: YieldNode):
+    return sources.syntax_error("yield can only be used in a function body, directly or inside if/loop/for/do-while",
+                                node.position)
+
+
+def find_yield(value):
+    # value 中(不包括内部函数)的第一个 yield，没有返回 None
+    stack = list(iter_nodes(value))
+    while stack:
+        current = stack.pop()
+        if isinstance(current, YieldNode):
+            return current
+        if not isinstance(current, FunctionDeclarationNode):
+            stack.extend(current.iter_children())
+    return None
+
+
+def check_yield_positions(statements):
+    """
+        生成器函数体中的 yield 只能直接出现在函数体，或者 if/elif/else、loop、do-while、for 的循环体中(可以嵌套)，
+        这些位置由 Evaluator.generate_block 执行；
+        条件、迭代对象、try/catch、switch 等其他位置的 yield 不支持，报 SyntaxError
+    """
+    for statement in statements:
+        if isinstance(statement, YieldNode):
+            nested = find_yield(statement.value)
+        elif isinstance(statement, IfStatementNode):
+            nested = find_yield(statement.condition) or find_yield([elif_dict['condition'] for elif_dict in statement.elif_])
+            check_yield_positions(statement.if_body)
+            for elif_dict in statement.elif_:
+                check_yield_positions(elif_dict['elif_statements'])
+            check_yield_positions(statement.else_)
+        elif isinstance(statement, (LoopNode, DoWhileNode)):
+            nested = find_yield(statement.condition)
+            check_yield_positions(statement.body)
+        elif isinstance(statement, ForInNode):
+            nested = find_yield(statement.iteration_obj)
+            check_yield_positions(statement.body)
+        elif isinstance(statement, ForRangeNumberNode):
+            nested = find_yield([statement.start_num, statement.end_num, statement.step])
+            check_yield_positions(statement.body)
+        elif isinstance(statement, FunctionDeclarationNode):
+            nested = None
+        else:
+            nested = find_yield(statement)
+        if nested is not None:
+            raise yield_position_error(nested)
+
+
+# 测试Resolver
+if __name__ == '__main__':
+    code = """
+        let base = 10;
+        def outer(x){
+            let total = 0;
+            for(i: 1 to x){
+                total = total + i;
+            }
+            let add = lambda y: y + total + base;
+            return add(x);
+        }
+        @println(outer(4));
+    """
+    ast = Resolver().resolve(Parser(Tokenizer(code).tokenize()).parse())
+    outer = ast[1]
+    print("outer.layout: ", outer.layout)
+    print("lambda.layout: ", outer.body[2].value.layout)
@@ -0,0 +1,131 @@
+"""
+    作用域链(scope chain)
+
+    每一次函数调用、方法调用、for循环都会创建一个新的 Scope(帧)，帧里面只存放局部变量，
+    通过 parent 指向外层作用域，查找变量时沿着 parent 一层层向外查找。
+    这样函数调用的开销只和局部变量的个数有关，而和全局环境的大小无关
+    (以前是每次调用都 self.environment.copy() 一份全局环境)。
+
+    帧分为两类:
+        函数帧(is_function=True): 函数、方法、包、全局环境，赋值语句不会越过函数帧修改外层的变量
+        块帧(is_function=False): for 循环等代码块，赋值语句可以修改外层(同一个函数内)已经存在的变量
+
+    槽位(slot):
+        Resolver 给函数的参数和局部变量分配了下标(layout: {变量名: 下标})，
+        这样的函数帧把局部变量存放在 slots 列表中，按 (depth, slot) 直接访问，
+        同时也可以按名字访问(模板字符串、id++ 等仍然使用名字)
+"""
+
+# 槽位还没有赋值
+UNSET = object()
+_MISSING = object()
+
+
+class Scope:
+    __slots__ = ("vars", "parent", "is_function", "layout", "slots")
+
+    def __init__(self, variables: dict = None, parent: "Scope" = None, is_function=False, layout: dict = None,
+                 slots: list = None):
+        # 当前帧的局部变量
+        self.vars = {} if variables is None else variables
+        # 外层作用域
+        self.parent = parent
+        self.is_function = is_function
+        # 槽位布局 {变量名: 下标}，同一个函数的所有帧共用一个 layout
+        self.layout = layout
+        if layout is not None and slots is None:
+            slots = [UNSET] * len(layout)
+        self.slots = slots
+
+    def __getitem__(self, name):
+        scope = self
+        while scope is not None:
+            value = scope.vars.get(name, _MISSING)
+            if value is not _MISSING:
+                return value
+            if scope.layout is not None:
+                index = scope.layout.get(name)
+                if index is not None and scope.slots[index] is not UNSET:
+                    return scope.slots[index]
+            scope = scope.parent
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __setitem__(self, name, value):
+        """
+            赋值: 在当前函数内(直到最近的函数帧为止)查找变量，找到了就修改那一层的变量，
+            否则在当前帧中定义新变量(还没有赋值的槽位也算没有找到，和没有槽位时的结果一样)
+        """
+        scope = self
+        while scope is not None:
+            if name in scope.vars:
+                scope.vars[name] = value
+                return
+            if scope.layout is not None:
+                index = scope.layout.get(name)
+                if index is not None and scope.slots[index] is not UNSET:
+                    scope.slots[index] = value
+                    return
+            if scope.is_function:
+                break
+            scope = scope.parent
+        self.define(name, value)
+
+    def define(self, name, value):
+        # 直接在当前帧中定义变量，不查找外层
+        if self.layout is not None and name in self.layout:
+            self.slots[self.layout[name]] = value
+        else:
+            self.vars[name] = value
+
+    def update(self, variables: dict):
+        for name, value in variables.items():
+            self.define(name, value)
+
+    def items(self):
+        # 仅当前帧的变量
+        if self.layout is None:
+            return self.vars.items()
+        slotted = {name: self.slots[index] for name, index in self.layout.items() if self.slots[index] is not UNSET}
+        return {**self.vars, **slotted}.items()
+
+    # ===========================按槽位访问===========================
+
+    def function_frame(self):
+        # 最近的带槽位的函数帧
+        scope = self
+        while scope.slots is None:
+            scope = scope.parent
+        return scope
+
+    def load(self, depth, slot):
+        """
+            按 Resolver 给出的 (depth, slot) 读取变量，depth 是向外跨越的函数帧个数
+            变量还没有赋值时返回 UNSET
+        """
+        scope = self
+        while scope.slots is None:
+            scope = scope.parent
+        while depth:
+            scope = scope.parent
+            while scope.slots is None:
+                scope = scope.parent
+            depth -= 1
+        return scope.slots[slot]
+
+    def __repr__(self):
+        if self.layout is not None:
+            return f"Scope(vars={self.vars}, slots={dict(self.items())}, parent={self.parent})"
+        return f"Scope(vars={self.vars}, parent={self.parent})"
@@ -0,0 +1,172 @@
+import mmap
+from array import array
+from bisect import bisect_right
+
+"""
+goal:
+    源代码位置(文件、行、列)
+
+    token 和节点上不保存 (file, line, col) 三元组，只保存一个整数 position:
+        每个源代码(文件或者字符串)登记到 SourceSet 时分配一段连续的编号 [base, base + len(text)]，
+        position = base + 字符在源代码中的下标
+    这样一个 token 的位置只占 array('q') 中的 8 个字节，节点上也只多一个 int。
+    需要报错时才把 position 还原成 文件名:行:列:
+        1, 在各个文件的 base 中二分查找，得到文件(file id 就是文件在 SourceSet 中的下标)
+        2, 第一次还原时计算这个文件每一行开头的下标(line_starts)，然后二分查找得到行号，列号 = 下标 - 行首
+    行号和列号都从 1 开始。
+
+    文件源代码(FileSource): 用 mmap 映射文件，按行的边界一块一块地解码，整个文件不会被读成一个字符串。
+    这时 SourceFile.text 是 None，还原位置时才读取文件。
+
+use:
+    tokens = Tokenizer(code, "main.fight").tokenize()    # tokens.positions[i] 是第 i 个 token 的 position
+    tokenizer = Tokenizer.from_file("main.fight")         # 用 mmap 读取文件
+    sources.location(node.position)                      # SourceLocation(file_name="main.fight", line=3, column=5)
+    sources.describe(node.position)                      # "main.fight:3:5"
+"""
+
+
+class SourceLocation:
+    __slots__ = ("file_name", "line", "column", "line_text")
+
+    def __init__(self, file_name, line, column, line_text):
+        self.file_name = file_name
+        self.line = line
+        self.column = column
+        self.line_text = line_text
+
+    def __str__(self):
+        return f"{self.file_name}:{self.line}:{self.column}"
+
+    def __repr__(self):
+        return f"SourceLocation(file_name={self.file_name}, line={self.line}, column={self.column})"
+
+
+class SourceFile:
+    __slots__ = ("file_id", "name", "text", "base", "line_starts", "path")
+
+    def __init__(self, file_id, name, text, base, path=None):
+        self.file_id = file_id
+        self.name = name
+        # 源代码字符串; 从文件流式读取时是 None，需要时再从 path 读取
+        self.text = text
+        self.base = base
+        self.path = path
+        # 每一行开头的下标，第一次还原位置时才计算
+        self.line_starts = None
+
+    def location(self, offset):
+        if self.text is None:
+            with open(self.path, encoding="utf-8") as source:
+                self.text = source.read()
+        if self.line_starts is None:
+            line_starts = array('q', [0])
+            find = self.text.find
+            index = find('\n')
+            while index != -1:
+                line_starts.append(index + 1)
+                index = find('\n', index + 1)
+            self.line_starts = line_starts
+        line = bisect_right(self.line_starts, offset)
+        line_start = self.line_starts[line - 1]
+        line_end = self.text.find('\n', line_start)
+        line_text = self.text[line_start:] if line_end == -1 else self.text[line_start:line_end]
+        return SourceLocation(self.name, line, offset - line_start + 1, line_text)
+
+    def __repr__(self):
+        return f"SourceFile(file_id={self.file_id}, name={self.name}, base={self.base})"
+
+
+class SourceSet:
+    def __init__(self):
+        self.files = []
+        # 各个文件的 base，递增，用于二分查找
+        self.bases = []
+        self.next_base = 0
+
+    def add(self, name, text, size=None, path=None, base=None):
+        """
+            登记一个源代码，返回 SourceFile，其中字符 i 的 position 是 base + i
+            从文件流式读取时 text 是 None，size 是文件的字节数(不小于字符数)
+            base: 希望使用的 base(比如 AST 缓存中记录的 base)，不能和已经登记的源代码重叠，否则分配新的 base
+        """
+        if base is None or base < self.next_base:
+            base = self.next_base
+        source_file = SourceFile(len(self.files), name, text, base, path)
+        self.files.append(source_file)
+        self.bases.append(base)
+        # +1: 文件末尾(EOF)也有一个位置
+        self.next_base = base + (len(text) if size is None else size) + 1
+        return source_file
+
+    def add_file(self, file_source: "FileSource"):
+        return self.add(file_source.path, None, file_source.size, file_source.path)
+
+    def file_of(self, position):
+        return self.files[bisect_right(self.bases, position) - 1]
+
+    def location(self, position):
+        # position -> SourceLocation, 没有位置信息时返回 None
+        if position is None or not self.files or position < 0:
+            return None
+        source_file = self.file_of(position)
+        return source_file.location(position - source_file.base)
+
+    def describe(self, position):
+        location = self.location(position)
+        return "" if location is None else str(location)
+
+    def where(self, position):
+        # 拼接在错误信息后面: " (at main.fight:3:5)"，没有位置信息时是空字符串
+        location = self.location(position)
+        return "" if location is None else f" (at {location})"
+
+    def syntax_error(self, message, position):
+        # 带有文件名、行号、列号和所在行的 SyntaxError
+        location = self.location(position)
+        if location is None:
+            return SyntaxError(message)
+        return SyntaxError(message, (location.file_name, location.line, location.column, location.line_text))
+
+
+# 每次从文件中解码的字节数(在这之后的第一个换行处截断)
+CHUNK_SIZE = 1 << 20
+
+
+class FileSource:
+    """
+        用 mmap 读取的 UTF-8 源文件，chunks() 按顺序产生解码后的字符串块
+        每一块都在换行符之后结束(最后一块除外)，所以除了跨行的字符串，token 不会被截断在两块之间
+        同一时间内存中只有一块的 bytes 和 str，而不是整个文件
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        with open(path, "rb") as source:
+            source.seek(0, 2)
+            self.size = source.tell()
+
+    def chunks(self):
+        if self.size == 0:
+            return
+        with open(self.path, "rb") as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            start = 0
+            size = len(buffer)
+            while start < size:
+                end = start + self.chunk_size
+                if end < size:
+                    newline = buffer.find(b"\n", end)
+                    end = size if newline == -1 else newline + 1
+                else:
+                    end = size
+                # UTF-8 的多字节字符中不会出现 b"\n"，所以在换行处截断不会截断字符
+                yield buffer[start:end].decode("utf-8")
+                start = end
+
+    def __repr__(self):
+        return f"FileSource(path={self.path}, size={self.size})"
+
+
+# 全局的 SourceSet, Tokenizer 登记源代码, Parser 和 Evaluator 用它还原位置
+sources = SourceSet()
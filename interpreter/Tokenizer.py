@@ -1,7 +1,10 @@
 import re
+from array import array
 
 from typing import List, Tuple
 
+from interpreter.Source import sources, FileSource, CHUNK_SIZE
+
 """
 
 大类别：
@@ -64,120 +67,125 @@ from typing import List, Tuple
 
 """
 
+"""
+实现:
+    以前 tokenize 通过 advance() 一个字符一个字符地移动，用 result += char 拼出标识符、数字、字符串，
+    在关键字列表中线性查找，运算符要经过一长串 elif 才能确定。
+    现在用一个编译好的正则 TOKEN_PATTERN 从当前位置匹配下一个词素(空白、标识符、数字、字符串、负号、运算符)，
+    直接对源代码切片，关键字查 frozenset，运算符查字典(同一种运算符的 token 元组共用一个对象)。
+    产生的 token 和以前完全一样:
+        标识符: 字母开头(isalpha)，后面是字母或数字(isalnum)，下划线是单独的 UNDERLINE
+        数字: 数字开头，后面是数字或小数点，含有小数点的是 ('NUMBER', '3.5', 'FLOAT')
+        负号: '--' 是两个 MINUS; 前一个 token 是运算符、比较符、(、,、;、{ 或者没有 token 时，'-' 和后面的数字一起作为负数
+"""
+
+KEYWORDS = frozenset(["const", 'lambda', 'let', 'if', "for", "in", 'else', "elif", 'break', 'continue', 'loop', "def",
+                      'function', 'return', 'yield', "package", "module", "from", "import", "class", "init", "new",
+                      "fields", "methods",
+                      "this", "static", "match", "switch", "case", "default", "extends", "interface",
+                      "implements", "range", "to", "do", "while",
+                      "catch", "try", "finally", "as", "set", "struct", "enum", "annotation",
+                      ])
+LOGIC_OPERATORS = frozenset(['and', 'or', 'not'])
+BOOLS = frozenset(['True', 'False'])
+
+# 关键字、逻辑运算符、布尔值 -> token
+WORD_TOKENS = {
+    **{word: ('BOOL', word) for word in BOOLS},
+    **{word: (word.upper(), word) for word in LOGIC_OPERATORS},
+    **{word: ('KEYWORD', word) for word in KEYWORDS},
+}
+
+# 运算符和括号 -> token
+OPERATOR_TOKENS = {
+    '==': ('EQ', '=='), '!=': ('NEQ', '!='), '<=': ('LE', '<='), '>=': ('GE', '>='), '//': ('FLOOR_DIV', '//'),
+    '=': ('ASSIGN', '='), '<': ('LT', '<'), '>': ('GT', '>'),
+    '+': ('PLUS', '+'), '*': ('MUL', '*'), '/': ('DIV', '/'), '^': ('POW', '^'), '%': ('MOD', '%'),
+    ';': ('END', ';'), ',': ('COMMA', ','), ':': ('COLON', ':'),
+    '(': ('LPAREN', '('), ')': ('RPAREN', ')'), '[': ('LBRACKET', '['), ']': ('RBRACKET', ']'),
+    '{': ('LBRACE', '{'), '}': ('RBRACE', '}'),
+    '.': ('DOT', '.'), '_': ('UNDERLINE', '_'), '#': ('COMMENT', '#'), '?': ('QUESTION', '?'),
+    '&': ('COMBINE', '&'), '$': ('DOLLAR', '$'), '@': ('FUNCTION_CALL_PREFIX', '@'),
+}
+MINUS_TOKEN = ('MINUS', '-')
+
+# 前一个 token 是这些类型(或者还没有 token)时，'-' 是负号，否则是减号
+NEGATIVE_CONTEXT = frozenset({'ASSIGN', 'PLUS', 'MINUS', 'MUL', 'DIV', 'EQ', 'NEQ', 'LT', 'LE', 'GT', 'GE', 'LPAREN',
+                              'COMMA', 'END', "LBRACE"})
+
+# 开头的空白直接跳过; [^\W_] 正好是 str.isalnum() 的字符; [^\W\d_] 是去掉十进制数字的 isalnum() 字符
+# 两个字符的运算符写在前面，保证最长匹配
+TOKEN_PATTERN = re.compile(
+    r'\s*(?:'
+    r'(?P<NAME>[^\W\d_][^\W_]*)'
+    r'|(?P<OPERATOR>==|!=|<=|>=|//|[=<>+*/^%;,:()\[\]{}.#?&$@_])'
+    r'|(?P<NUMBER>\d[\d.]*)'
+    r'|(?P<STRING>"[^"]*")'
+    r'|(?P<MINUS>-)'
+    r'|\Z)'
+)
+NUMBER_BODY = re.compile(r'[\d.]*')
+
+# 流式读取时每一批 token 覆盖的字符数
+BATCH_CHARS = 4096
+# TokenStream 保留当前下标之前的 token 数(Parser 最多向后看 2 个 token: tokens[self.pos - 2])
+KEEP_BEHIND = 8
+
+
+def number_end(source, pos):
+    # 从 pos 开始的数字和小数点的结束位置; \d 只匹配十进制数字，其他 isdigit() 的字符(比如 ²)在这里逐个跳过
+    end = NUMBER_BODY.match(source, pos).end()
+    while end < len(source) and source[end].isdigit():
+        end = NUMBER_BODY.match(source, end + 1).end()
+    return end
+
+
+class TokenList(list):
+    """
+        tokenize() 的结果，和以前一样是 token 元组的列表，
+        另外带着和 token 一一对应的位置 positions(array('q'), 见 Source.py) 和源代码 source_file
+    """
+    __slots__ = ("positions", "source_file")
+
+    def __init__(self, tokens=(), positions=None, source_file=None):
+        super().__init__(tokens)
+        self.positions = array('q') if positions is None else positions
+        self.source_file = source_file
+
+
+def number_token(lexeme):
+    if '.' in lexeme:
+        return 'NUMBER', lexeme, "FLOAT"
+    return 'NUMBER', lexeme
+
 
 class Tokenizer:
-    def __init__(self, source_code):
-        # source_code: 待解析的源代码
+    def __init__(self, source_code, file_name="<string>", file_source: FileSource = None):
+        # source_code: 待解析的源代码; 从文件流式读取时是 None，源代码来自 file_source
         self.source_code: str = source_code
+        self.file_source = file_source
+        # 登记源代码，token 的位置是 source_file.base + 下标
+        if file_source is None:
+            self.source_file = sources.add(file_name, source_code)
+        else:
+            self.source_file = sources.add_file(file_source)
         # pos: 当前位置
         self.pos: int = 0
-        # current_char: 当前字符
-        self.current_char: str = self.source_code[self.pos] if self.source_code else None
-        """
-               LET: 声明变量 let
-               IF: 条件判断 if
-               ELIF: 条件判断 elif
-               ELSE: 条件判断 else
-               BREAK: 跳出循环 break
-               LOOP: 循环 loop
-               FUNCTION: 定义函数 function
-               RETURN: 返回值 return
-               
-              
-        """
+        # 上一批 token 的最后一个 token 的类型(分批扫描时判断 '-' 是不是负号); 还没有 token 时和 ';' 之后一样是负号
+        self.prev_type = 'END'
+        self.keywords = KEYWORDS
+        self.logic_operators = LOGIC_OPERATORS
+        self.bool = BOOLS
 
-        self.keywords: List[str] = ["const", 'lambda', 'let', 'if', "for", "in", 'else', "elif", 'break', 'loop', "def",
-                                    'function', 'return', "package", "module", "from", "import", "class", "init", "new",
-                                    "fields", "methods",
-                                    "this", "static", "match", "switch", "case", "default", "extends", "interface",
-                                    "implements", "range", "to","do","while",
-                                    "catch", "try", "finally", "as","set","struct","enum","annotation",
-                                    ]
-        self.logic_operators: List[str] = ['and', 'or', 'not']
-        self.bool = ['True', 'False']
-
-    def advance(self):
-        # 指向下一个字符
-        self.pos += 1
-        if self.pos < len(self.source_code):
-            # index方式获取下一个字符
-            self.current_char = self.source_code[self.pos]
-        else:
-            self.current_char = None
-
-    def get_boolean_token(self, result):
-        if result == 'True':
-            return 'True'
-        if result == 'False':
-            return "False"
-
-    def logic(self, result):
-        if result == 'and':
-            return 'AND', result
-        elif result == 'or':
-            return 'OR', result
-        elif result == 'not':
-            return 'NOT', result
-
-    def identifier_or_keyword(self):
-        # 标识符: 字母开头，后面可以是字母、数字
-        result = ''
-        # 第一个字符必须是字母,该方法会一直读取当前字符，直到遇到一个不是字母或数字的字符为止
-        while self.current_char is not None and self.current_char.isalnum():
-            result += self.current_char
-            self.advance()
-        # 判断是否是关键字（因为关键字和标识符不能都采用字母开头，然后是字母、数字）
-        if result in self.keywords:
-            return 'KEYWORD', result
-        # and or not
-        if result in self.logic_operators:
-            return self.logic(result)
-        # true false
-        if result in self.bool:
-            return 'BOOL', self.get_boolean_token(result)
-        else:
-            return 'ID', result
-
-    def number(self):
-        # result = ''
-        # while self.current_char is not None and self.current_char.isdigit() or self.current_char == '.':
-        #     result += self.current_char
-        #     self.advance()
-        # if '.' in result:
-        #     # 浮点数
-        #     return ('NUMBER', result,"FLOAT")
-        # else:
-        #     # 整数
-        #     return 'NUMBER', result
-        result = ''
-        if self.current_char == '-':
-            result += self.current_char
-            self.advance()
-        while self.current_char is not None and (self.current_char.isdigit() or (self.current_char == '.')):
-            result += self.current_char
-            self.advance()
-        if '.' in result:
-            return 'NUMBER', result, "FLOAT"
-        else:
-            return 'NUMBER', result
-
-    def get_string_token(self):
-        result = ''
-        self.pos += 1
-        self.current_char = self.source_code[self.pos]
-        while self.current_char != '"':
-            result += self.current_char
-            self.advance()
-        self.advance()
-        return str(result)
+    @classmethod
+    def from_file(cls, path, chunk_size=CHUNK_SIZE):
+        # 用 mmap 读取源文件，不把整个文件读成一个字符串
+        return cls(None, path, FileSource(path, chunk_size))
 
     def tokenize(self):
         '''
-            通过第一个字符判断是说明，然后进入具体的判断方法
-            token的元素的格式为(token_type, token_value), 可以考虑设计为：
-                (token_type, token_value,field)
-                field指的是更大的范围，比如operator, comparison, logic, brackets等,
-                实现粗粒度和细粒度的token分类
+            用 TOKEN_PATTERN 从当前位置匹配下一个词素，根据匹配到的分组生成 token
+            token的元素的格式为(token_type, token_value), 浮点数是 ('NUMBER', value, 'FLOAT')
             token_type:
                     标识符: ID
                     关键字: KEYWORD
@@ -185,7 +193,7 @@ class Tokenizer:
                     字面量(CONSTANT)：
                         数字: NUMBER
                         字符串: STRING
-                        布尔值: BOOLEAN
+                        布尔值: BOOL
                     运算符(OPERATOR)
                         算术符号: PLUS, MINUS, MUL, DIV, MOD, FLOOR_DIV, POW
                     比较运算符(COMPARISON):
@@ -197,166 +205,209 @@ class Tokenizer:
                     其他：
                         赋值符号: ASSIGN
             token_value: 具体的token值
-
+            返回 TokenList, tokens.positions[i] 是第 i 个 token 开始的位置
         '''
-        tokens: List[Tuple[str, any]] = []
+        self.prev_type = 'END'
+        if self.file_source is None:
+            tokens = TokenList(source_file=self.source_file)
+            self.pos = self.scan(self.source_code, 0, len(self.source_code), tokens, self.source_file.base, True)
+            return tokens
+        tokens = TokenList(source_file=self.source_file)
+        for batch in self.batches():
+            tokens.extend(batch)
+            tokens.positions.extend(batch.positions)
+        return tokens
 
-        while self.current_char is not None:
-            if self.current_char.isspace():
-                self.advance()
+    def stream(self, batch_chars=BATCH_CHARS):
+        # 按需产生 token 的 TokenStream，Parser 可以一边读取 token 一边解析
+        self.prev_type = 'END'
+        return TokenStream(self.batches(batch_chars), self.source_file)
 
-            elif self.current_char.isalpha():
-                tokens.append(self.identifier_or_keyword())
+    def chunks(self):
+        if self.file_source is None:
+            yield self.source_code
+        else:
+            yield from self.file_source.chunks()
 
+    def batches(self, batch_chars=BATCH_CHARS):
+        """
+            按顺序产生一批一批的 token(TokenList)，每一批大约覆盖源代码中的 batch_chars 个字符
+            跨越两块的字符串(字符串中有换行)会和下一块拼接起来再扫描
+        """
+        chunks = self.chunks()
+        chunk = next(chunks, None)
+        # text[0] 在源代码中的下标
+        text_offset = 0
+        leftover = ''
+        while chunk is not None:
+            text = leftover + chunk if leftover else chunk
+            chunk = next(chunks, None)
+            final = chunk is None
+            base = self.source_file.base + text_offset
+            length = len(text)
+            pos = 0
+            while pos < length:
+                tokens = TokenList(source_file=self.source_file)
+                end = self.scan(text, pos, min(length, pos + batch_chars), tokens, base, final)
+                if tokens:
+                    yield tokens
+                if end == pos:
+                    # 字符串在这一块中没有结束
+                    break
+                pos = end
+            leftover = text[pos:]
+            text_offset += pos
+        self.pos = text_offset
+
+    def scan(self, source, pos, stop, tokens, base, final):
+        """
+            从 source[pos] 开始扫描，直到 stop 之后的第一个 token 结束，token 和位置追加到 tokens 中，返回扫描到的位置
+            base: source[0] 的 position; final: source 后面没有更多的源代码了
+            不是 final 时遇到没有结束的字符串就停下来，返回字符串开始的位置
+        """
+        length = len(source)
+        match = TOKEN_PATTERN.match
+        word_tokens = WORD_TOKENS
+        operator_tokens = OPERATOR_TOKENS
+        append = tokens.append
+        mark = tokens.positions.append
+
+        while pos < stop:
+            m = match(source, pos)
+            if m is None:
+                # 跳过空白之后的字符不能解析
+                pos = length - len(source[pos:].lstrip())
+                if source[pos] == '"':
+                    if not final:
+                        break
+                    raise sources.syntax_error("Unterminated string", base + pos)
+                raise sources.syntax_error(f"Unexpected character: {source[pos]}", base + pos)
+            kind = m.lastgroup
+            end = m.end()
+            if kind is None:
+                # 只剩下空白
+                pos = end
+                break
+            lexeme = m.group(kind)
+            pos = end - len(lexeme)
+            mark(base + pos)
+
+            if kind == 'NAME':
+                word = lexeme
+                if word[0] > '\x7f' and not word[0].isalpha():
+                    # 非十进制的数字字符(比如 ²)开头是数字，其他不是字母的字符(比如 ½)不能开头
+                    if not word[0].isdigit():
+                        raise sources.syntax_error(f"Unexpected character: {word[0]}", base + pos)
+                    end = number_end(source, pos)
+                    append(number_token(source[pos:end]))
+                else:
+                    append(word_tokens.get(word) or ('ID', word))
+
+            elif kind == 'OPERATOR':
+                append(operator_tokens[lexeme])
+
+            elif kind == 'NUMBER':
+                if end < length and source[end].isdigit():
+                    end = number_end(source, end)
+                append(number_token(source[pos:end]))
+
+            elif kind == 'STRING':
+                append(('STRING', lexeme[1:-1]))
+
+            elif kind == 'MINUS':
+                # --
+                if source.startswith('-', end):
+                    append(MINUS_TOKEN)
+                    append(MINUS_TOKEN)
+                    mark(base + end)
+                    end += 1
+                # 负数
+                elif (tokens[-1][0] if tokens else self.prev_type) in NEGATIVE_CONTEXT:
+                    end = number_end(source, end)
+                    append(number_token(source[pos:end]))
+                # 减号
+                else:
+                    append(MINUS_TOKEN)
 
-            elif self.current_char.isdigit():
-                tokens.append(self.number())
+            pos = end
 
-            # --
-            elif self.current_char == '-' and self.source_code[self.pos + 1] == "-":
-                tokens.append(("MINUS", self.current_char))
-                self.advance()
-                tokens.append(("MINUS", self.current_char))
-                self.advance()
+        if tokens:
+            self.prev_type = tokens[-1][0]
+        return pos
 
-            elif self.current_char == '-':
-                # tokens[-1]表示上一个token，如果上一个token是赋值、加、减、乘、除、等于、不等于、小于、小于等于、大于、大于等于、左括号、逗号
-                # 、语句结束符，则认为是负号，否则认为是减号
 
-                if (len(tokens) == 0 or tokens[-1][0] in {'ASSIGN', 'PLUS', 'MINUS', 'MUL', 'DIV', 'EQ',
-                                                          'NEQ', 'LT', 'LE', 'GT', 'GE', 'LPAREN',
-                                                          'COMMA', 'END', "LBRACE"}):
-                    tokens.append(self.number())  # Treat as negative number
+class StreamPositions:
+    # TokenStream 中 token 的位置，按 token 的下标访问(和 TokenList.positions 一样)，-1 是最后读到的 token 的位置
+    __slots__ = ("stream",)
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __getitem__(self, index):
+        stream = self.stream
+        if index < 0:
+            return stream.window_positions[index]
+        stream.fill(index)
+        return stream.window_positions[index - stream.start]
+
+
+class TokenStream:
+    """
+        按需从 Tokenizer.batches() 读取 token 的滑动窗口，Parser 按 token 的下标访问(tokens[self.pos + k])
+        Parser 最多向前看 4 个 token、向后看 2 个 token，所以读取新的一批 token 时，
+        比当前访问的下标小 KEEP_BEHIND 以上的 token 就丢掉了，窗口的大小不超过 一批 + KEEP_BEHIND 个 token
+        访问已经丢掉的 token 会抛出 IndexError
+    """
+
+    def __init__(self, batches, source_file=None):
+        self.batches = batches
+        self.source_file = source_file
+        # 窗口中的 token 和位置, window[0] 的下标是 start
+        self.window = []
+        self.window_positions = array('q')
+        self.start = 0
+        self.positions = StreamPositions(self)
+
+    def fill(self, index):
+        # 读取 token 直到窗口中包含 index，没有更多的 token 时返回 False
+        window = self.window
+        while index >= self.start + len(window):
+            batch = next(self.batches, None)
+            if batch is None:
+                return False
+            release = min(index - KEEP_BEHIND - self.start, len(window))
+            if release > 0:
+                del window[:release]
+                del self.window_positions[:release]
+                self.start += release
+            window.extend(batch)
+            self.window_positions.extend(batch.positions)
+        return True
+
+    def __getitem__(self, index):
+        offset = index - self.start
+        if offset < 0:
+            raise IndexError(f"token {index} has been released by the token stream (window starts at {self.start})")
+        window = self.window
+        if offset < len(window):
+            return window[offset]
+        if not self.fill(index):
+            raise IndexError("token index out of range")
+        return window[index - self.start]
+
+    def __iter__(self):
+        index = 0
+        while True:
+            try:
+                yield self[index]
+            except IndexError:
+                return
+            index += 1
+
+    def __repr__(self):
+        return f"TokenStream(start={self.start}, window={len(self.window)})"
 
 
-                else:
-                    tokens.append(('MINUS', self.current_char))  # Treat as subtraction
-                    self.advance()
-
-
-            # $美元符号
-            elif self.current_char == '$':
-                tokens.append(('DOLLAR', self.current_char))
-                self.advance()
-
-            # # 函数调用
-            elif self.current_char == '@':
-                tokens.append(('FUNCTION_CALL_PREFIX', self.current_char))
-                self.advance()
-
-            # ******************字符串**********
-            elif self.current_char == '"':
-                tokens.append(('STRING', self.get_string_token()))
-
-            # ***********************逻辑运算符**********************************************
-            elif self.current_char == '=' and self.source_code[self.pos + 1] != '=':
-                # =
-                tokens.append(('ASSIGN', self.current_char))
-                self.advance()
-            elif self.current_char == '=' and self.source_code[self.pos + 1] == '=':
-                # ==
-                tokens.append(('EQ', '=='))
-                self.advance()
-                self.advance()
-            elif self.current_char == '!' and self.source_code[self.pos + 1] == '=':
-                # !=
-                tokens.append(('NEQ', '!='))
-                self.advance()
-                self.advance()
-            elif self.current_char == '<' and self.source_code[self.pos + 1] == '=':
-                # <=
-                tokens.append(('LE', '<='))
-                self.advance()
-                self.advance()
-            elif self.current_char == '>' and self.source_code[self.pos + 1] == '=':
-                # >=
-                tokens.append(('GE', '>='))
-                self.advance()
-                self.advance()
-            elif self.current_char == '<':
-                # <
-                tokens.append(('LT', '<'))
-                self.advance()
-            elif self.current_char == '>':
-                # >
-                tokens.append(('GT', '>'))
-                self.advance()
-
-            # ***************** ****算术运算符号****************************************
-            elif self.current_char == '+':
-                tokens.append(('PLUS', self.current_char))
-                self.advance()
-            # elif self.current_char == '-':
-            #     tokens.append(('MINUS', self.current_char))
-            #     self.advance()
-            elif self.current_char == '*':
-                tokens.append(('MUL', self.current_char))
-                self.advance()
-            elif self.current_char == '/' and self.source_code[self.pos + 1] != '/':
-                tokens.append(('DIV', self.current_char))
-                self.advance()
-            elif self.current_char == '^':
-                # 幂运算符
-                tokens.append(('POW', self.current_char))
-                self.advance()
-            elif self.current_char == '%':
-                # 取余运算符
-                tokens.append(('MOD', self.current_char))
-                self.advance()
-            elif self.current_char == '/' and self.source_code[self.pos + 1] == '/':
-                # 向下取整  比如 10//3 = 3
-                tokens.append(('FLOOR_DIV', "//"))
-                self.advance()
-                self.advance()
-
-            # ******************几种括号****************************************
-            elif self.current_char == ';':
-                tokens.append(('END', self.current_char))
-                self.advance()
-            elif self.current_char == ',':
-                tokens.append(('COMMA', self.current_char))
-                self.advance()
-            elif self.current_char == ':':
-                tokens.append(('COLON', self.current_char))
-                self.advance()
-            elif self.current_char == '(':
-                tokens.append(('LPAREN', self.current_char))
-                self.advance()
-            elif self.current_char == ')':
-                tokens.append(('RPAREN', self.current_char))
-                self.advance()
-            elif self.current_char == '[':
-                tokens.append(('LBRACKET', self.current_char))
-                self.advance()
-            elif self.current_char == ']':
-                tokens.append(('RBRACKET', self.current_char))
-                self.advance()
-            elif self.current_char == '{':
-                tokens.append(('LBRACE', self.current_char))
-                self.advance()
-            elif self.current_char == '}':
-                tokens.append(('RBRACE', self.current_char))
-                self.advance()
-            elif self.current_char == '.':
-                tokens.append(('DOT', self.current_char))
-                self.advance()
-            elif self.current_char == '_':
-                tokens.append(('UNDERLINE', self.current_char))
-                self.advance()
-            elif self.current_char == '#':
-                tokens.append(('COMMENT', self.current_char))
-                self.advance()
-            elif self.current_char == '?':
-                tokens.append(('QUESTION', self.current_char))
-                self.advance()
-            elif self.current_char == '&':
-                tokens.append(('COMBINE', self.current_char))
-                self.advance()
-            else:
-                raise SyntaxError(f"Unexpected character: {self.current_char}")
-                # tokens.append(('Nothing', self.current_char))
-                # self.advance()
-        return tokens
 """
     负数的解析是相对复杂的，需要考虑多种情况，现在基本考虑完全了，但是还有一些细节需要完善，
     如果遇到不能解析符号的，需要完善解析机制
@@ -366,9 +417,9 @@ if __name__ == '__main__':
 
     source_code = """
           do{
+            let x = -3.5 + a_b - -2;
             
-            
-          }while()
+          }while(x != 10 // 3)
           
     """
 
@@ -0,0 +1,109 @@
+import os
+import sys
+
+"""
+goal:
+    分级的诊断/跟踪输出
+
+    以前 Evaluator 和 Parser 在热路径上直接 print 调试信息(condition_value、node.name、方法调用的参数...)，
+    这些输出既影响速度又混在程序自己的输出里。现在它们都交给 tracer，默认关闭:
+
+        tracer.debug("class_dict: ", class_dict)           # 关闭时只是一次方法调用和一次整数比较
+        if tracer.level >= TRACE:                           # 热路径上先判断级别，连参数都不用准备
+            tracer.trace("condition_value: ", condition_value)
+
+    级别(从低到高): OFF < INFO < DEBUG < TRACE，输出 级别 <= tracer.level 的信息
+        INFO:  少量的概要信息
+        DEBUG: 类、枚举、结构体、反射函数等内部状态
+        TRACE: 每次求值都会产生的信息(条件的值、函数声明、方法调用的参数、Parser 的中间结果)
+
+    不修改代码开启跟踪:
+        FIGHT_TRACE=debug python -m interpreter.main             # 级别: off/info/debug/trace 或 0-3
+        FIGHT_TRACE=trace FIGHT_TRACE_FILE=trace.log python ...  # 写到文件, 默认写到 stderr
+    代码中:
+        tracer.configure(level=DEBUG, sink=my_list.append)      # sink 接收一行文本(不含换行)
+"""
+
+OFF = 0
+INFO = 1
+DEBUG = 2
+TRACE = 3
+
+LEVEL_NAMES = {"off": OFF, "info": INFO, "debug": DEBUG, "trace": TRACE}
+
+
+def parse_level(value):
+    # "debug" / "DEBUG" / "2" -> 2, 空值 -> OFF
+    if value is None or value == "":
+        return OFF
+    if isinstance(value, int):
+        return value
+    value = value.strip().lower()
+    if value.isdigit():
+        return int(value)
+    if value not in LEVEL_NAMES:
+        raise ValueError(f"Unknown trace level: {value}, expected one of {list(LEVEL_NAMES)}")
+    return LEVEL_NAMES[value]
+
+
+class Tracer:
+    __slots__ = ("level", "sink")
+
+    def __init__(self, level=OFF, sink=None):
+        self.level = level
+        self.sink = sink if sink is not None else self.write_stderr
+
+    def configure(self, level=None, sink=None):
+        if level is not None:
+            self.level = parse_level(level)
+        if sink is not None:
+            self.sink = sink
+
+    def enabled(self, level):
+        return self.level >= level
+
+    def emit(self, level, args):
+        if self.level >= level:
+            self.sink(" ".join(str(arg) for arg in args))
+
+    def info(self, *args):
+        if self.level >= INFO:
+            self.emit(INFO, args)
+
+    def debug(self, *args):
+        if self.level >= DEBUG:
+            self.emit(DEBUG, args)
+
+    def trace(self, *args):
+        if self.level >= TRACE:
+            self.emit(TRACE, args)
+
+    @staticmethod
+    def write_stderr(line):
+        sys.stderr.write(line + "\n")
+
+
+def file_sink(path):
+    # 把跟踪信息追加写到文件中
+    trace_file = open(path, "a", encoding="utf-8")
+
+    def write(line):
+        trace_file.write(line + "\n")
+        trace_file.flush()
+
+    return write
+
+
+def tracer_from_environment(environ=os.environ):
+    # 环境变量写错了不能让解释器在导入时就失败: 警告一次，按 off 处理
+    try:
+        level = parse_level(environ.get("FIGHT_TRACE"))
+    except ValueError as error:
+        sys.stderr.write(f"warning: FIGHT_TRACE ignored, tracing is off: {error}\n")
+        level = OFF
+    path = environ.get("FIGHT_TRACE_FILE")
+    return Tracer(level, file_sink(path) if path and level > OFF else None)
+
+
+# 全局的 tracer, Evaluator 和 Parser 共用
+tracer = tracer_from_environment()
@@ -0,0 +1,470 @@
+import contextlib
+import io
+import sys
+
+from interpreter.Bytecode import BytecodeCompiler, CodeObject, disassemble, OPCODE_NAMES, LOAD_CONST, LOAD_FAST, STORE_FAST, \
+    LOAD_NAME, STORE_NAME, STORE_CONST_NAME, BINARY_OP, UNARY_NOT, BUILD_LIST, BUILD_OBJECT, POP_TOP, DUP_TOP, JUMP, \
+    POP_JUMP_IF_FALSE, POP_JUMP_IF_TRUE, RANGE_ITER, GET_ITER, FOR_ITER, PUSH_BLOCK, POP_BLOCK, INC_NAME, INC_FAST, \
+    EVAL_NODE, EVAL_STMT, RETURN_VALUE, DEFINE_NAME, EXIT_STATEMENT
+from interpreter.Evaluator import Evaluator, ControlSignal, RETURN_SIGNAL, BREAK_SIGNAL, number_range, BINARY_OPERATORS
+from interpreter.Parser import Parser
+from interpreter.Resolver import Resolver
+from interpreter.Scope import Scope
+from interpreter.Tokenizer import Tokenizer
+
+"""
+goal:
+    执行 Bytecode.py 编译出来的字节码的栈式虚拟机
+
+    VM 和 Evaluator 共用同一个 environment(作用域链)，
+    EVAL_NODE / EVAL_STMT 指令直接交给 Evaluator 执行，所以 Evaluator 仍然是参考实现，
+    run_differential() 可以把同一段程序分别交给 Evaluator 和 VM 执行并比较结果，
+    DIFFERENTIAL_CASES / BYTECODE_CASES 是差分测试用例，python -m interpreter.VM 执行全部用例
+
+    限制(实验性的执行后端): 和 Compiler.py 一样只编译顶层语句，函数体、方法体在调用时由 Evaluator 解释执行，
+    只有顶层的循环、赋值、表达式在 VM 上执行
+
+use:
+    python -m interpreter.main hello.fight --backend vm
+    python -m interpreter.VM     # 差分测试
+"""
+
+# 迭代结束的标记
+_EXHAUSTED = object()
+
+
+class VM:
+    def __init__(self, evaluator: Evaluator = None):
+        self.evaluator = evaluator if evaluator is not None else Evaluator()
+
+    def run(self, code: CodeObject):
+        evaluator = self.evaluator
+        instructions = code.instructions
+        consts = code.consts
+        names = code.names
+        slots = [None] * len(code.slot_names)
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        operators = BINARY_OPERATORS
+        evaluate = evaluator.evaluate
+
+        # 出错时也要恢复进入 VM 之前的作用域
+        saved_environment = evaluator.environment
+        pc = 0
+        try:
+            while True:
+                opcode, arg = instructions[pc]
+                pc += 1
+                # 常用的指令放在前面
+                if opcode == LOAD_FAST:
+                    push(slots[arg])
+                elif opcode == LOAD_CONST:
+                    push(consts[arg])
+                elif opcode == LOAD_NAME:
+                    try:
+                        push(evaluator.environment[names[arg]])
+                    except KeyError:
+                        raise NameError(f"Variable '{names[arg]}' not defined") from None
+                elif opcode == BINARY_OP:
+                    right = pop()
+                    stack[-1] = operators[arg](stack[-1], right)
+                elif opcode == STORE_FAST:
+                    slots[arg] = pop()
+                elif opcode == STORE_NAME:
+                    name = names[arg]
+                    environment = evaluator.environment
+                    if name in environment['constants']:
+                        raise ValueError(f"Constant '{name}' cannot be reassigned")
+                    environment[name] = pop()
+                elif opcode == FOR_ITER:
+                    value = next(stack[-1], _EXHAUSTED)
+                    if value is _EXHAUSTED:
+                        pop()
+                        pc = arg
+                    else:
+                        push(value)
+                elif opcode == DEFINE_NAME:
+                    evaluator.environment.define(names[arg], pop())
+                elif opcode == JUMP:
+                    pc = arg
+                elif opcode == POP_JUMP_IF_FALSE:
+                    if not pop():
+                        pc = arg
+                elif opcode == POP_JUMP_IF_TRUE:
+                    if pop():
+                        pc = arg
+                elif opcode == INC_FAST:
+                    slot, delta = arg
+                    value = slots[slot]
+                    if type(value) != int:
+                        raise TypeError(f"can only {'increment' if delta > 0 else 'decrement'} integer, "
+                                        f"but got {type(value)}")
+                    slots[slot] = value + delta
+                elif opcode == INC_NAME:
+                    index, delta = arg
+                    name = names[index]
+                    environment = evaluator.environment
+                    if name not in environment:
+                        raise NameError(f"name '{name}' is not defined")
+                    value = environment[name]
+                    if type(value) != int:
+                        raise TypeError(f"can only {'increment' if delta > 0 else 'decrement'} integer, "
+                                        f"but got {type(value)}")
+                    environment[name] = value + delta
+                elif opcode == EVAL_STMT:
+                    const_index, synced, labels, return_exit = arg
+                    if synced:
+                        result = self.eval_with_slots(consts[const_index], synced, slots)
+                    else:
+                        result = evaluate(consts[const_index])
+                    # 语句返回了控制流信号: return 结束当前的顶层语句, break/continue 跳转到所在循环的出口/入口
+                    if result.__class__ is ControlSignal:
+                        if result is RETURN_SIGNAL:
+                            pc = self.exit_statement(return_exit, pop)
+                        elif labels is not None:
+                            if result is BREAK_SIGNAL:
+                                if labels.has_iterator:
+                                    pop()
+                                pc = labels.break_target
+                            else:
+                                pc = labels.continue_target
+                elif opcode == EVAL_NODE:
+                    const_index, synced = arg
+                    if synced:
+                        push(self.eval_with_slots(consts[const_index], synced, slots))
+                    else:
+                        push(evaluate(consts[const_index]))
+                elif opcode == POP_TOP:
+                    pop()
+                elif opcode == DUP_TOP:
+                    push(stack[-1])
+                elif opcode == UNARY_NOT:
+                    stack[-1] = not stack[-1]
+                elif opcode == BUILD_LIST:
+                    if arg:
+                        values = stack[-arg:]
+                        del stack[-arg:]
+                    else:
+                        values = []
+                    push(values)
+                elif opcode == BUILD_OBJECT:
+                    keys = consts[arg]
+                    if keys:
+                        values = stack[-len(keys):]
+                        del stack[-len(keys):]
+                    else:
+                        values = []
+                    push(dict(zip(keys, values)))
+                elif opcode == STORE_CONST_NAME:
+                    name = names[arg]
+                    environment = evaluator.environment
+                    if name in environment['constants']:
+                        raise ValueError(f"Constant '{name}' cannot be reassigned")
+                    environment['constants'].append(name)
+                    environment[name] = pop()
+                elif opcode == RANGE_ITER:
+                    step_value = pop() if arg else 1
+                    end_value = pop()
+                    start_value = pop()
+                    # 和 Evaluator.evaluate_for_range_number 一致
+                    push(iter(number_range(start_value, end_value, step_value)))
+                elif opcode == GET_ITER:
+                    stack[-1] = iter(stack[-1])
+                elif opcode == PUSH_BLOCK:
+                    evaluator.environment = Scope(parent=evaluator.environment)
+                elif opcode == POP_BLOCK:
+                    evaluator.environment = evaluator.environment.parent
+                elif opcode == EXIT_STATEMENT:
+                    pc = self.exit_statement(arg, pop)
+                elif opcode == RETURN_VALUE:
+                    return pop()
+                else:
+                    raise ValueError(f"Unknown opcode: {opcode}")
+        finally:
+            evaluator.environment = saved_environment
+
+    def exit_statement(self, return_exit, pop):
+        """
+            顶层的 return: 弹出所在的每一层 for 循环的迭代器，退出它们的块作用域，
+            返回当前顶层语句的出口(下一条顶层语句的开头)
+        """
+        depth, statement_exit = return_exit
+        evaluator = self.evaluator
+        for _ in range(depth):
+            pop()
+            evaluator.environment = evaluator.environment.parent
+        return statement_exit.target
+
+    def eval_with_slots(self, node, synced, slots):
+        """
+            交给 Evaluator 执行的节点可能会读写循环变量，
+            执行前把槽位写到当前块作用域中，执行后再读回来
+        """
+        evaluator = self.evaluator
+        block_vars = evaluator.environment.vars
+        for slot, name in synced:
+            block_vars[name] = slots[slot]
+        try:
+            return evaluator.evaluate(node)
+        finally:
+            for slot, name in synced:
+                slots[slot] = block_vars[name]
+
+
+def compile_source(code: str) -> CodeObject:
+    ast = Resolver().resolve(Parser(Tokenizer(code).tokenize()).parse())
+    return BytecodeCompiler().compile_program(ast)
+
+
+def user_variables(evaluator: Evaluator):
+    # 全局作用域中用户定义的变量(去掉内部使用的 key)，值转换成可以跨 Evaluator 比较的形式
+    internal = ("arg_to_instance", "instances", "constants", "objects", "interfaces", "structs", "enums")
+    return {name: comparable(value) for name, value in evaluator.environment.vars.items() if name not in internal}
+
+
+def comparable(value):
+    """
+        只有基本类型(数字、字符串、布尔、None)和由它们组成的列表/字典/集合按值比较，
+        函数(里面有定义时的 Scope)、实例、迭代器等对象只保留类型名: 两个 Evaluator 中的这些对象总是不同的对象
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [comparable(item) for item in value]
+    if isinstance(value, dict):
+        if "body" in value:
+            return "<function>"
+        return {key: comparable(item) for key, item in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return {item for item in value if item is None or isinstance(item, (bool, int, float, str))}
+    return f"<{type(value).__name__}>"
+
+
+def run_differential(code: str):
+    """
+        差分测试: 同一段程序分别交给 Evaluator(参考实现) 和 VM 执行，
+        比较输出和最终的全局变量(见 comparable)，返回 (是否一致, evaluator 的结果, vm 的结果)
+        结果是 {"output": 输出, "variables": 全局变量, "error": 异常}
+    """
+
+    def capture(execute):
+        # 每个后端使用自己解析的 AST，两次执行互不影响
+        ast = Resolver().resolve(Parser(Tokenizer(code).tokenize()).parse())
+        evaluator = Evaluator()
+        buffer = io.StringIO()
+        error = None
+        with contextlib.redirect_stdout(buffer):
+            try:
+                execute(evaluator, ast)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        return {"output": buffer.getvalue(), "variables": user_variables(evaluator), "error": error}
+
+    def run_tree(evaluator, ast):
+        for node in ast:
+            evaluator.evaluate(node)
+
+    def run_vm(evaluator, ast):
+        VM(evaluator).run(BytecodeCompiler().compile_program(ast))
+
+    expected = capture(run_tree)
+    actual = capture(run_vm)
+    return expected == actual, expected, actual
+
+
+# ===========================差分测试用例===========================
+
+# 名字 -> 程序，每个程序分别交给 Evaluator 和 VM 执行，输出、全局变量、异常都应该相同
+DIFFERENTIAL_CASES = {
+    "range_sum": """
+        let total = 0;
+        for(i: 1 to 100){
+            if(i % 2 == 0){
+                total = total + i;
+            }
+        }
+        @println(total);
+    """,
+    "range_step_nested": """
+        let s = 0;
+        for(i: 10 to 1 step 3){
+            for(j: 1 to i){
+                s = s + j;
+            }
+            @println("i = ${i}");
+        }
+    """,
+    "for_in_break_loop": """
+        let xs = [1, 2, 3, 4, 5];
+        let n = 0;
+        for(x in xs){
+            if(x == 4){
+                break;
+            }
+            n = n + x;
+        }
+        loop(n < 100){
+            n = n * 2;
+        }
+        @println(n);
+    """,
+    "loop_break_continue": """
+        let n = 0;
+        let odd = 0;
+        loop(n < 20){
+            n++;
+            if(n % 2 == 0){ continue; }
+            if(n > 15){ break; }
+            odd = odd + n;
+        }
+        let k = 0;
+        do {
+            k++;
+            if(k == 2){ continue; }
+            @println(k);
+        } while(k < 4)
+        @println(n, odd, k);
+    """,
+    "nested_for_in_break_continue": """
+        let pairs = [];
+        for(a in [1, 2, 3]){
+            if(a == 2){ continue; }
+            for(b in [10, 20, 30]){
+                if(b == 30){ break; }
+                @listAppend(pairs, a * b);
+            }
+        }
+        @println(pairs);
+    """,
+    "for_in_shadowing": """
+        let x = 5;
+        for(x in [1, 2]){
+            let y = x;
+        }
+        let i = 100;
+        for(i: 1 to 3){
+            let z = i;
+        }
+        @println(x, i);
+    """,
+    "functions": """
+        def fact(n){
+            if(n <= 1){ return 1; }
+            return n * fact(n - 1);
+        }
+        def firstOver(xs, limit){
+            for(x in xs){
+                if(x > limit){ return x; }
+            }
+            return 0 - 1;
+        }
+        let add = lambda a, b: a + b;
+        let total = 0;
+        for(i: 1 to 5){
+            total = add(total, fact(i));
+        }
+        @println(total, firstOver([3, 8, 12], 5), firstOver([1], 5));
+    """,
+    "method_calls": """
+        class Person{
+            fields{
+                Name = "Tom";
+                Age = 20;
+            }
+            methods{
+                def Grow(n){
+                    Age = Age + n;
+                    return Age;
+                }
+            }
+            init(name){
+                Name = name;
+            }
+        }
+        let p = new Person("Bob");
+        let xs = [1];
+        for(i: 1 to 3){
+            xs->append(i);
+            p->Grow(i);
+        }
+        let doubled = xs->map(lambda x: x * 2);
+        let s = "a,b,c";
+        let parts = s->split(",");
+        @println(xs, doubled, parts, p->Grow(0));
+    """,
+    "top_level_return": """
+        for(i: 1 to 5){
+            for(x in [10, 20]){
+                if(i == 2){ return 0; }
+                @println(i, x);
+            }
+        }
+        let n = 0;
+        loop(n < 10){
+            n++;
+            if(n == 3){ return n; }
+        }
+        @println("after", n);
+    """,
+    "for_in_shadows_range_slot": """
+        let total = 0;
+        for(i: 1 to 2){
+            for(i in [7]){
+                @println(i);
+                total = total + i;
+            }
+            @println(i);
+        }
+        @println(total);
+    """,
+    "function_values": """
+        def twice(f, x){
+            return f(f(x));
+        }
+        let inc = lambda x: x + 1;
+        let table = {"f": inc, "n": 1};
+        @println(twice(inc, 3));
+    """,
+    "undefined_variable": """
+        let a = 1;
+        @println(a + missing);
+    """,
+}
+
+# 名字 -> (程序, 编译结果中必须出现的操作码)，检查编译器确实使用了专门的指令，而不是全部交给 Evaluator
+BYTECODE_CASES = {
+    "range_uses_slot": ("for(i: 1 to 3){ let t = i; }", (RANGE_ITER, STORE_FAST, LOAD_FAST)),
+    "for_in_defines_variable": ("for(x in [1, 2]){ let y = x; }", (GET_ITER, FOR_ITER, DEFINE_NAME)),
+    "increment_by_name": ("let n = 0; n++;", (INC_NAME,)),
+}
+
+
+def check_differential(cases=None, bytecode_cases=None, stream=None):
+    """
+        执行所有差分测试用例和字节码用例，把结果写到 stream，返回失败的用例名列表
+            python -m interpreter.VM
+    """
+    cases = DIFFERENTIAL_CASES if cases is None else cases
+    bytecode_cases = BYTECODE_CASES if bytecode_cases is None else bytecode_cases
+    stream = sys.stdout if stream is None else stream
+    failures = []
+    for name, program in cases.items():
+        same, expected, actual = run_differential(program)
+        stream.write(f"{'ok  ' if same else 'FAIL'} {name}\n")
+        if not same:
+            failures.append(name)
+            stream.write(f"    evaluator: {expected}\n    vm:        {actual}\n")
+    for name, (program, opcodes) in bytecode_cases.items():
+        used = {opcode for opcode, _ in compile_source(program).instructions}
+        missing = [OPCODE_NAMES[opcode] for opcode in opcodes if opcode not in used]
+        stream.write(f"{'ok  ' if not missing else 'FAIL'} {name}\n")
+        if missing:
+            failures.append(name)
+            stream.write(f"    missing: {', '.join(missing)}\n{disassemble(compile_source(program))}\n")
+    return failures
+
+
+# 测试VM: 运行差分测试用例，有失败的用例时退出码为 1
+if __name__ == '__main__':
+    sys.exit(1 if check_differential() else 0)
@@ -1,32 +1,230 @@
+import argparse
+import sys
+import time
+
+from interpreter import AstCache
+from interpreter.Bytecode import BytecodeCompiler
+from interpreter.Compiler import Compiler
 from interpreter.Evaluator import Evaluator
+from interpreter.Optimizer import Optimizer
 from interpreter.Parser import Parser
+from interpreter.Resolver import Resolver
 from interpreter.Tokenizer import Tokenizer
+from interpreter.Trace import tracer, file_sink, LEVEL_NAMES
+from interpreter.VM import VM
 
-if __name__ == '__main__':
-    code = """
-        let zero = 0;
-        @printlnCyan(zero);
+"""
+goal:
+    命令行入口: 运行 .fight 文件或者标准输入中的代码
+
+use:
+    python -m interpreter.main hello.fight                 # 运行文件(解析结果缓存在 __fightcache__ 中，见 AstCache.py)
+    echo '@println(1 + 2);' | python -m interpreter.main   # 从标准输入读取代码(也可以写成 -)
+    python -m interpreter.main hello.fight --time          # 运行结束后在 stderr 输出 读取/词法/语法/变量解析/执行 各阶段的耗时
+    python -m interpreter.main hello.fight --trace debug   # 跟踪级别 off/info/debug/trace(见 Trace.py)，--trace-file 写到文件
+    python -m interpreter.main hello.fight --tokens --ast  # 输出 token 和 AST(默认不输出)
+    python -m interpreter.main hello.fight --fold-report   # 在 stderr 输出常量折叠的报告(见 Optimizer.py)，--no-fold 不折叠
+    python -m interpreter.main big.fight --stream          # 流式读取: 一边读取、解析，一边执行(见 Tokenizer.stream)
+    python -m interpreter.main old.fight --legacy-loop-exit  # loop 按旧版本的语义执行: 每条语句之后都重新计算条件
+    python -m interpreter.main hello.fight --backend vm     # 执行后端 tree/closure/vm(见 BACKENDS)，默认是 tree
+    python -m interpreter.main hello.fight -v              # -v: 输出缓存是否命中等信息, -vv: 结束时再输出全局环境
+
+    程序出错时在 stderr 输出错误(SyntaxError 带有文件、行、列)，退出码为 1; -vv 时输出完整的 traceback。
+"""
+
+
+# 执行后端: tree 是 Evaluator(参考实现); closure 是闭包编译(Compiler.py); vm 是字节码和栈式虚拟机(Bytecode.py、VM.py)。
+# 编译的后端只编译顶层语句，函数体、方法体、类仍然由 Evaluator 执行(见各模块的说明)
+BACKENDS = ("tree", "closure", "vm")
+
+
+def execute(ast, evaluator, backend="tree"):
+    """
+        用选定的执行后端执行顶层语句的列表，所有后端共用 evaluator 的环境
+    """
+    if backend == "closure":
+        Compiler(evaluator).compile_program(ast)()
+    elif backend == "vm":
+        VM(evaluator).run(BytecodeCompiler(evaluator.legacy_loop_exit).compile_program(ast))
+    else:
+        evaluate = evaluator.evaluate
+        for node in ast:
+            evaluate(node)
+
+
+class PhaseTimer:
+    # 记录每个阶段的耗时，同一个阶段可以累加多次(流式执行时解析和执行交替进行)
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def report(self, stream):
+        total = sum(self.phases.values())
+        stream.write("phase        seconds      %\n")
+        for phase, seconds in self.phases.items():
+            share = seconds / total * 100 if total else 0.0
+            stream.write(f"{phase:<10} {seconds:>9.4f} {share:>6.1f}\n")
+        stream.write(f"{'total':<10} {total:>9.4f}\n")
+
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(prog="python -m interpreter.main", description="Run a Fight program.")
+    parser.add_argument("file", nargs="?", default="-", help="the .fight file to run, '-' or omitted for stdin")
+    parser.add_argument("--time", action="store_true", help="print a per-phase timing breakdown to stderr")
+    parser.add_argument("--trace", choices=list(LEVEL_NAMES), help="interpreter trace level (default: $FIGHT_TRACE)")
+    parser.add_argument("--trace-file", help="append trace output to this file instead of stderr")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="more diagnostics on stderr (-vv for more)")
+    parser.add_argument("--tokens", action="store_true", help="print the tokens before running")
+    parser.add_argument("--ast", action="store_true", help="print the top-level AST nodes before running")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write the __fightcache__ AST cache")
+    parser.add_argument("--no-fold", action="store_true", help="skip constant folding")
+    parser.add_argument("--fold-report", action="store_true", help="print what constant folding changed to stderr")
+    parser.add_argument("--stream", action="store_true",
+                        help="read the file through mmap and run each statement as soon as it is parsed (not for stdin)")
+    parser.add_argument("--legacy-loop-exit", action="store_true",
+                        help="re-evaluate loop(...) conditions after every body statement, as older versions did")
+    parser.add_argument("--backend", choices=BACKENDS, default="tree",
+                        help="execution backend; compiled backends only compile top-level code (default: tree)")
+    return parser
+
+
+def log(args, level, *message):
+    if args.verbose >= level:
+        sys.stderr.write(" ".join(str(part) for part in message) + "\n")
+
+
+def timed(timer, phase, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    timer.add(phase, time.perf_counter() - start)
+    return result
+
+
+def load_ast(args, timer):
     """
-    # ==================================================================
-    print("=================tokenizer======================\n")
-    # 词法分析
-    tokenizer = Tokenizer(code)
-    tokens = tokenizer.tokenize()
-    for i in tokens:
-        print(i)
-
-    print("=================parser========================\n")
-    # 语法分析
-    parser = Parser(tokens)
-    ast = parser.parse()  # 生成AST, 多个xxNode组成的列表
-    print("AST: ")
-    for node in ast:
-        print(node)
-
-    # 求值器
-    evaluator = Evaluator()
-    print("=================evaluator=====================\n")
-    for node in ast:
-        r = evaluator.evaluate(node)
-        # print(r)
-    print("environment: \n\t", evaluator.environment)
+        读取并解析程序，返回 AST(顶层语句的列表)
+        文件: 先查 AST 缓存，缓存失效时再 词法分析 -> 语法分析 -> 变量解析，并写入缓存
+        标准输入: 不使用缓存
+    """
+    from_stdin = args.file == "-"
+    if from_stdin:
+        source_bytes = timed(timer, "read", sys.stdin.buffer.read)
+        file_name = "<stdin>"
+    else:
+        with open(args.file, "rb") as source:
+            source_bytes = timed(timer, "read", source.read)
+        file_name = args.file
+
+    # 需要输出 token 或者折叠报告时不能跳过解析; 缓存中的 AST 是折叠过的，不折叠时也不使用缓存
+    use_cache = not (from_stdin or args.no_cache or args.tokens or args.no_fold or args.fold_report)
+    if use_cache:
+        digest = AstCache.source_hash(source_bytes)
+        cache_path = AstCache.cache_path(args.file)
+        ast = timed(timer, "cache", AstCache.read_cache, cache_path, digest, args.file, len(source_bytes))
+        if ast is not None:
+            log(args, 1, "cache hit:", cache_path)
+            return ast
+        log(args, 1, "cache miss:", cache_path)
+
+    tokenizer = Tokenizer(source_bytes.decode("utf-8"), file_name)
+    tokens = timed(timer, "lex", tokenizer.tokenize)
+    if args.tokens:
+        for token in tokens:
+            print(token)
+    ast = timed(timer, "parse", Parser(tokens).parse)
+    if not args.no_fold:
+        optimizer = Optimizer()
+        ast = timed(timer, "fold", optimizer.optimize, ast)
+        if args.fold_report:
+            sys.stderr.write(optimizer.report.format() + "\n")
+    timed(timer, "resolve", Resolver().resolve, ast)
+
+    if use_cache:
+        timed(timer, "cache", AstCache.write_cache_file, cache_path, digest, tokenizer.source_file.base, ast)
+    return ast
+
+
+def run(args, timer):
+    evaluator = Evaluator(legacy_loop_exit=args.legacy_loop_exit)
+
+    if args.stream:
+        # 流式执行: 解析出一条顶层语句就执行一条
+        statements = Parser(Tokenizer.from_file(args.file).stream()).statements()
+        optimizer = None if args.no_fold else Optimizer()
+        resolver = Resolver()
+        while True:
+            start = time.perf_counter()
+            statement = next(statements, None)
+            if statement is not None:
+                if optimizer is not None:
+                    statement = optimizer.optimize([statement])[0]
+                resolver.resolve([statement])
+            timer.add("lex+parse", time.perf_counter() - start)
+            if statement is None:
+                break
+            if args.ast:
+                print(statement)
+            timed(timer, "eval", execute, [statement], evaluator, args.backend)
+        if optimizer is not None and args.fold_report:
+            sys.stderr.write(optimizer.report.format() + "\n")
+        return evaluator
+
+    ast = load_ast(args, timer)
+    if args.ast:
+        for node in ast:
+            print(node)
+    start = time.perf_counter()
+    try:
+        execute(ast, evaluator, args.backend)
+    finally:
+        timer.add("eval", time.perf_counter() - start)
+    return evaluator
+
+
+def main(argv=None):
+    parser = build_argument_parser()
+    args = parser.parse_args(argv)
+    if args.stream and args.file == "-":
+        # 流式读取用 mmap 读取源文件，标准输入不能 mmap
+        parser.error("--stream needs a file, it cannot read from stdin")
+    if args.trace is not None:
+        tracer.configure(level=args.trace)
+    if args.trace_file:
+        tracer.configure(sink=file_sink(args.trace_file))
+
+    timer = PhaseTimer()
+    exit_code = 0
+    try:
+        evaluator = run(args, timer)
+        log(args, 2, "environment:", evaluator.environment)
+    except KeyboardInterrupt:
+        exit_code = 130
+    except Exception as error:
+        exit_code = 1
+        sys.stdout.flush()
+        if args.verbose >= 2:
+            import traceback
+            traceback.print_exc()
+        else:
+            sys.stderr.write(format_error(error) + "\n")
+    finally:
+        if args.time:
+            sys.stdout.flush()
+            timer.report(sys.stderr)
+    return exit_code
+
+
+def format_error(error):
+    # SyntaxError 带有 文件:行:列 和出错的那一行
+    if isinstance(error, SyntaxError) and error.lineno is not None:
+        text = f"{error.filename}:{error.lineno}:{error.offset}: SyntaxError: {error.msg}"
+        if error.text:
+            text += f"\n    {error.text.rstrip()}\n    {' ' * ((error.offset or 1) - 1)}^"
+        return text
+    return f"{type(error).__name__}: {error}"
+
+
+if __name__ == '__main__':
+    sys.exit(main())